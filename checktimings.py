@@ -21,19 +21,17 @@ __copyright__  = "Copyright 2015, MeteoSwiss"
 __license__    = "GPL"
 __version__    = "1.0"
 
-def parse():
+def parse(env):
     from cosmo_timings import COSMO_Run
-    env = read_environ()
     rundir = env['RUNDIR']
     cosmolog = env['LOGFILE']
     slurmlog = env['LOGFILE_SLURM']
     name = "Cosmo run in "+rundir
     return COSMO_Run(folder=rundir, name=name, cosmolog=cosmolog, slurmlog=slurmlog)
 
-def get_reference_timings():
+def get_reference_timings(env):
     import ConfigParser
     config = ConfigParser.RawConfigParser()
-    env = read_environ()
     rundir = env['RUNDIR']
     timings_file = env['TIMINGS']
     file_path = dir_path(rundir)+timings_file
@@ -51,9 +49,11 @@ def check_value(reference, value, threshold=0):
         return True
     return False
 
-def check():
-    data = parse()
-    timings, threshold = get_reference_timings()
+def check(env=None):
+    if env is None:
+        env = read_environ()
+    data = parse(env)
+    timings, threshold = get_reference_timings(env)
     status = 0
     for name, timing_ref in timings.iteritems():
         data_timing = data[name]
@@ -16,6 +16,9 @@ sys.path.append('../checktools/tools')
 from ts_utilities import read_environ, dir_path
 from ts_fortran_nl import get_param
 import comp_yuprtest
+import yu_cache
+import yu_digest
+import yu_index
 
 # information
 __author__     = "Nicolo Lardelli, Oliver Fuhrer"
@@ -32,17 +35,20 @@ yuswitch = 'lyuprdbg' # namelist switch controlling YUPRTEST output
 nlfile = 'INPUT_ORG'  # namelist file containing lyuprtest and dt
 
 
-def check():
+def check(env=None):
 
     # get name of myself
     myname = os.path.basename(__file__)
     header = myname+': '
 
     # get environment variables
-    env = read_environ()
+    if env is None:
+        env = read_environ()
     verbose = int(env['VERBOSE'])
     rundir = dir_path(env['RUNDIR'])
     refoutdir = dir_path(env['REFOUTDIR'])
+    yuengine = env.get('YUENGINE', 'python')
+    cache = yu_cache.from_environ(env)  # cache of parsed reference files
    
     # defines the 2 file that belongs logically to the checker
     yufile1 = rundir + yufile
@@ -67,7 +73,22 @@ def check():
     tols = [0.0]
     tas = [0.0]
 
+    # compare the digests of the time steps with the manifest of the reference
+    # first, only the time steps with different digests are compared
+    steps = yu_digest.check_steps(yufile1, yufile2)
+    if steps == []:
+        if verbose>1:
+            print header + 'Results are bit identical (same digests as in '+yufile2+yu_digest.manifest_suffix+')'
+        return 0 # MATCH
+    if verbose>2 and steps is not None:
+        print header + 'Time steps with different digests: %s' % ','.join(map(str, steps))
+
     try:
+        # select comparison engine for YUPRTEST files
+        cmp_yuprtest = comp_yuprtest.select_cmp(yuengine, cache, steps)
+        if verbose>2:
+            print header + 'Using '+yuengine+' engine to compare YUPRTEST files'
+
         # check for bit identical results
         if verbose>1:
             print header + 'Checking if results are bit identical'
@@ -79,12 +100,13 @@ def check():
             print header + '  nts = [%s]' % ','.join(map(str, nts))
             print header + '  tols = [%s]' % ','.join(map(str, tols))
             print header + '  tas = [%s]' % ','.join(map(str, tas))
-        error_count = comp_yuprtest.cmp_(yufile1, yufile2, 0, -1, nts, tols, tas)
+        error_count = cmp_yuprtest(yufile1, yufile2, 0, -1, nts, tols, tas)
         if verbose>1:
             if error_count==0:
                 print header + 'Results are bit identical'
             else:
                 print header + 'Results are not bit identical'
+                _print_divergence(header, yufile1, yufile2)
 
     except RuntimeError as e:
         if verbose:
@@ -97,6 +119,17 @@ def check():
         return 0 # MATCH
 
 
+def _print_divergence(header, yufile1, yufile2):
+    # locate the first difference with the time step index of the reference
+    try:
+        divergence = yu_index.first_divergence(yufile1, yufile2)
+    except (IOError, OSError, IndexError, ValueError):
+        return
+    if divergence is not None:
+        print header + 'First difference at time step %i, variable %s (line %i of %s)' \
+            % (divergence[0], divergence[2], divergence[1], yufile2)
+
+
 if __name__ == "__main__":
     sys.exit(check())
 
@@ -8,13 +8,14 @@ YUCHKDAT files.
 """
 
 # built-in modules
-import os, sys
+import os, sys, functools
 # private modules
 sys.path.append('./tools/')
 sys.path.append('../checktools/tools') 
 from ts_utilities import read_environ, dir_path
 from ts_fortran_nl import get_param
 import comp_yuchkdat
+import yu_cache
 
 # information
 __author__     = "Xavier Lapillonne, David Leutwyler"
@@ -34,19 +35,24 @@ nlfile2 = 'INPUT_ORG'    # namelist file containing dt
 
 
 
-def check():
+def check(env=None):
 
     # get name of myself
     myname = os.path.basename(__file__)
     header = myname+': '
 
     # get environment variables
-    env = read_environ()
+    if env is None:
+        env = read_environ()
     verbose = int(env['VERBOSE'])
     rundir = dir_path(env['RUNDIR'])
     refoutdir = dir_path(env['REFOUTDIR'])
     namelistdir = dir_path(env['NAMELISTDIR'])
     tolerance = env['TOLERANCE']
+    yuengine = env.get('YUENGINE', 'python')
+    yualign = env.get('YUALIGN', 'line')
+    yucolumns = env.get('YUCOLUMNS', 'mean')
+    cache = yu_cache.from_environ(env)  # cache of parsed reference files
    
     # defines the 2 file that belongs logically to the checker
     yufile1 = rundir + yufile
@@ -119,6 +125,18 @@ def check():
     nts  = [int(x/dt) for x in tol_times]
 
     try:
+        # select comparison engine for YUCHKDAT files, with the numpy engine
+        # the files are compared once and the differences are then evaluated
+        # for both thresholds
+        if yuengine == 'numpy':
+            cmp_yuchkdat = comp_yuchkdat.diff_profile(yufile1, yufile2, cache, yualign, yucolumns).evaluate
+        else:
+            cmp_yuchkdat = functools.partial(comp_yuchkdat.select_cmp(yuengine, cache, yualign, yucolumns),
+                                             yufile1, yufile2)
+        if verbose>2:
+            print header + 'Using '+yuengine+' engine to compare YUCHKDAT files, '+yualign+' alignment, ' \
+                + yucolumns+' columns'
+
         # check for bit identical results
         if verbose>1:
             print header + 'Checking first if results are bit identical'
@@ -130,7 +148,7 @@ def check():
             print header + '  nts = [%s]' % ','.join(map(str, [10000]))
             print header + '  tol_temp = [%s]' % ','.join(map(str, [0.0]))
             print header + '  tol_out = [%s]' % ','.join(map(str, [0.0]))
-        err_count_identical = comp_yuchkdat.cmp_(yufile1, yufile2, -1, -1, [0.0], [0.0])
+        err_count_identical = cmp_yuchkdat(-1, -1, [0.0], [0.0])
         if verbose>1:
             if err_count_identical==0:
                 print header + 'Results are bit identical'
@@ -150,7 +168,7 @@ def check():
             print header + '  minval = '+str(minval)
             print header + '  nts = [%s]' % ','.join(map(str, nts))
             print header + '  tol_out = [%s]' % ','.join(map(str, tol_out))    
-        error_count = comp_yuchkdat.cmp_(yufile1, yufile2, 0, minval, nts, tol_out)
+        error_count = cmp_yuchkdat(0, minval, nts, tol_out)
         if verbose>1:
             if error_count==0:
                 print header + 'Results are within thresholds'
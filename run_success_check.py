@@ -15,6 +15,7 @@ import os, re, sys
 sys.path.append("./tools") # this is the generic folder for subroutines
 sys.path.append('../checktools/tools') 
 from ts_utilities import read_environ, dir_path
+import yu_reader
 
 # information
 __author__     = "Nicolo Lardelli, Oliver Fuhrer"
@@ -26,7 +27,7 @@ __email__      = "cosmo-wg6@cosmo.org"
 __maintainer__ = "xavier.lapillonne@meteoswiss.ch"
 
 
-def check():
+def check(env=None):
 
     # initialize status
     status = 0 # MATCH
@@ -36,7 +37,8 @@ def check():
     header = myname+': '
 
     # get environment variables
-    env = read_environ()
+    if env is None:
+        env = read_environ()
     verbose = int(env['VERBOSE'])
     rundir = env['RUNDIR']
     logfile = dir_path(rundir) + env['LOGFILE']
@@ -45,7 +47,7 @@ def check():
         print header + 'checking presence of CLEAN UP cleanup line in '+logfile
 
     try:
-        file = open(logfile,'r')
+        file = yu_reader.open_yufile(logfile)
         pattern = '(.*)^(.*)CLEAN(\s)UP(.*)'
         result = 30 # CRASH
         for text in file:
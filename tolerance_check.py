@@ -8,7 +8,7 @@ YUPRTEST files.
 """
 
 # built-in modules
-import os, sys
+import os, sys, functools
 
 # private modules
 sys.path.append('./tools/') 
@@ -16,6 +16,9 @@ sys.path.append('../checktools/tools')
 from ts_utilities import read_environ, dir_path
 from ts_fortran_nl import get_param
 import comp_yuprtest
+import yu_cache
+import yu_digest
+import yu_tolerance
 
 # some global definitions
 yufile = 'YUPRTEST'     # name of special testsuite output
@@ -23,20 +26,23 @@ yuswitch = 'ltestsuite' # namelist switch controlling YUPRDBG output
 nlfile1 = 'INPUT_DIA'    # namelist file containing yuswitch
 nlfile2 = 'INPUT_ORG'    # namelist file containing dt
 
-def check():
+def check(env=None):
 
     # get name of myself
     myname = os.path.basename(__file__)
     header = myname+': '
 
     # get environment variables
-    env = read_environ()
+    if env is None:
+        env = read_environ()
     verbose = int(env['VERBOSE'])
     rundir = dir_path(env['RUNDIR'])
     refoutdir = dir_path(env['REFOUTDIR'])
     namelistdir = dir_path(env['NAMELISTDIR'])
     tolerance = env['TOLERANCE']
     forcematch = int(env['FORCEMATCH'])
+    yuengine = env.get('YUENGINE', 'python')
+    cache = yu_cache.from_environ(env)  # cache of parsed reference files
    
     # defines the 2 file that belongs logically to the checker
     yufile1 = rundir + yufile
@@ -57,17 +63,8 @@ def check():
         return 20 # FAIL
 
     #check if tolerance file exists in namelistdir or type dir
-    tolerance_path_1=namelistdir + tolerance
-    tolerance_path_2=namelistdir + '../'+ tolerance
-    if os.path.exists(tolerance_path_1):
-        tolerance_file=tolerance_path_1   #in namelist dir
-        ltol_file=True
-    elif  os.path.exists(tolerance_path_2):
-        tolerance_file=tolerance_path_2   #in type dir
-        ltol_file=True
-    else:
-        tolerance_file=''
-        ltol_file=False      
+    tolerance_file = yu_tolerance.tolerance_file(namelistdir, tolerance)
+    ltol_file = tolerance_file != ''
 
 
     # define tolerances for comparing YUPRTEST files
@@ -78,13 +75,7 @@ def check():
         
 
         try:       
-            tol_times  = get_param(tolerance_file,'tol_times')
-            tol_times  = [float(x) for x in tol_times.split(',')]
-            tol_temp = get_param(tolerance_file,'tol_temp')
-            tol_temp = [float(x) for x in tol_temp.split(',')]
-            tol_all  = get_param(tolerance_file,'tol_all')
-            tol_all  = [float(x) for x in tol_all.split(',')]
-            minval = float(get_param(tolerance_file,'minval'))
+            tol_times, tol_temp, tol_all, minval = yu_tolerance.read_tolerances(tolerance_file)
         except:
             if verbose:
                 print header+'Error while reading '+tolerance_file
@@ -94,13 +85,10 @@ def check():
         if verbose > 1:
             print header + 'Using default tolerance values'
 
-        tol_times = [1200,2400,3600]  # time limit for tolerance setting in seconds
-        tol_temp = [1.0e-9,1.0e-5,1.0e-3] # tolerance threshold for temperature field for 
-                                      # tol_times[i] < t <= tol_times[i+1]
-        tol_all  = [1.0e-7,1.0e-4,1.0e-0] # tolerance threshold for all other prognostic fields  
-                                      # for tol_times[i] < t <= tol_times[i+1]
-                
-        minval    = 1.0e-9    # values below min val are not considered
+        tol_times = yu_tolerance.tol_times
+        tol_temp = yu_tolerance.tol_temp
+        tol_all = yu_tolerance.tol_all
+        minval = yu_tolerance.minval
 
     # set tolerance time step index
     nts  = [int(x/dt) for x in tol_times]
@@ -108,12 +96,27 @@ def check():
     # override in case FORCEMATCH is set
     if forcematch == 1:
         print('NOTE: setting thresholds to enforce bit-reproducibility')
-        minval = -1
-        nts = [10000]
-        tol_temp = [0.0]
-        tol_all = [0.0]
+        minval, nts, tol_temp, tol_all = yu_tolerance.identical
+
+    # compare the digests of the time steps with the manifest of the reference
+    # first, the thresholds depend on all time steps, so the files are fully
+    # compared if any digest differs
+    if yu_digest.check_steps(yufile1, yufile2) == []:
+        if verbose > 1:
+            print header + 'Results are bit identical (same digests as in '+yufile2+yu_digest.manifest_suffix+')'
+        return 0 # MATCH
 
     try:
+        # select comparison engine for YUPRTEST files, with the numpy engine
+        # the files are compared once and the differences are then evaluated
+        # for both thresholds
+        if yuengine == 'numpy':
+            cmp_yuprtest = comp_yuprtest.diff_profile(yufile1, yufile2, cache).evaluate
+        else:
+            cmp_yuprtest = functools.partial(comp_yuprtest.select_cmp(yuengine, cache), yufile1, yufile2)
+        if verbose > 2:
+            print header + 'Using '+yuengine+' engine to compare YUPRTEST files'
+
         # check for bit identical results
         if verbose > 1:
             print header + 'Checking first if results are bit identical'
@@ -125,7 +128,7 @@ def check():
             print header + '  nts = [%s]' % ','.join(map(str, [10000]))
             print header + '  tol_temp = [%s]' % ','.join(map(str, [0.0]))
             print header + '  tol_all = [%s]' % ','.join(map(str, [0.0]))
-        err_count_identical = comp_yuprtest.cmp_(yufile1, yufile2, -1, -1, [10000], [0.0], [0.0])
+        err_count_identical = cmp_yuprtest(-1, -1, [10000], [0.0], [0.0])
         if verbose > 1:
             if err_count_identical == 0:
                 print header + 'Results are bit identical'
@@ -147,7 +150,7 @@ def check():
             print header + '  nts = [%s]' % ','.join(map(str, nts))
             print header + '  tol_temp = [%s]' % ','.join(map(str, tol_temp))
             print header + '  tol_all = [%s]' % ','.join(map(str, tol_all))    
-        error_count = comp_yuprtest.cmp_(yufile1, yufile2, 0, minval, nts, tol_temp, tol_all)
+        error_count = cmp_yuprtest(0, minval, nts, tol_temp, tol_all)
         if verbose > 1:
             if error_count == 0:
                 print header + 'Results are within thresholds'
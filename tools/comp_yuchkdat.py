@@ -7,7 +7,17 @@ General purpose script to compare two YUCHKDAT output files
 """
 
 # built-in modules
-import os, sys, string, bisect
+import sys, string, bisect, functools, itertools, heapq
+
+# private modules
+import yu_reader
+
+# other modules
+try:
+    import numpy as np
+    import parse_yuchkdat
+except ImportError:
+    np = None  # only required by the numpy engine
 
 # information
 __author__     = "Xavier Lapillonne"
@@ -19,10 +29,18 @@ __email__      = "cosmo-wg6@cosmo.org"
 __maintainer__ = "xavier.lapillonne@meteoswiss.ch"
 
 
+# Valid line contains 10 (from 0 to 9) elements, with column 3,6,9 containing real numbers
+# see isValidLine method for details
+# Note : only numbers at position RealPos are compared, either the last one (mean,
+# columns='mean') or all of them (columns='all', the largest difference is used)
+from yu_reader import ValidLineSize, RealPos, setStartKeyword, setStepKeyword
+
+
 def cmp_(file1,file2, \
              v_level=0,minval=1e-15, \
              nts=[10,100,200], \
-             tol_list=[1e-15,1e-15,1e-15]):
+             tol_list=[1e-15,1e-15,1e-15], \
+             columns='mean',topk=10,report=None):
 
     # compare two YUCHKDAT file1, file2 with tolerance tol_*
     # Values smaller than minval are not considered.
@@ -34,32 +52,23 @@ def cmp_(file1,file2, \
     # v_level:verbose level
     #        -1 -> no print out
     #         0 -> max diff 
-    #         1 -> show all lines with differences above tol_
+    #         1 -> show the topk lines with the largest differences above tol_
     # if minval is -1 compares absolute differences
     # the comparison is only done for overlapping time steps
+    # if report (a DiffReport) is given, it is filled with the differences
+    # above threshold
+    # columns: 'mean' -> only the mean (last column RealPos) is compared
+    #          'all'  -> the largest difference of min, max and mean is used
 
 
-    # Valid line contains 10 (from 0 to 9) elements, with column 3,6,9 containing real numbers
-    # see isValidLine method for details
-    # Note : only numbers at position RealPos are compared
-    ValidLineSize=10
-    RealPos=[3,6,9]
-
-    setStartKeyword='Check'
-    setStepKeyword='step:'  #assumes that 'step:' is followed by a number
-
-   # check file existence
-    if not(os.path.exists(file1)):
+    # check file existence
+    if not(yu_reader.yufile_exists(file1)):
         print 'File '+file1+' does not exist'
         return -1
-    elif not(os.path.exists(file2)):
+    elif not(yu_reader.yufile_exists(file2)):
         print 'File '+file2+' does not exist'
         return -1
 
-    
-    # open file
-    data1=open(file1).readlines()
-    data2=open(file2).readlines()
 
     # variables initialisation
     error_count  = 0       #number of error detected
@@ -71,7 +80,8 @@ def cmp_(file1,file2, \
     maxdiff_line=0
     maxdiff_step=0
 
-    print_header = True
+    if report is None:
+        report=DiffReport(topk)
     header = '  Errors above threshold :\n' + \
              '  var        ee    lev       min      imin   jmin         max      imax   jmax           mean          step       error'
     
@@ -89,12 +99,10 @@ def cmp_(file1,file2, \
             print 'Comparing relative differences, min. value is %1.0e ...' %(minval)
     
         
-    # first on file1
-    nline=min(len(data1),len(data2));
-
-    for i in range(nline):
-        l1=data1[i].split()
-        l2=data2[i].split()
+    # loop over the lines of both files, until the end of the shorter file
+    for i,(text1,text2) in enumerate(yu_reader.paired_lines(file1,file2)):
+        l1=text1.split()
+        l2=text2.split()
 
         #set theashold if new set
         if l1 and (setStartKeyword in l1[0]):
@@ -136,25 +144,31 @@ def cmp_(file1,file2, \
                
             #check that it is the same variable in both file
             if varname.strip()!=varname2.strip():
+                if v_level==1:
+                    _print_report(report,header,file1,file2)
                 print '!! Error: Variables differ'
                 print ' %s at line %i in file %s' %(varname,i,file1)
                 print ' %s at line %i in file %s' %(varname2,i,file2)
                 error_count+=1
                 return -1
 
-            #compare numerical values on this line
-            for id in RealPos:  
+            #compare numerical values on this line, the mean or the
+            #largest difference of the columns RealPos (see columns)
+            ldiff=0
+            for id in (RealPos if columns=='all' else RealPos[-1:]):  
                 n1=float(l1[id])
                 n2=float(l2[id])
 
             #absolute diffference
                 if minval==-1:   
-                    ldiff=abs(n1-n2)
+                    cdiff=abs(n1-n2)
             #relative diffference
                 elif (abs(n1)>minval or abs(n2)>minval):   
-                    ldiff=abs((n1-n2)/(abs(n1)+minval))
+                    cdiff=abs((n1-n2)/(abs(n1)+minval))
                 else:
-                    ldiff=0
+                    cdiff=0
+                if cdiff>ldiff:
+                    ldiff=cdiff
                     
             #check if larger than tol        
             if (ldiff>tol):
@@ -163,24 +177,19 @@ def cmp_(file1,file2, \
                     maxdiff=ldiff
                     maxdiff_line=i+1
                     maxdiff_step=step
-                    line1=data1[i]
-                    line2=data2[i]
-                    
-
-                # print line 
-                if (v_level==1):
-                    if print_header:
-                        print header
-                        print_header=False
-
-                    print '>' + data1[i].rstrip()+ '     %i      ' %(step)
-                    print '<' + data2[i].rstrip()+ '     %i        %2.1e \n' %(step,ldiff)
+                    line1=text1
+                    line2=text2
+                report.add(ldiff,tol,step,i+1,i+1)
 
         else: #not a valid line
             previousLineWasValid=False
  
     #end of loop over lines
 
+    #print the largest differences for verbose 1
+    if v_level==1:
+        _print_report(report,header,file1,file2)
+
     #print if error detected for verbose 0
     if (v_level==0) and (error_count>0):
         print 'Error above threshold: %i , max diff  %e at line %i, step %i' %(error_count,maxdiff,maxdiff_line,maxdiff_step)
@@ -198,8 +207,371 @@ def cmp_(file1,file2, \
 
     return error_count
 
+def cmp_columnar(file1,file2, \
+             v_level=0,minval=1e-15, \
+             nts=[10,100,200], \
+             tol_list=[1e-15,1e-15,1e-15], \
+             cache=None,align='line',columns='mean',topk=10):
+
+    # same as cmp_, but both files are first parsed into typed arrays
+    # (see parse_yuchkdat) and the differences of the columns RealPos
+    # are computed with vectorized operations for each set at once.
+    # Returns the same error count and prints the same output as cmp_.
+    # The parsed reference file2 is taken from cache if given.
+    # With align='key' the lines are matched by set, variable and level
+    # instead of line by line.
+    return diff_profile(file1,file2,cache,align,columns).evaluate(v_level,minval,nts,tol_list,topk)
+
+
+def diff_profile(file1,file2,cache=None,align='line',columns='mean'):
+    # parse and compare two YUCHKDAT files once, the returned DiffProfile
+    # can then be evaluated for any number of tolerance settings
+    if np is None:
+        raise ImportError('The numpy engine requires numpy')
+    return DiffProfile(file1,file2,cache,align,columns)
+
+
+class DiffProfile:
+    """Compared values of the valid lines of two YUCHKDAT files for each set,
+    read once and evaluated with evaluate() for any thresholds as cmp_ would do.
+    The lines are aligned line by line (align='line', as cmp_) or by their key
+    (set, variable, level) with align='key'. Only the mean is compared, or
+    all columns RealPos with columns='all' (see cmp_)."""
+
+    def __init__(self,file1,file2,cache=None,align='line',columns='mean'):
+
+        self.file1=file1
+        self.file2=file2
+        self.missing=None               # message if a file does not exist
+        self.error=[]                   # messages if the variables differ
+        self.nvalid=0                   # number of valid lines in both files
+        self.steps=np.zeros(0,dtype=np.int64)   # step of each set
+        self.badformat=np.zeros(0,dtype=bool)   # True if the step of the set was not recognized
+        self.lineno1=np.zeros(0,dtype=np.int64) # line number of each compared line in file1
+        self.lineno2=np.zeros(0,dtype=np.int64) # line number of each compared line in file2
+        self.block=np.zeros(0,dtype=np.int64)   # set of each line (0 before the first "Check")
+        self.extra=np.zeros(0,dtype=np.int64)   # lines of file1 without a match in file2 (align='key')
+        self.absent=np.zeros(0,dtype=np.int64)  # lines of file2 without a match in file1 (align='key')
+        self._cache={}                  # differences for each minval
+        self.columns=columns            # compared columns, 'mean' or 'all'
+
+        if align not in ['line','key']:
+            raise ValueError('Unknown YUCHKDAT alignment '+align)
+        if columns not in ['mean','all']:
+            raise ValueError('Unknown YUCHKDAT columns '+columns)
+
+        # check file existence
+        for f in [file1,file2]:
+            if not(yu_reader.yufile_exists(f)):
+                self.missing='File '+f+' does not exist'
+                return
+
+        # parse files
+        d1=parse_yuchkdat.read_yuchkdat(file1)
+        d2=parse_yuchkdat.read_yuchkdat(file2,cache=cache)   # reference file
+
+        if align=='key':
+            i1,i2=self._align_keys(d1,d2)
+            nlines=d1.nlines
+        else:
+            i1,i2,nlines=self._align_lines(d1,d2)
+
+        # sets of file1 up to the last compared line
+        nsets=np.searchsorted(d1.headers,nlines,side='right')
+        self.steps=d1.steps[:nsets]
+        self.badformat=d1.badformat[:nsets]
+        self.lineno1=d1.lineno[i1]
+        self.lineno2=d2.lineno[i2]
+        self.block=np.searchsorted(d1.headers[:nsets],self.lineno1,side='right')
+        self.values1=d1.values[i1]
+        self.values2=d2.values[i2]
+
+    def _align_lines(self,d1,d2):
+        # the files are compared line by line until the end of the shorter
+        # file, lines which are valid in both files are compared. Returns
+        # the indices of the compared lines and the last line compared
+        nlines=min(d1.nlines,d2.nlines)
+        k=np.minimum(np.searchsorted(d2.lineno,d1.lineno),max(len(d2)-1,0))
+        i1=np.flatnonzero(d1.lineno<=nlines)
+        if len(d2):
+            i1=i1[d2.lineno[k[i1]]==d1.lineno[i1]]
+        else:
+            i1=i1[:0]
+        i2=k[i1]
+        self.nvalid=len(i1)
+
+        #check that it is the same variable in both file
+        names1=d1.names()[i1]
+        names2=d2.names()[i2]
+        bad=np.flatnonzero(names1!=names2)
+        if len(bad):
+            b=bad[0]
+            line=d1.lineno[i1[b]]
+            self.error=['!! Error: Variables differ',
+                        ' %s at line %i in file %s' %(names1[b],line-1,self.file1),
+                        ' %s at line %i in file %s' %(names2[b],line-1,self.file2)]
+            nlines=line
+            i1=i1[:b]
+            i2=i2[:b]
+        return i1,i2,nlines
+
+    def _align_keys(self,d1,d2):
+        # the valid lines are keyed by (first line of the set, variable,
+        # level, occurrence of the same key) and matched with a hash join.
+        # Returns the indices of the matched lines in file1 order
+        keys1,keys2=_line_keys(d1,d2)
+        index=dict(itertools.izip(keys2.tolist(),itertools.count()))
+        match=np.array([index.get(key,-1) for key in keys1.tolist()],dtype=np.int64)
+        i1=np.flatnonzero(match>=0)
+        i2=match[i1]
+        found=np.zeros(len(d2),dtype=bool)
+        found[i2]=True
+        self.extra=d1.lineno[match<0]
+        self.absent=d2.lineno[~found]
+        self.nvalid=len(i1)
+        return i1,i2
+
+    def _diffs(self,minval):
+        # return the difference of the mean or the largest difference of the
+        # columns RealPos of each line (absolute if minval is -1, else relative)
+        if minval not in self._cache:
+            n1=self.values1
+            n2=self.values2
+            if self.columns=='mean':
+                n1=n1[:,-1:]
+                n2=n2[:,-1:]
+            with np.errstate(divide='ignore',invalid='ignore'):
+                if minval==-1:
+                    cdiff=np.abs(n1-n2)
+                else:
+                    cdiff=np.where((np.abs(n1)>minval)|(np.abs(n2)>minval), \
+                                   np.abs((n1-n2)/(np.abs(n1)+minval)),0.)
+            cdiff[np.isnan(cdiff)]=0.
+            self._cache[minval]=cdiff.max(axis=1) if len(cdiff) else np.zeros(0)
+        return self._cache[minval]
+
+    def _errors(self,minval,nts,tol_list):
+        # return the index of the threshold of each set, the difference of
+        # each line, its threshold and whether it is above the threshold
+        # (set 0 contains the lines before the first "Check" and uses the
+        # first threshold)
+        thInd=np.searchsorted(nts,self.steps,side='left')
+        tols=np.asarray(tol_list,dtype=float)[np.concatenate(([0],np.minimum(thInd,len(tol_list)-1)))]
+        ldiff=self._diffs(minval)
+        error=ldiff>tols[self.block]
+        if error[self.block==0].any():
+            raise ValueError('Values above threshold before the first set in file '+self.file1)
+        return thInd,ldiff,tols[self.block],error
+
+    def report(self,minval=1e-15, \
+             nts=[10,100,200], \
+             tol_list=[1e-15,1e-15,1e-15], \
+             topk=10):
+        """return a DiffReport of the differences above the thresholds, as
+        filled by cmp_"""
+        thInd,ldiff,linetol,error=self._errors(minval,nts,tol_list)
+        idx=np.flatnonzero(error)
+        report=DiffReport(topk)
+        report.count=len(idx)
+        if len(idx)==0:
+            return report
+        report.maxdiff=float(ldiff[idx].max())
+        # only the topk largest differences (and those equal to the
+        # smallest of them) can enter the heap
+        if len(idx)>topk:
+            kth=np.partition(ldiff[idx],len(idx)-topk)[len(idx)-topk]
+            idx=idx[ldiff[idx]>=kth]
+        for k in idx:
+            report._push((float(ldiff[k]),-int(self.lineno1[k]),int(self.steps[self.block[k]-1]),
+                          float(linetol[k]),int(self.lineno2[k])))
+        return report
+
+    def evaluate(self,v_level=0,minval=1e-15, \
+             nts=[10,100,200], \
+             tol_list=[1e-15,1e-15,1e-15], \
+             topk=10):
+        """compare the differences with the thresholds, arguments, output and
+        return value are the same as for cmp_"""
+
+        if self.missing:
+            print self.missing
+            return -1
+
+        header = '  Errors above threshold :\n' + \
+                 '  var        ee    lev       min      imin   jmin         max      imax   jmax           mean          step       error'
+
+        if v_level>0:
+            if minval==-1:
+                print 'Comparing absolute differences ...'
+            else:
+                print 'Comparing relative differences, min. value is %1.0e ...' %(minval)
+
+        # threshold of each set, looked up once per set
+        thInd,ldiff,linetol,error=self._errors(minval,nts,tol_list)
+        error_count=int(error.sum())
+
+        # line with maximal difference (first occurrence)
+        if error_count>0:
+            ierr=np.flatnonzero(error)
+            imax=ierr[np.argmax(ldiff[ierr])]
+            maxdiff=ldiff[imax]
+            maxdiff_line=self.lineno1[imax]
+            maxdiff_line2=self.lineno2[imax]
+            maxdiff_step=self.steps[self.block[imax]-1]
+
+        # line to print for verbose 0
+        plines1=[]
+        plines2=[]
+        if v_level==0 and error_count>0:
+            plines1=[maxdiff_line]
+            plines2=[maxdiff_line2]
+        lines1=yu_reader.read_lines(self.file1,plines1)
+        lines2=yu_reader.read_lines(self.file2,plines2)
+
+        for iset in range(1,len(self.steps)+1):
+            step=self.steps[iset-1]
+            if self.badformat[iset-1]:
+                print '!! Warning : comp_yuchkdat, format not recognized'
+            if thInd[iset-1]>=len(tol_list) and v_level>0:
+                print '!!WARNING step=%i > nts[end]=%i' %(step,nts[-1])
+                print '!!You may want to check tolerance threshold'
+
+        #print the largest differences for verbose 1
+        if v_level==1:
+            _print_report(self.report(minval,nts,tol_list,topk),header,self.file1,self.file2)
+
+        if self.error:
+            for line in self.error:
+                print line
+            return -1
+
+        #print if error detected for verbose 0
+        if (v_level==0) and (error_count>0):
+            print 'Error above threshold: %i , max diff  %e at line %i, step %i' \
+                %(error_count,maxdiff,maxdiff_line,maxdiff_step)
+            print header
+            print lines1[maxdiff_line]
+            print lines2[maxdiff_line2]
+
+        if v_level>0 and error_count==0:
+            print 'no difference above threshold'
+
+        # lines without a match in the other file (align='key'), these are
+        # reported but not counted as errors
+        if v_level>=0 and (len(self.extra) or len(self.absent)):
+            print 'Extra lines in %s: %i, missing lines from %s: %i' \
+                %(self.file1,len(self.extra),self.file2,len(self.absent))
+            if v_level>0:
+                for line in self.extra:
+                    print ' extra   : line %i in file %s' %(line,self.file1)
+                for line in self.absent:
+                    print ' missing : line %i in file %s' %(line,self.file2)
+
+        #check there there vas at leaste one valid line
+        if self.nvalid==0:
+           print '!!Waring: there was no valid line, file cannot be compared'
+           return -1
+
+        return error_count
+
+
+class DiffReport:
+    """Lines above threshold found when comparing two YUCHKDAT files: their
+    number, the maximal difference and the topk largest differences, kept in
+    a bounded heap so that the memory does not depend on the number of
+    differences"""
+
+    def __init__(self,topk=10):
+        self.topk=topk
+        self.count=0        # number of lines above threshold
+        self.maxdiff=0.     # maximal difference above threshold
+        self._heap=[]       # topk largest differences
+
+    def add(self,ldiff,tol,step,lineno1,lineno2):
+        """add a difference ldiff above threshold tol of the set of step for
+        the line lineno1 in file1 and lineno2 in file2"""
+        self.count+=1
+        self.maxdiff=max(self.maxdiff,ldiff)
+        # the first line comes first for equal differences
+        self._push((ldiff,-lineno1,step,tol,lineno2))
+
+    def _push(self,item):
+        if len(self._heap)<self.topk:
+            heapq.heappush(self._heap,item)
+        elif item>self._heap[0]:
+            heapq.heapreplace(self._heap,item)
+
+    def worst(self):
+        """return the largest differences, largest first, as a list of
+        (ldiff, threshold, step, line in file1, line in file2)"""
+        return [(d,tol,step,-l1,l2) for (d,l1,step,tol,l2) in sorted(self._heap,reverse=True)]
+
+    def format(self,file1,file2):
+        """return the largest differences with the lines of both files as text"""
+        items=self.worst()
+        lines1=yu_reader.read_lines(file1,[item[3] for item in items])
+        lines2=yu_reader.read_lines(file2,[item[4] for item in items])
+        out=[]
+        for (d,tol,step,l1,l2) in items:
+            out.append('>' + lines1[l1].rstrip()+ '     %i      ' %(step))
+            out.append('<' + lines2[l2].rstrip()+ '     %i        %2.1e \n' %(step,d))
+        if self.count>len(items):
+            out.append('%i lines above threshold, the %i largest differences are shown' %(self.count,len(items)))
+        return '\n'.join(out)
+
+
+def select_cmp(engine='python',cache=None,align='line',columns='mean'):
+    # return the comparison function for the given engine:
+    #    python -> cmp_, line by line comparison
+    #    numpy  -> cmp_columnar, vectorized comparison, the parsed
+    #              reference file is taken from cache if given
+    # alignment (line or key, only supported by the numpy engine)
+    # and compared columns (mean or all, see cmp_)
+    if columns not in ['mean','all']:
+        raise ValueError('Unknown YUCHKDAT columns '+columns)
+    if engine=='numpy':
+        if np is None:
+            raise ImportError('The numpy engine requires numpy')
+        return functools.partial(cmp_columnar,cache=cache,align=align,columns=columns)
+    elif engine=='python':
+        if align!='line':
+            raise ValueError('The python engine only supports line alignment')
+        return functools.partial(cmp_,columns=columns)
+    else:
+        raise ValueError('Unknown YUCHKDAT comparison engine '+engine)
+
 #----------------------------------------------------------------------------
 # Local functions
+def _print_report(report,header,file1,file2):
+    # print the largest differences above threshold
+    if report.count:
+        print header
+        print report.format(file1,file2)
+
+def _line_keys(d1,d2):
+    # return an integer key (set, variable, level, occurrence) for each valid
+    # line of d1 and d2, the set is identified by its first line
+    titles={}
+    names={}
+    keys=[]
+    for d in [d1,d2]:
+        tid=np.array([titles.setdefault(t,len(titles)) for t in ['']+d.titles],dtype=np.int64)
+        vid=np.array([names.setdefault(n,len(names)) for n in d.varnames],dtype=np.int64)
+        keys.append((tid[d.sets()],vid[d.varid],d.level))
+    nlev=max([k[2].max()+2 for k in keys if len(k[2])]+[1])
+    result=[]
+    for tid,vid,lev in keys:
+        key=(tid*len(names)+vid)*nlev+np.maximum(lev,-1)+1
+        # number the lines with the same key
+        order=np.argsort(key,kind='mergesort')
+        skey=key[order]
+        first=np.r_[0,np.flatnonzero(skey[1:]!=skey[:-1])+1] if len(key) else np.zeros(0,dtype=np.int64)
+        occ=np.empty(len(key),dtype=np.int64)
+        occ[order]=np.arange(len(key))-np.repeat(first,np.diff(np.r_[first,len(key)]))
+        result.append((key,occ))
+    nocc=max([occ.max()+1 for key,occ in result if len(occ)]+[1])
+    return [key*nocc+occ for key,occ in result]
+
 
 # Valid line contains n elements, real numbers at positions real_list
 def isValidLine(Line,n,rList):
@@ -268,7 +640,7 @@ DEFINITION :      compare two YUCHKDAT file1, file2 with tolerance tol_*
      v_level:verbose level
             -1 -> no print out
              0 -> max diff 
-             1 -> show all lines with differences above tol_
+             1 -> show the 10 lines with the largest differences above tol_
      if minval is -1 compares absolute differences
      the comparison is only done for overlapping time steps'''
     
@@ -7,7 +7,17 @@ General purpose script to compare two YUPRTEST output files
 """
 
 # built-in modules
-import os, sys, string
+import sys, string, itertools, functools, heapq
+
+# private modules
+import yu_reader
+
+# other modules
+try:
+    import numpy as np
+    import parse_yuprtest
+except ImportError:
+    np = None  # only required by the numpy engine
 
 # information
 __author__     = "Xavier Lapillonne, Nicolo Lardelli"
@@ -23,7 +33,8 @@ def cmp_(file1,file2, \
              v_level=0,minval=1e-15, \
              nts=[10,100,200], \
              tol_ts=[1e-15,1e-15,1e-15], \
-             tol_as=[1e-15,1e-15,1e-15]):
+             tol_as=[1e-15,1e-15,1e-15], \
+             topk=10,report=None):
 
     # compare two YUPRTEST file1, file2 with tolerance tol_*
     # Values smaller than minval are not considered.
@@ -32,22 +43,21 @@ def cmp_(file1,file2, \
     #        -1 -> no print out
     #         0 -> max diff over all variables for each time step, short
     #         1 -> max diff over all variables for each time step, print lines
-    #         2 -> show all lines with differences above tol_
+    #         2 -> show the topk lines with the largest differences above tol_
+    #              for t and for all other variables
     # if minval is set to -1 compares absolute differences
     # the comparison is only done for overlapping time steps
+    # if report (a DiffReport) is given, it is filled with the differences
+    # above threshold
     
     # check file existence
-    if not(os.path.exists(file1)):
+    if not(yu_reader.yufile_exists(file1)):
         print 'File '+file1+' does not exist'
         return -1
-    elif not(os.path.exists(file2)):
+    elif not(yu_reader.yufile_exists(file2)):
         print 'File '+file2+' does not exist'
         return -1
 
-    
-    # open file
-    data1=open(file1).readlines()
-    data2=open(file2).readlines()
 
     # variables initialisation
     error_count = 0       #number of error detected
@@ -68,8 +78,8 @@ def cmp_(file1,file2, \
 
     print_header = True
     header = ' '
-    
-    comment_type='#' #comment at the begining wil be skiped
+    if report is None:
+        report=DiffReport(topk)
     
     
     ntstep=0
@@ -77,14 +87,14 @@ def cmp_(file1,file2, \
     lerror_a = False
 
     if v_level==0:
-        print_out='./tools/comp_yuprtest.py ' + file1 + ' ' + file2 + ' ' + str(v_level) + ' ' + str(minval) + \
-                  ' ' + ','.join([str(x) for x in nts]) + ' ' + ','.join([str(x) for x in tol_ts]) + \
-                  ' ' + ','.join([str(x) for x in tol_as]) + '\n'
+        print_out=['./tools/comp_yuprtest.py ' + file1 + ' ' + file2 + ' ' + str(v_level) + ' ' + str(minval) + \
+                   ' ' + ','.join([str(x) for x in nts]) + ' ' + ','.join([str(x) for x in tol_ts]) + \
+                   ' ' + ','.join([str(x) for x in tol_as]) + '\n']
         if minval==-1:
-            print_out+='Absolute error:\n'
+            print_out.append('Absolute error:\n')
         else:
-            print_out+='Relative error:\n'
-        print_out+='   nt    max_all         t     Test \n'
+            print_out.append('Relative error:\n')
+        print_out.append('   nt    max_all         t     Test \n')
 
     if v_level>0:
         if minval==-1:
@@ -94,84 +104,52 @@ def cmp_(file1,file2, \
     
 
     # check that files are not empty
-    if len(data1)==0:
+    nlines=yu_reader.count_lines(file1,5)
+    if nlines==0:
         print 'file ' + file1 + ' is empty!'
         return -1
-    if len(data1)<=4:
+    if nlines<=4:
         print 'file ' + file1 + ' contains only header!'
         return -1
 
-    if len(data2)==0:
+    nlines=yu_reader.count_lines(file2,5)
+    if nlines==0:
         print 'file ' + file2 + ' is empty!'
         return -1
-    if len(data2)<=4:
+    if nlines<=4:
         print 'file ' + file2 + ' contains only header!'
         return -1
 
-    # set file counter
-    i1=0
-    i2=0
-
-    # remove the headers part (all lines starting with comment_type)
-    # first on file1
-    while True:
-        line=data1[i1].split()
-        if line[0]!=comment_type:
-            break
-        i1=i1+1
-
-    # then on file2
-    while True:
-        line=data2[i2].split()
-        if line[0]!=comment_type:
-            break
-        i2=i2+1
-
-    # Set the file counters to identical time step
-    while True:
-        #check eof
-        if (i1>=len(data1)) or (i2>=len(data2)):
-            print 'Files %s and %s do not have overlapping time steps and can not be compared.' %(file1,file2)
-            return -1
-            
-        l1=data1[i1].split()
-        l2=data2[i2].split()
-        nt1=int(l1[1])
-        nt2=int(l2[1])
-        
-        if nt1<nt2:
-            i1=i1+1
-        elif nt1>nt2:
-            i2=i2+1
-        elif nt1==nt2:
-            break
-        else:
-            break
-        
+    # records of both files, the headers part (all lines starting with
+    # comment_type) is removed and the files are set to identical time step
+    records=yu_reader.aligned_yuprtest_records(file1,file2)
+    first=next(records,None)
+    if first is None:
+        print 'Files %s and %s do not have overlapping time steps and can not be compared.' %(file1,file2)
+        return -1
 
-    ntstep=nt1
+    ntstep=int(first[0][2][1])
     leof=False
 
     #----------------------------------------------------------------------------------------------------
-    #loop over file lines
-    while True:
+    #loop over file lines, None marks the end of one of the files
+    for rec in itertools.chain([first],records,[None]):
        
         #check eof
-        if (i1>=len(data1)) or (i2>=len(data2)):
+        if rec is None:
             leof=True
         #read file
         else:
-            l1=data1[i1].split()
-            l2=data2[i2].split()
+            (i1,line1,l1),(i2,line2,l2)=rec
 
         #----------------------------------------------------------------------------------------------------
         #prepare printout if new time step or eof
         if (int(l1[1]) != ntstep ) or leof:
             if (v_level==0):
                 if (lerror_t) or (lerror_a):
-                    print_out+='%4i     %1.2e     %1.2e     FAILED \n' %(ntstep,maxdiff_a,maxdiff_t)
+                    print_out.append('%4i     %1.2e     %1.2e     FAILED \n' %(ntstep,maxdiff_a,maxdiff_t))
                 else:
-                    print_out+='%4i     %1.2e     %1.2e     OK     \n' %(ntstep,maxdiff_a,maxdiff_t)
+                    print_out.append('%4i     %1.2e     %1.2e     OK     \n' %(ntstep,maxdiff_a,maxdiff_t))
 
             #print if verbose=1 and error at this step
             if (lerror_t) and (v_level==1):
@@ -223,9 +201,11 @@ def cmp_(file1,file2, \
                 
         #check that it is the same variable in both file
         if varname.strip()!=varname2.strip():
+            if v_level==2:
+                _print_report(report,header,file1,file2)
             print '!! Error: Variables differ'
-            print ' %s at line %i in file %s' %(varname,i1+1,file1)
-            print ' %s at line %i in file %s' %(varname2,i2+1,file2)
+            print ' %s at line %i in file %s' %(varname,i1,file1)
+            print ' %s at line %i in file %s' %(varname2,i2,file2)
             error_count+=1
             lerror_t=True      
             lerror_a =True 
@@ -233,9 +213,11 @@ def cmp_(file1,file2, \
 
         #check that it is the same time step
         if int(l1[1])!=int(l2[1]):
+            if v_level==2:
+                _print_report(report,header,file1,file2)
             print '!! Error: Time steps differ'
-            print ' nt=%s at line %i in file %s' %(l1[1],i1+1,file1)
-            print ' nt=%s at line %i in file %s' %(l2[1],i2+1,file2)
+            print ' nt=%s at line %i in file %s' %(l1[1],i1,file1)
+            print ' nt=%s at line %i in file %s' %(l2[1],i2,file2)
             error_count+=1
             lerror_t=True      
             lerror_a =True
@@ -243,7 +225,6 @@ def cmp_(file1,file2, \
 
         #compare numerical values on this line
         for j in range(len(l1)):                    
-            pr_line=True
             if is_num(l1[j]):
                 n1=float(l1[j])
                 n2=float(l2[j])
@@ -262,64 +243,553 @@ def cmp_(file1,file2, \
                     # save max
                     if ldiff > maxdiff_t:
                         maxdiff_t=ldiff
-                        line1_t=data1[i1]
-                        line2_t=data2[i2]
-                        lnum_t=i1+1
+                        line1_t=line1
+                        line2_t=line2
+                        lnum_t=i1
 
                     #check if larger than tol
                     if ldiff > tol_t:
                         error_count+=1
                         lerror_t=True
-                        # print line 
-                        if (v_level==2 and pr_line):
-                            if print_header:
-                                print header
-                                print_header=False
-                            if pr_line:
-                                print '>' + data1[i1].rstrip()
-                                print '<' + data2[i2]
-                                pr_line=False 
+                        report.add('t',ldiff,tol_t,ntstep,i1,i2,j)
 
                 #Use tol_a threshold for all other fields
                 else:
                     # save max
                     if ldiff > maxdiff_a:
                         maxdiff_a=ldiff
-                        line1_a=data1[i1]
-                        line2_a=data2[i2]
-                        lnum_a=i1+1
+                        line1_a=line1
+                        line2_a=line2
+                        lnum_a=i1
                                 
                     #check if larger than tol
                     if ldiff > tol_a:
                         error_count+=1
                         lerror_a=True
-                        # print line 
-                        if (v_level==2 and pr_line):
-                            if print_header:
-                                print header
-                                print_header=False
-                            if pr_line:
-                                print '>' + data1[i1].rstrip()
-                                print '<' + data2[i2]
-                                pr_line=False 
-
+                        report.add('all',ldiff,tol_a,ntstep,i1,i2,j)
 
-        # moves forward the 2 file counters
-        i1=i1+1
-        i2=i2+1
 
+    #print the largest differences for verbose 2
+    if v_level==2:
+        _print_report(report,header,file1,file2)
 
     #print if error detected for verbose 0
     if (v_level==0) and (error_count>0):
-        print print_out
+        print ''.join(print_out)
 
     if v_level>0 and error_count==0:
         print 'no difference above threshold'
 
     return error_count
 
+
+class DiffReport:
+    """Differences above threshold found when comparing two YUPRTEST files:
+    the number of values above threshold and the maximal difference for the
+    temperature ('t') and for all other fields ('all'), and the topk largest
+    differences of each class, kept in a bounded heap so that the memory
+    does not depend on the number of differences"""
+
+    def __init__(self,topk=10):
+        self.topk=topk
+        self.count={'t':0,'all':0}      # number of values above threshold
+        self.maxdiff={'t':0.,'all':0.}  # maximal difference above threshold
+        self._heap={'t':[],'all':[]}    # topk largest differences
+
+    def add(self,cls,ldiff,tol,nt,lineno1,lineno2,col):
+        """add a difference ldiff above threshold tol of class cls in column col
+        of the records at lineno1 in file1 and lineno2 in file2"""
+        self.count[cls]+=1
+        self.maxdiff[cls]=max(self.maxdiff[cls],ldiff)
+        # the first record and column come first for equal differences
+        self._push(cls,(ldiff,-lineno1,-col,nt,tol,lineno2))
+
+    def _push(self,cls,item):
+        heap=self._heap[cls]
+        if len(heap)<self.topk:
+            heapq.heappush(heap,item)
+        elif item>heap[0]:
+            heapq.heapreplace(heap,item)
+
+    def worst(self,cls):
+        """return the largest differences of class cls, largest first, as a list
+        of (ldiff, threshold, nt, line in file1, line in file2, column)"""
+        return [(d,tol,nt,-l1,l2,-c) for (d,l1,c,nt,tol,l2) in sorted(self._heap[cls],reverse=True)]
+
+    def format(self,file1,file2):
+        """return the largest differences with the lines of both files as text"""
+        items=self.worst('t')+self.worst('all')
+        lines1=yu_reader.read_lines(file1,[item[3] for item in items])
+        lines2=yu_reader.read_lines(file2,[item[4] for item in items])
+        out=[]
+        for (cls,label) in [('t','t,p'),('all','all')]:
+            if self.count[cls]==0:
+                continue
+            out.append('%i values of %s above threshold, largest differences:' %(self.count[cls],label))
+            for (d,tol,nt,l1,l2,c) in self.worst(cls):
+                out.append('nt=%i, %s: %1.1e above threshold %1.1e, at line %i' %(nt,label,d,tol,l1))
+                out.append('>' + lines1[l1].rstrip())
+                out.append('<' + lines2[l2].rstrip())
+        return '\n'.join(out)
+
+
+def cmp_columnar(file1,file2, \
+             v_level=0,minval=1e-15, \
+             nts=[10,100,200], \
+             tol_ts=[1e-15,1e-15,1e-15], \
+             tol_as=[1e-15,1e-15,1e-15], \
+             cache=None,steps=None,topk=10):
+
+    # same as cmp_, but both files are first parsed into typed arrays
+    # (see parse_yuprtest) and the differences are computed with
+    # vectorized operations for all lines and columns at once.
+    # Returns the same error count and prints the same output as cmp_.
+    # The parsed reference file2 is taken from cache if given.
+    # If steps is given, only the records of these time steps are compared
+    # (see yu_digest.differing_steps).
+    return diff_profile(file1,file2,cache,steps).evaluate(v_level,minval,nts,tol_ts,tol_as,topk)
+
+
+def diff_profile(file1,file2,cache=None,steps=None):
+    # parse and compare two YUPRTEST files once, the returned DiffProfile
+    # can then be evaluated for any number of tolerance settings
+    if np is None:
+        raise ImportError('The numpy engine requires numpy')
+    return DiffProfile(file1,file2,cache,steps)
+
+
+class DiffProfile:
+    """Differences between two YUPRTEST files for each time step and variable
+    class (t and all other variables), computed once and evaluated with
+    evaluate() for any thresholds as cmp_ would do. If steps is given, only the
+    records of these time steps are read and compared, with the thresholds
+    cmp_ applies to them when comparing the whole files."""
+
+    def __init__(self,file1,file2,cache=None,steps=None):
+
+        self.file1=file1
+        self.file2=file2
+        self.missing=None       # message if a file does not exist
+        self.error=[]           # messages if the files can not be compared
+        self.exception=None     # exception raised when reaching an invalid record
+        self.steps=np.zeros(0,dtype=np.int64)   # compared time steps
+        self.first=None         # first time step common to both files
+        self.nprint=0           # number of steps completed before an error
+        self._cache={}          # sorted differences for each minval
+
+        # no difference until the files are compared, evaluate then only
+        # reports the error if they can not be
+        self.lineno1=self.lineno2=np.zeros(0,dtype=np.int64)
+        self.absdiff=self.absval=self.reldiff=np.zeros(0)
+        self.record=self.column=self.group=np.zeros(0,dtype=np.int64)
+
+        # check file existence
+        for f in [file1,file2]:
+            if not(yu_reader.yufile_exists(f)):
+                self.missing='File '+f+' does not exist'
+                return
+
+        # parse files
+        d1=parse_yuprtest.read_yuprtest(file1,steps=steps)
+        d2=parse_yuprtest.read_yuprtest(file2,cache=cache,steps=steps)   # reference file
+
+        # check that files are not empty
+        for d in [d1,d2]:
+            if d.nlines==0:
+                self.error=['file ' + d.filename + ' is empty!']
+                return
+            if d.nlines<=4 or len(d)==0:
+                self.error=['file ' + d.filename + ' contains only header!']
+                return
+
+        # set the record counters to identical time step
+        start=_align_steps(d1.nt,d1.step_starts(),d2.nt,d2.step_starts())
+        if start is None:
+            self.error=['Files %s and %s do not have overlapping time steps and can not be compared.' %(file1,file2)]
+            return
+        i1,i2=start
+        self.first=d1.nt[i1]
+        if steps is not None:
+            # the first common step may not be one of the compared steps
+            first=next(yu_reader.aligned_yuprtest_records(file1,file2),None)
+            self.first=int(first[0][2][1]) if first is not None else None
+
+        # only records present in both files are compared, and only up to the
+        # first record where the variable or the time step differ
+        n=min(len(d1)-i1,len(d2)-i2)
+        names1=d1.names(i1,i1+n)
+        names2=d2.names(i2,i2+n)
+        nt1=d1.nt[i1:i1+n]
+        nt2=d2.nt[i2:i2+n]
+        bad=np.flatnonzero((names1!=names2) | (nt1!=nt2))
+        nrec=bad[0] if len(bad) else n
+
+        # values which are numbers in file1 must be numbers in file2, cmp_ fails
+        # with an exception when reaching such a record
+        ncol=d1.values.shape[1]
+        m=min(ncol,d2.values.shape[1])
+        v1=d1.values[i1:i1+nrec]
+        v2=np.nan*np.ones((nrec,ncol))
+        v2[:,:m]=d2.values[i2:i2+nrec,:m]
+        num2=np.zeros((nrec,ncol),dtype=bool)
+        num2[:,:m]=d2.numeric[i2:i2+nrec,:m]
+        wrong=np.flatnonzero((d1.numeric[i1:i1+nrec] & ~num2).any(axis=1))
+        if len(wrong):
+            nrec=wrong[0]
+            j=np.flatnonzero(d1.numeric[i1+nrec] & ~num2[nrec])[0]
+            if j>=d2.ncols[i2+nrec]:
+                self.exception=IndexError('missing value at line %i in file %s' %(d2.lineno[i2+nrec],file2))
+            else:
+                self.exception=ValueError('could not convert value at line %i in file %s' %(d2.lineno[i2+nrec],file2))
+            v1=v1[:nrec]
+            v2=v2[:nrec]
+        elif nrec<n:
+            if names1[nrec]!=names2[nrec]:
+                self.error=['!! Error: Variables differ',
+                            ' %s at line %i in file %s' %(names1[nrec],d1.lineno[i1+nrec],file1),
+                            ' %s at line %i in file %s' %(names2[nrec],d2.lineno[i2+nrec],file2)]
+            else:
+                self.error=['!! Error: Time steps differ',
+                            ' nt=%s at line %i in file %s' %(nt1[nrec],d1.lineno[i1+nrec],file1),
+                            ' nt=%s at line %i in file %s' %(nt2[nrec],d2.lineno[i2+nrec],file2)]
+
+        # steps as seen in file1, a step is completed (and its summary printed)
+        # when the next step starts, when one of the files ends or when the
+        # next record can not be compared
+        starts=np.concatenate(([0],np.flatnonzero(np.diff(nt1[:nrec]))+1)) if nrec else np.zeros(0,dtype=np.int64)
+        stops=np.append(starts[1:],nrec).astype(np.int64)
+        self.steps=nt1[starts]
+        self.nprint=len(self.steps)
+        if nrec<n and nrec>0 and nt1[nrec]==nt1[nrec-1]:
+            self.nprint-=1
+        self.lineno1=d1.lineno[i1:i1+nrec]
+        self.lineno2=d2.lineno[i2:i2+nrec]
+
+        # keep all non-zero differences of values which are compared,
+        # note: int are not considered (min-max index)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            absdiff=np.abs(v1-v2)
+            keep=~d1.intmask(i1,i1+nrec) & (absdiff>0)
+            self.absdiff=absdiff[keep]
+            self.absval=np.abs(v1[keep])
+            self.reldiff=self.absdiff/self.absval
+        self.record,self.column=np.nonzero(keep)
+
+        # group of each difference: 2*step for temperature, 2*step+1 for all other fields
+        stepidx=np.repeat(np.arange(len(self.steps)),stops-starts)
+        is_t=(names1[:nrec]=='T')
+        self.group=2*stepidx[self.record]+np.where(is_t[self.record],0,1)
+
+    def _diffs(self,minval):
+        # return the differences (absolute if minval is -1, else relative for
+        # values larger than minval) sorted by group and value, their group and
+        # record and column and the index of the first difference of each group
+        if minval not in self._cache:
+            with np.errstate(invalid='ignore'):
+                if minval==-1:
+                    ldiff=self.absdiff
+                    sel=ldiff>0
+                else:
+                    ldiff=self.reldiff
+                    sel=(self.absval>minval) & (ldiff>0)
+            ldiff=ldiff[sel]
+            group=self.group[sel]
+            record=self.record[sel]
+            column=self.column[sel]
+            # the last difference of each group is the maximum, first record if not unique
+            order=np.lexsort((-record,ldiff,group))
+            group=group[order]
+            bounds=np.searchsorted(group,np.arange(2*len(self.steps)+1))
+            self._cache[minval]=(ldiff[order],group,record[order],column[order],bounds)
+        return self._cache[minval]
+
+    def _grouptol(self,nts,tol_ts,tol_as):
+        # return the threshold of each group
+        steptol_t,steptol_a=_step_thresholds(self.steps,self.first,nts,tol_ts,tol_as)
+        grouptol=np.empty(2*len(self.steps))
+        grouptol[0::2]=steptol_t
+        grouptol[1::2]=steptol_a
+        return grouptol
+
+    def report(self, \
+             minval=1e-15, \
+             nts=[10,100,200], \
+             tol_ts=[1e-15,1e-15,1e-15], \
+             tol_as=[1e-15,1e-15,1e-15], \
+             topk=10):
+        """return a DiffReport of the differences above the thresholds, as
+        filled by cmp_"""
+        ldiff,group,record,column,bounds=self._diffs(minval)
+        grouptol=self._grouptol(nts,tol_ts,tol_as)
+        above=np.flatnonzero(ldiff>grouptol[group])
+        report=DiffReport(topk)
+        for (cls,parity) in [('t',0),('all',1)]:
+            idx=above[group[above]%2==parity]
+            report.count[cls]=len(idx)
+            if len(idx)==0:
+                continue
+            report.maxdiff[cls]=float(ldiff[idx].max())
+            # only the topk largest differences (and those equal to the
+            # smallest of them) can enter the heap
+            if len(idx)>topk:
+                kth=np.partition(ldiff[idx],len(idx)-topk)[len(idx)-topk]
+                idx=idx[ldiff[idx]>=kth]
+            for i in idx:
+                report._push(cls,(float(ldiff[i]),-int(self.lineno1[record[i]]),-int(column[i]),
+                                  int(self.steps[group[i]//2]),float(grouptol[group[i]]),
+                                  int(self.lineno2[record[i]])))
+        return report
+
+    def maxdiff(self,minval=1e-15):
+        """return the maximal difference for each step and variable class and the
+        line number in file1 where it occurs (0 if there is no difference) as a
+        list of (nt, maxdiff_t, line_t, maxdiff_all, line_all)"""
+        ldiff,group,record,column,bounds=self._diffs(minval)
+        res=[]
+        for s in range(len(self.steps)):
+            row=[int(self.steps[s])]
+            for g in [2*s,2*s+1]:
+                if bounds[g+1]>bounds[g]:
+                    row+=[ldiff[bounds[g+1]-1],int(self.lineno1[record[bounds[g+1]-1]])]
+                else:
+                    row+=[0.,0]
+            res.append(tuple(row))
+        return res
+
+    def evaluate(self, \
+             v_level=0,minval=1e-15, \
+             nts=[10,100,200], \
+             tol_ts=[1e-15,1e-15,1e-15], \
+             tol_as=[1e-15,1e-15,1e-15], \
+             topk=10):
+        """compare the differences with the thresholds, arguments, output and
+        return value are the same as for cmp_"""
+
+        file1=self.file1
+        file2=self.file2
+        if self.missing:
+            print self.missing
+            return -1
+
+        header=' '
+
+        if v_level==0:
+            print_out=['./tools/comp_yuprtest.py ' + file1 + ' ' + file2 + ' ' + str(v_level) + ' ' + str(minval) + \
+                       ' ' + ','.join([str(x) for x in nts]) + ' ' + ','.join([str(x) for x in tol_ts]) + \
+                       ' ' + ','.join([str(x) for x in tol_as]) + '\n']
+            if minval==-1:
+                print_out.append('Absolute error:\n')
+            else:
+                print_out.append('Relative error:\n')
+            print_out.append('   nt    max_all         t     Test \n')
+
+        if v_level>0:
+            if minval==-1:
+                print 'Comparing absolute differences ...'
+            else:
+                print 'Comparing relative differences, min. value is %1.0e ...' %(minval)
+
+        # threshold of each group, number of values above threshold,
+        # maximal difference and its record
+        ldiff,group,record,column,bounds=self._diffs(minval)
+        grouptol=self._grouptol(nts,tol_ts,tol_as)
+        ngroup=len(grouptol)
+        above=ldiff>grouptol[group]
+        errors=np.bincount(group[above],minlength=ngroup)
+        last=np.where(bounds[1:]>bounds[:-1],bounds[1:]-1,-1)
+        maxdiff=np.where(last>=0,np.append(ldiff,0.)[last],0.)
+        maxrec=np.where(last>=0,np.append(record,0)[last],0)
+        error_count=int(errors.sum())
+
+        # records to print: the record with the maximal diff of each step
+        # with errors
+        if v_level==1:
+            precs=[maxrec[g] for g in range(2*self.nprint) if errors[g]]
+        else:
+            precs=[]
+        lines1=yu_reader.read_lines(file1,[self.lineno1[k] for k in precs])
+        lines2=yu_reader.read_lines(file2,[self.lineno2[k] for k in precs])
+
+        print_header=True
+
+        for s in range(self.nprint):
+            if v_level==0:
+                if errors[2*s] or errors[2*s+1]:
+                    print_out.append('%4i     %1.2e     %1.2e     FAILED \n' %(self.steps[s],maxdiff[2*s+1],maxdiff[2*s]))
+                else:
+                    print_out.append('%4i     %1.2e     %1.2e     OK     \n' %(self.steps[s],maxdiff[2*s+1],maxdiff[2*s]))
+
+            if v_level==1:
+                for (g,label) in [(2*s,'t,p'),(2*s+1,'all')]:
+                    if errors[g]:
+                        k=maxrec[g]
+                        if print_header:
+                            print header
+                            print_header=False
+                        print 'nt=%i, max rel. er. %s: %1.1e above threshold %1.1e, at line %i' \
+                            %(self.steps[s],label,maxdiff[g],grouptol[g],self.lineno1[k])
+                        print '>'+ lines1[self.lineno1[k]].rstrip()
+                        print '<'+ lines2[self.lineno2[k]]
+
+        # files or records which can not be compared
+        if self.exception is not None:
+            raise self.exception
+
+        #print the largest differences for verbose 2
+        if v_level==2:
+            _print_report(self.report(minval,nts,tol_ts,tol_as,topk),header,file1,file2)
+
+        if self.error:
+            for line in self.error:
+                print line
+            return -1
+
+        #print if error detected for verbose 0
+        if (v_level==0) and (error_count>0):
+            print ''.join(print_out)
+
+        if v_level>0 and error_count==0:
+            print 'no difference above threshold'
+
+        return error_count
+
+
+def cmp_envelope(file1,files2, \
+             v_level=0,minval=1e-15, \
+             margin=0.0,tol=0.0, \
+             cache=None,topk=10):
+
+    # compare the YUPRTEST file1 with the envelope of the reference files
+    # files2 (for example an ensemble of runs with different compilers).
+    # For each time step, variable and column the minimum and maximum over
+    # all references are computed, values of file1 outside of the envelope
+    # widened by margin times its width plus tol times the value are errors.
+    # Records are matched by time step, variable and occurrence within the
+    # step, only records present in at least one reference are compared.
+    # Each file is read once, the references one after the other, so that
+    # only file1, the envelope and one reference are kept in memory. The
+    # parsed references are taken from cache if given.
+    # v_level:verbose level
+    #        -1 -> no print out
+    #         0 -> max excess over all variables for each time step
+    #         1 -> in addition, print the line with the max excess of each step
+    #         2 -> print the topk lines with the largest excess
+    # if minval is set to -1 the excess is absolute, else it is relative to
+    # the value and values smaller than minval are not considered
+    if np is None:
+        raise ImportError('The envelope comparison requires numpy')
+
+    for f in [file1]+list(files2):
+        if not(yu_reader.yufile_exists(f)):
+            print 'File '+f+' does not exist'
+            return -1
+
+    d1=parse_yuprtest.read_yuprtest(file1)
+    if len(d1)==0:
+        print 'file ' + file1 + ' contains only header!'
+        return -1
+    key1=d1.record_keys(d1.varnames,len(d1))
+    order1=np.argsort(key1)
+    compared=~d1.intmask()
+    ncol=d1.values.shape[1]
+
+    # envelope of the references, updated one reference at a time
+    lo=np.empty(d1.values.shape)
+    lo.fill(np.inf)
+    hi=np.empty(d1.values.shape)
+    hi.fill(-np.inf)
+    nref=np.zeros(len(d1),dtype=np.int64)
+    for file2 in files2:
+        d2=parse_yuprtest.read_yuprtest(file2,cache=cache)
+        key2=d2.record_keys(d1.varnames,len(d1))
+        pos=np.minimum(np.searchsorted(key1,key2,sorter=order1),len(key1)-1)
+        match=key1[order1[pos]]==key2
+        rec1=order1[pos[match]]
+        m=min(ncol,d2.values.shape[1])
+        v2=np.empty((len(rec1),ncol))
+        v2.fill(np.nan)
+        v2[:,:m]=np.where(d2.numeric[match,:m],d2.values[match,:m],np.nan)
+        with np.errstate(invalid='ignore'):
+            lo[rec1]=np.fmin(lo[rec1],v2)
+            hi[rec1]=np.fmax(hi[rec1],v2)
+        nref[rec1]+=1
+        del d2
+
+    # excess of the values outside the widened envelope
+    v1=d1.values
+    with np.errstate(invalid='ignore'):
+        widen=margin*(hi-lo)+tol*np.abs(v1)
+        excess=np.fmax(lo-widen-v1,v1-hi-widen)
+        if minval!=-1:
+            compared&=np.abs(v1)>minval
+            excess=excess/np.abs(v1)
+        excess=np.where(compared & np.isfinite(lo) & (excess>0),excess,0.)
+    excess[np.isnan(excess)]=0.
+    error_count=int((excess>0).sum())
+
+    # report for each step the maximal excess and the record where it occurs
+    recmax=excess.max(axis=1)
+    starts=d1.step_starts()
+    stops=np.append(starts[1:],len(d1))
+    stepmax=np.maximum.reduceat(recmax,starts) if len(starts) else np.zeros(0)
+    steprec=np.array([a+np.argmax(recmax[a:b]) for a,b in zip(starts,stops)],dtype=np.int64)
+    covered=np.maximum.reduceat(nref,starts)>0 if len(starts) else np.zeros(0,dtype=bool)
+
+    if v_level==0 and error_count>0:
+        print 'Envelope of %i reference files, margin %g, tol %g, %s excess:' \
+            %(len(files2),margin,tol,'absolute' if minval==-1 else 'relative')
+        print '   nt    max_excess   Test '
+        for s in np.flatnonzero(covered):
+            print '%4i     %1.2e     %s' %(d1.nt[starts[s]],stepmax[s],'FAILED' if stepmax[s]>0 else 'OK')
+
+    if v_level==1:
+        precs=[steprec[s] for s in range(len(starts)) if stepmax[s]>0]
+    elif v_level==2:
+        precs=np.argsort(-recmax,kind='mergesort')[:topk]
+        precs=precs[recmax[precs]>0]
+    else:
+        precs=[]
+    lines1=yu_reader.read_lines(file1,[d1.lineno[k] for k in precs])
+    for k in precs:
+        j=np.argmax(excess[k])
+        print 'nt=%i, %s at line %i: %g outside of envelope [%g, %g]' \
+            %(d1.nt[k],d1.varnames[d1.varid[k]],d1.lineno[k],v1[k,j],lo[k,j],hi[k,j])
+        print '>'+lines1[d1.lineno[k]].rstrip()
+
+    if v_level>0:
+        if (nref==0).any():
+            print '%i records of %s are in none of the reference files' %((nref==0).sum(),file1)
+        if error_count==0:
+            print 'no value outside of the envelope'
+        else:
+            print '%i values outside of the envelope' %(error_count)
+
+    return error_count
+
+
+def select_cmp(engine='python',cache=None,steps=None):
+    # return the comparison function for the given engine:
+    #    python -> cmp_, line by line comparison
+    #    numpy  -> cmp_columnar, vectorized comparison, the parsed
+    #              reference file is taken from cache if given and
+    #              only the given time steps are compared
+    if engine=='numpy':
+        if np is None:
+            raise ImportError('The numpy engine requires numpy')
+        return functools.partial(cmp_columnar,cache=cache,steps=steps)
+    elif engine=='python':
+        return cmp_
+    else:
+        raise ValueError('Unknown YUPRTEST comparison engine '+engine)
+
 #----------------------------------------------------------------------------
 # Local functions
+def _print_report(report,header,file1,file2):
+    # print the largest differences above threshold
+    if report.count['t'] or report.count['all']:
+        print header
+        print report.format(file1,file2)
+
 def is_num(x):
     test=True
     try:
@@ -344,9 +814,44 @@ def is_not_int(x):
     except ValueError:
         test=True
         
-    return test 
-        
-    
+    return test
+
+def _align_steps(nt1,starts1,nt2,starts2):
+    # return the first record of the first time step present in both files,
+    # the files are advanced step by step (starts* are the first record of each step)
+    j1=0
+    j2=0
+    while j1<len(starts1) and j2<len(starts2):
+        t1=nt1[starts1[j1]]
+        t2=nt2[starts2[j2]]
+        if t1<t2:
+            j1=j1+1
+        elif t1>t2:
+            j2=j2+1
+        else:
+            return starts1[j1],starts2[j2]
+    return None
+
+def _step_thresholds(steps,first,nts,tol_ts,tol_as):
+    # return the thresholds for t and all other variables for each step as
+    # done by cmp_: tol[i] is set for t=[nts[i] nts[i+1]], the thresholds are
+    # only updated when a new step starts (the first step common to both
+    # files, first, uses tol[0])
+    steptol_t=[]
+    steptol_a=[]
+    for step in steps:
+        tol_t=tol_ts[0]
+        tol_a=tol_as[0]
+        if step!=first:
+            for i in range(len(nts)):
+                if step>=nts[i] and i<len(tol_ts)-1:
+                    tol_t=tol_ts[i+1]
+                    tol_a=tol_as[i+1]
+        steptol_t.append(tol_t)
+        steptol_a.append(tol_a)
+    return steptol_t,steptol_a
+
+
 
 #-----------------------------------
 #execute as a script 
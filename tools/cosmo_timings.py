@@ -1,6 +1,7 @@
 def read_file(folder, filename):
     from os import path
-    file = open(path.join(folder, filename))
+    from yu_reader import open_yufile
+    file = open_yufile(path.join(folder, filename))
     return file.readlines()
 
 class COSMO_Run:
@@ -12,4 +12,18 @@ class DefaultValues:
     tolerance = "TOLERANCE"
     timeout  = None
     forcematch = 0
-
+    yuengine = "python"
+    yualign  = "line"
+    yucolumns = "mean"  # columns of the YUCHKDAT lines compared, "mean" or "all" (min, max and mean)
+    yucache  = None    # default is .yucache in the work directory
+    yucache_size = 1024  # MB
+    yuwatch  = False   # abort runs as soon as the YUPRTEST check is bound to fail
+    yucompress = None  # "gz" or "xz" to write compressed reference files
+    reflink  = "hard"  # link from data/ to the reference store, "hard", "symlink" or "copy"
+    checker_jobs = 1   # number of checkers of a test run concurrently
+    checker_inprocess = False  # run python checkers with check(env) in the testsuite process
+    checker_cache = None  # directory of the cache of the checker results, disabled if None
+    checker_cache_size = 64  # MB
+    runstore = None    # directory of the outputs of previous runs, restored for identical runs
+    cores    = None    # cores used by the tests run concurrently, one test at a time if None
+    history  = None    # file of the outcomes and durations of the tests, used to run first the tests likely to fail
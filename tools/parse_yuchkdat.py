@@ -0,0 +1,271 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Columnar reader for YUCHKDAT files. The file is split into sets at the
+"Check ... step:" lines and the valid lines are parsed into a 2-D array of
+the real columns (min, max and mean of each field), which can then be
+compared with vectorized operations.
+"""
+
+# built-in modules
+import re
+
+# other modules
+import numpy as np
+
+# private modules
+import yu_reader
+from yu_reader import ValidLineSize, RealPos, LevelPos, setStartKeyword, setStepKeyword
+from parse_yuprtest import tokens_to_float
+
+cache_version = 2  # increment when the parsed arrays change, invalidates yu_cache entries
+
+
+class YuchkdatData:
+    """Typed array representation of the sets and valid lines of a YUCHKDAT file"""
+
+    def __init__(self, filename, nlines, headers, titles, steps, badformat, lineno, varnames, varid, level, values):
+        self.filename = filename    # name of parsed file
+        self.nlines = nlines        # total number of lines
+        self.headers = headers      # line number (starting at 1) of the first line of each set
+        self.titles = titles        # first line of each set (tokens separated by one blank)
+        self.steps = steps          # step of each set (0 if not given)
+        self.badformat = badformat  # True if the step of the set was not recognized
+        self.lineno = lineno        # line number of each valid line
+        self.varnames = varnames    # list of variable names
+        self.varid = varid          # index into varnames for each valid line
+        self.level = level          # level of each valid line
+        self.values = values        # values of the columns RealPos of each valid line
+
+    def __len__(self):
+        return len(self.lineno)
+
+    def names(self, start=0, stop=None):
+        """return the variable name of each valid line as an array of strings"""
+        return np.array(self.varnames, dtype=str)[self.varid[start:stop]]
+
+    def sets(self):
+        """return the set of each valid line, 0 for lines before the first set"""
+        return np.searchsorted(self.headers, self.lineno, side='right')
+
+    def to_arrays(self):
+        """return the parsed data as a dictionary of arrays (see yu_cache)"""
+        return {'nlines': np.array(self.nlines), 'headers': self.headers,
+                'titles': np.array(self.titles, dtype=str), 'steps': self.steps,
+                'badformat': self.badformat, 'lineno': self.lineno,
+                'varnames': np.array(self.varnames, dtype=str), 'varid': self.varid,
+                'level': self.level, 'values': self.values}
+
+    @classmethod
+    def from_arrays(cls, filename, arrays):
+        """create an instance from the arrays returned by to_arrays"""
+        return cls(filename, int(arrays['nlines']), arrays['headers'],
+                   [str(title) for title in arrays['titles']], arrays['steps'],
+                   arrays['badformat'], arrays['lineno'],
+                   [str(name) for name in arrays['varnames']], arrays['varid'],
+                   arrays['level'], arrays['values'])
+
+
+def read_yuchkdat(filename, cache=None):
+    """parse a YUCHKDAT file into a YuchkdatData instance, the file is streamed
+    in blocks so that only the arrays are kept in memory. If cache (a
+    yu_cache.YuCache) is given, the arrays are taken from the cache as long as
+    the file does not change."""
+
+    if cache is not None:
+        arrays = cache.load(filename, 'yuchkdat%i' % cache_version,
+                            lambda f: read_yuchkdat(f).to_arrays())
+        return YuchkdatData.from_arrays(filename, arrays)
+
+    return _parse_blocks(yu_reader.line_blocks(filename), filename)
+
+
+def parse_lines(data, filename='', chunksize=100000):
+    """parse the lines of a YUCHKDAT file into a YuchkdatData instance, data is
+    either a list of lines or an iterator over (line number, line)"""
+
+    if isinstance(data, list):
+        data = enumerate(data, 1)
+
+    def chunks():
+        chunk = []
+        for lineno, line in data:
+            chunk.append(line)
+            if len(chunk) >= chunksize:
+                yield lineno-len(chunk)+1, chunk
+                chunk = []
+        if chunk:
+            yield lineno-len(chunk)+1, chunk
+
+    return _parse_blocks(chunks(), filename)
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _parse_blocks(blocks, filename):
+    """parse the (line number of the first line, lines) blocks of a file"""
+
+    nlines = 0
+    parsed = []
+    index = {}
+    for first, body in blocks:
+        parsed.append(_parse_block(body, first, index))
+        nlines = first + len(body) - 1
+    if not parsed:
+        parsed.append(_parse_block([], 1, index))
+
+    headers, steps, badformat, lineno, varid, level = \
+        [np.concatenate([block[k] for block in parsed]) for k in [0, 2, 3, 4, 5, 6]]
+    titles = [title for block in parsed for title in block[1]]
+    values = np.concatenate([block[7] for block in parsed])
+    varnames = sorted(index, key=index.get)
+
+    return YuchkdatData(filename, nlines, headers, titles, steps, badformat,
+                        lineno, varnames, varid, level, values)
+
+
+def _parse_block(body, first, index):
+    """parse consecutive lines starting at line number first, variable ids
+    are taken from (and new variables added to) index"""
+
+    nrows = len(body)
+    text = ''.join(body)
+    newlines = np.flatnonzero(np.frombuffer(text, dtype=np.uint8) == ord('\n'))
+
+    # sets start with a line whose first token contains setStartKeyword,
+    # only the few lines containing the keyword are split
+    headers = []
+    titles = []
+    steps = []
+    badformat = []
+    candidates = np.unique(np.searchsorted(newlines, [m.start() for m in re.finditer(re.escape(setStartKeyword), text)]))
+    for i in candidates:
+        tokens = body[i].split()
+        if not (tokens and setStartKeyword in tokens[0]):
+            continue
+        step = 0
+        bad = False
+        if len(tokens) > 1 and setStepKeyword in tokens[-2]:
+            try:
+                step = int(tokens[-1])
+            except ValueError:
+                bad = True
+        headers.append(first+i)
+        titles.append(' '.join(tokens))
+        steps.append(step)
+        badformat.append(bad)
+
+    # tokenize the text with byte operations: first and last byte of each
+    # token, number of tokens and first token of each line
+    b = np.frombuffer(text, dtype=np.uint8)
+    ws = _space[b]
+    tstart = np.flatnonzero(~ws[1:] & ws[:-1]) + 1
+    tend = np.flatnonzero(~ws[:-1] & ws[1:]) + 1
+    if len(b) and not ws[0]:
+        tstart = np.r_[0, tstart]
+    if len(b) and not ws[-1]:
+        tend = np.r_[tend, len(b)]
+    tfirst = np.searchsorted(tstart, np.r_[0, newlines + 1][:nrows])
+    counts = np.diff(np.r_[tfirst, len(tstart)])
+
+    # valid lines have ValidLineSize tokens and real numbers (containing
+    # a ".") at the positions RealPos, tokens not written in E format are
+    # converted one by one
+    rows = np.flatnonzero(counts == ValidLineSize)
+    real = (tfirst[rows][:, None] + RealPos).ravel()
+    values, ok = _efloat(b, tstart[real], tend[real])
+    if not ok.all():
+        idx = np.flatnonzero(~ok)
+        tokens = [text[i:j] for i, j in zip(tstart[real[idx]], tend[real[idx]])]
+        val, numeric = tokens_to_float(tokens, len(idx), 1)
+        values[idx] = val[:, 0]
+        ok[idx] = numeric[:, 0] & np.array(['.' in t for t in tokens], dtype=bool)
+    valid = ok.reshape(-1, len(RealPos)).all(axis=1)
+    values = values.reshape(-1, len(RealPos))[valid]
+    rows = rows[valid]
+
+    # variable names
+    start = tstart[tfirst[rows]]
+    end = tend[tfirst[rows]]
+    width = int((end - start).max()) if len(rows) else 1
+    names, varid = np.unique(_gather(b, start, end, width).view('S%i' % width).ravel(),
+                             return_inverse=True)
+    ids = np.array([index.setdefault(name, len(index)) for name in names], dtype=np.int32)
+    varid = ids[varid] if len(names) else np.zeros(0, dtype=np.int32)
+
+    # levels, -1 if not an integer
+    start = tstart[tfirst[rows] + LevelPos]
+    end = tend[tfirst[rows] + LevelPos]
+    width = int((end - start).max()) if len(rows) else 1
+    try:
+        level = _gather(b, start, end, width).view('S%i' % width).ravel().astype(np.int64)
+    except ValueError:
+        level = np.array([int(x) if x.lstrip('-').isdigit() else -1 for x in
+                          _gather(b, start, end, width).view('S%i' % width).ravel()], dtype=np.int64)
+
+    return (np.array(headers, dtype=np.int64), titles, np.array(steps, dtype=np.int64),
+            np.array(badformat, dtype=bool), first + rows.astype(np.int64),
+            varid, level, values)
+
+
+def _efloat(b, start, end):
+    """convert the tokens b[start:end] written in Fortran E format (for
+    example -2.8164376E+02) to float, returns the values and a mask of the
+    converted tokens. The integer mantissa is multiplied or divided once by
+    an exact power of ten, the result is thus correctly rounded as float()"""
+
+    n = len(start)
+    values = np.zeros(n)
+    ok = np.zeros(n, dtype=bool)
+    width = int((end - start).max()) if n else 0
+    if width < 6:
+        return values, ok
+
+    # bytes of the tokens, right aligned and padded with blanks
+    c = _gather(b, start, end, width, right=True)
+    digit = (c >= ord('0')) & (c <= ord('9'))
+
+    # layout [-]d.dddE+dd with the decimal point at the same position
+    pd = np.bincount(np.argmax(c[:, :-4] == ord('.'), axis=1)).argmax()
+    ndec = width - 5 - pd
+    if pd < 1 or ndec < 1 or ndec > 14:
+        return values, ok
+    ok = ((c[:, -4] == ord('E')) | (c[:, -4] == ord('e'))) & \
+         ((c[:, -3] == ord('+')) | (c[:, -3] == ord('-'))) & digit[:, -1] & digit[:, -2] & \
+         (c[:, pd] == ord('.')) & digit[:, pd-1] & digit[:, pd+1:-4].all(axis=1)
+    if pd >= 2:
+        ok &= (c[:, pd-2] == ord('-')) | (c[:, pd-2] == ord(' '))
+        ok &= (c[:, :pd-2] == ord(' ')).all(axis=1)
+
+    # integer mantissa and exponent
+    mant = np.dot(c[:, np.r_[pd-1, pd+1:width-4]].astype(np.int64) - ord('0'),
+                  10**np.arange(ndec, -1, -1, dtype=np.int64))
+    exp = (c[:, -2].astype(np.int64) - ord('0'))*10 + c[:, -1] - ord('0')
+    exp = np.where(c[:, -3] == ord('-'), -exp, exp) - ndec
+    ok &= np.abs(exp) < len(_pow10)
+    scale = _pow10[np.minimum(np.abs(exp), len(_pow10)-1)]
+    values = np.where(exp >= 0, mant*scale, mant/scale)
+    if pd >= 2:
+        values = np.where(c[:, pd-2] == ord('-'), -values, values)
+    return values, ok
+
+_pow10 = np.array([float(10**i) for i in range(23)])  # exact powers of ten
+
+
+def _gather(b, start, end, width, right=False):
+    """return the bytes b[start:end] of each token as (ntokens, width) array,
+    left aligned and padded with zeros or right aligned and padded with blanks"""
+    if right:
+        pos = end[:, None] - width + np.arange(width)
+        c = b[np.maximum(pos, 0)]
+        c[pos < start[:, None]] = ord(' ')
+    else:
+        pos = start[:, None] + np.arange(width)
+        c = b[np.minimum(pos, len(b)-1)]
+        c[pos >= end[:, None]] = 0
+    return c
+
+_space = np.zeros(256, dtype=bool)  # True for whitespace bytes
+_space[[ord(x) for x in ' \t\n\r\x0b\x0c']] = True
@@ -0,0 +1,270 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Columnar reader for YUPRTEST files. The file is parsed into typed arrays
+(variable id, time step, value columns and a mask of the integer columns)
+which can then be compared with vectorized operations.
+"""
+
+# built-in modules
+import warnings
+
+# other modules
+import numpy as np
+
+# private modules
+import yu_reader
+from yu_reader import comment_type
+
+cache_version = 1  # increment when the parsed arrays change, invalidates yu_cache entries
+
+
+class YuprtestData:
+    """Typed array representation of the data lines of a YUPRTEST file"""
+
+    def __init__(self, filename, nlines, lineno, varnames, varid, nt, values, numeric, ncols):
+        self.filename = filename  # name of parsed file
+        self.nlines = nlines      # total number of lines (including header)
+        self.lineno = lineno      # line number (starting at 1) of each record
+        self.varnames = varnames  # list of variable names
+        self.varid = varid        # index into varnames for each record
+        self.nt = nt              # time step of each record
+        self.values = values      # float value of each column (NaN if not a number)
+        self.numeric = numeric    # True where the column could be read as a number
+        self.ncols = ncols        # number of columns of each record
+
+    def __len__(self):
+        return len(self.nt)
+
+    def names(self, start=0, stop=None):
+        """return the variable name of each record as an array of strings"""
+        return np.asarray(self.varnames)[self.varid[start:stop]]
+
+    def intmask(self, start=0, stop=None):
+        """return True for the columns which hold integer values (min/max indices)
+        or no number and are thus not compared, note that 0.0 is not an integer"""
+        values = self.values[start:stop]
+        with np.errstate(invalid='ignore'):
+            return ~self.numeric[start:stop] | ((np.trunc(values) == values) & (values != 0.))
+
+    def step_starts(self):
+        """return the index of the first record of each time step"""
+        if len(self.nt) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(([0], np.flatnonzero(np.diff(self.nt)) + 1))
+
+    def select(self, mask):
+        """return the records where mask is True"""
+        return YuprtestData(self.filename, self.nlines, self.lineno[mask], self.varnames,
+                            self.varid[mask], self.nt[mask], self.values[mask],
+                            self.numeric[mask], self.ncols[mask])
+
+    def record_keys(self, varnames, nocc):
+        """return an integer key for each record from its time step, its variable
+        (index in varnames) and its occurrence within the time step and variable,
+        which identifies the record in files with the same time steps and
+        variables. The key is -1 for variables not in varnames and occurrences
+        not below nocc."""
+        index = dict((name, i) for i, name in enumerate(varnames))
+        ids = np.array([index.get(name, -1) for name in self.varnames]+[-1], dtype=np.int64)
+        var = ids[self.varid]
+        n = len(self.nt)
+        order = np.lexsort((np.arange(n), var, self.nt))
+        new = np.ones(n, dtype=bool)
+        new[1:] = (np.diff(self.nt[order]) != 0) | (np.diff(var[order]) != 0)
+        first = np.maximum.accumulate(np.where(new, np.arange(n), 0))
+        occ = np.empty(n, dtype=np.int64)
+        occ[order] = np.arange(n) - first
+        key = (self.nt*len(varnames) + var)*nocc + occ
+        key[(var < 0) | (occ >= nocc)] = -1
+        return key
+
+    def to_arrays(self):
+        """return the parsed data as a dictionary of arrays (see yu_cache)"""
+        return {'nlines': np.array(self.nlines), 'lineno': self.lineno,
+                'varnames': np.array(self.varnames, dtype=str), 'varid': self.varid,
+                'nt': self.nt, 'values': self.values, 'numeric': self.numeric,
+                'ncols': self.ncols}
+
+    @classmethod
+    def from_arrays(cls, filename, arrays):
+        """create an instance from the arrays returned by to_arrays"""
+        return cls(filename, int(arrays['nlines']), arrays['lineno'],
+                   [str(name) for name in arrays['varnames']], arrays['varid'],
+                   arrays['nt'], arrays['values'], arrays['numeric'], arrays['ncols'])
+
+
+def read_yuprtest(filename, chunksize=100000, cache=None, steps=None):
+    """parse a YUPRTEST file into a YuprtestData instance, the file is streamed
+    in chunks of chunksize lines so that only the arrays are kept in memory.
+    If cache (a yu_cache.YuCache) is given, the arrays are taken from the cache
+    as long as the file does not change. If steps is given, only the records
+    of these time steps are read."""
+
+    if cache is not None:
+        arrays = cache.load(filename, 'yuprtest%i' % cache_version,
+                            lambda f: read_yuprtest(f, chunksize).to_arrays())
+        data = YuprtestData.from_arrays(filename, arrays)
+        if steps is not None:
+            data = data.select(np.in1d(data.nt, list(steps)))
+        return data
+
+    lines = yu_reader.lines(filename)
+    if steps is not None:
+        lines = _step_lines(lines, set(steps))
+    return parse_lines(lines, filename, chunksize)
+
+
+def parse_lines(data, filename='', chunksize=100000):
+    """parse the lines of a YUPRTEST file into a YuprtestData instance, data is
+    either a list of lines or an iterator over (line number, line)"""
+
+    if isinstance(data, list):
+        data = enumerate(data, 1)
+
+    # remove the header part (all lines starting with comment_type) and
+    # parse the records in chunks with their line numbers, which are not
+    # contiguous if only some time steps are read (see _step_lines)
+    nlines = 0
+    header = True
+    chunk = []
+    numbers = []
+    blocks = []
+    index = {}
+    for nlines, line in data:
+        if header:
+            tokens = line.split()
+            if not tokens or tokens[0] == comment_type:
+                continue
+            header = False
+        chunk.append(line)
+        numbers.append(nlines)
+        if len(chunk) >= chunksize:
+            blocks.append(_parse_block(chunk, numbers, index, filename))
+            chunk = []
+            numbers = []
+    if chunk or not blocks:
+        blocks.append(_parse_block(chunk, numbers, index, filename))
+
+    # merge blocks, padding values for blocks with less columns
+    ncols = max([block[3].shape[1] for block in blocks])
+    values = np.empty((sum([len(block[0]) for block in blocks]), ncols))
+    values.fill(np.nan)
+    numeric = np.zeros(values.shape, dtype=bool)
+    i = 0
+    for block in blocks:
+        n, m = block[3].shape
+        values[i:i+n, :m] = block[3]
+        numeric[i:i+n, :m] = block[4]
+        i += n
+    lineno, varid, nt, counts = [np.concatenate([block[k] for block in blocks]) for k in [0, 1, 2, 5]]
+    varnames = sorted(index, key=index.get)
+
+    return YuprtestData(filename, nlines, lineno, varnames, varid, nt, values, numeric, counts)
+
+
+def count_tokens(text, nlines):
+    """return the number of whitespace separated tokens on each line of text"""
+    if nlines == 0:
+        return np.zeros(0, dtype=np.int64)
+    b = np.frombuffer(text, dtype=np.uint8)
+    ws = (b == ord(' ')) | (b == ord('\n')) | (b == ord('\t')) | (b == ord('\r'))
+    starts = np.flatnonzero(~ws & np.concatenate(([True], ws[:-1])))
+    line = np.searchsorted(np.flatnonzero(b == ord('\n')), starts)
+    return np.bincount(line, minlength=nlines)[:nlines]
+
+
+def tokens_to_float(tokens, nrows, ncols):
+    """convert a list of tokens to a (nrows, ncols) float array and a mask
+    of the tokens which are numbers, non-numbers are set to NaN"""
+    if nrows == 0 or ncols == 0:
+        return np.zeros((nrows, ncols)), np.zeros((nrows, ncols), dtype=bool)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        values = np.fromstring(' '.join(tokens), sep=' ')
+    if values.size == nrows*ncols:
+        return values.reshape(nrows, ncols), np.ones((nrows, ncols), dtype=bool)
+    # not all tokens are numbers, convert column by column
+    block = np.array(tokens).reshape(nrows, ncols)
+    values = np.empty((nrows, ncols))
+    numeric = np.empty((nrows, ncols), dtype=bool)
+    for j in range(ncols):
+        values[:, j], numeric[:, j] = _column_to_float(block[:, j])
+    return values, numeric
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _step_lines(lines, steps):
+    """yield the (line number, line) of the records of the given time steps"""
+    for i, line in lines:
+        tokens = line.split(None, 2)
+        if len(tokens) > 1 and tokens[0] != comment_type:
+            try:
+                if int(tokens[1]) in steps:
+                    yield i, line
+            except ValueError:
+                pass
+
+
+def _parse_block(body, numbers, index, filename):
+    """parse the records body at the line numbers numbers, variable ids are
+    taken from (and new variables added to) index"""
+
+    nrows = len(body)
+    lineno = np.array(numbers, dtype=np.int64)
+    text = ''.join(body)
+    tokens = text.split()
+    counts = count_tokens(text, nrows)
+    if nrows and counts.min() < 2:
+        i = np.flatnonzero(counts < 2)[0]
+        raise ValueError('Malformed line %i in file %s' %(lineno[i], filename))
+    ncols = int(counts.max()) if nrows else 2
+
+    # the variable name is never a number, all other columns are converted
+    # to float and padded with NaN for records with less columns
+    values = np.empty((nrows, ncols))
+    values.fill(np.nan)
+    numeric = np.zeros((nrows, ncols), dtype=bool)
+    if nrows and counts.min() == ncols:
+        # all records have the same number of columns
+        names = tokens[0::ncols]
+        del tokens[0::ncols]
+        values[:, 1:], numeric[:, 1:] = tokens_to_float(tokens, nrows, ncols-1)
+    else:
+        rows = [line.split() for line in body]
+        names = [row[0] for row in rows]
+        for n in np.unique(counts):
+            sel = np.flatnonzero(counts == n)
+            block = [t for i in sel for t in rows[i][1:]]
+            values[sel, 1:n], numeric[sel, 1:n] = tokens_to_float(block, len(sel), n-1)
+
+    # variable names and time steps
+    for name in set(names):
+        index.setdefault(name, len(index))
+    varid = np.array([index[name] for name in names], dtype=np.int32)
+    if not (numeric[:, 1].all() and (np.trunc(values[:, 1]) == values[:, 1]).all()):
+        i = np.flatnonzero(~numeric[:, 1] | (np.trunc(values[:, 1]) != values[:, 1]))[0]
+        raise ValueError('Invalid time step at line %i in file %s' %(lineno[i], filename))
+    nt = values[:, 1].astype(np.int64)
+
+    return lineno, varid, nt, values, numeric, counts
+
+
+def _column_to_float(col):
+    """convert a column of strings to float, non-numbers are set to NaN"""
+    try:
+        return col.astype(np.float64), np.ones(len(col), dtype=bool)
+    except ValueError:
+        # fall back to element-wise conversion for this column only
+        val = np.empty(len(col))
+        ok = np.ones(len(col), dtype=bool)
+        for i, x in enumerate(col):
+            try:
+                val[i] = float(x)
+            except ValueError:
+                val[i] = np.nan
+                ok[i] = False
+        return val, ok
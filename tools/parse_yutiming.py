@@ -1,5 +1,7 @@
 import re
 
+from yu_reader import open_yufile
+
 
 class RowData:
     """Representation of a row in a data table."""
@@ -190,7 +192,7 @@ class HirarchicalTableParser(object):
 
 def get_yutiming_header_data(f, header_start=7, header_end=9):
     """Parse given YUTIMING file and return its header data as a dictionary."""
-    with open(f, 'r') as file_:
+    with open_yufile(f) as file_:
         lines = file_.readlines()
         regex = re.compile(r'^(\s*.*?)(\d+\.\d*)\s*')
         d = {}
@@ -210,6 +212,6 @@ def get_yutiming_body_data(f):
     htb = HirarchicalTableParser(
             data_col_names=['min', 'avg', 'max', 'total'],
             subcategory_indention=' '*2)
-    with open(f, 'r') as file_:
+    with open_yufile(f) as file_:
         htb.parse_lines(file_.readlines())
     return htb.as_dict()
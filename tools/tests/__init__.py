@@ -0,0 +1,6 @@
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the testsuite tools, run from the tools directory with
+python -m unittest discover tests
+"""
@@ -0,0 +1,175 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the YUCHKDAT comparisons of comp_yuchkdat: the numpy engine
+(cmp_columnar) must return the same error count and print the same output
+as the python engine (cmp_).
+"""
+
+# built-in modules
+import re, unittest
+
+# private modules
+import comp_yuchkdat
+from tests.yu_files import TempDirTestCase, write, yuchkdat_text
+from tests.test_comp_yuprtest import run
+
+nts = [1, 2, 4]
+tols = [1e-9, 1e-7, 1e-5]
+
+
+def perturb(text, lineno, column, factor):
+    """return text with the value of column of line lineno (starting at 1)
+    multiplied by factor"""
+    lines = text.split('\n')
+    tokens = lines[lineno-1].split()
+    tokens[column] = '%14.7E' % (float(tokens[column])*factor)
+    lines[lineno-1] = '  ' + ' '.join(tokens)
+    return '\n'.join(lines)
+
+
+class ParityTest(TempDirTestCase):
+    """the numpy engine gives the same result and output as cmp_"""
+
+    def assertSame(self, file1, file2, *args, **kwargs):
+        expected = run(comp_yuchkdat.cmp_, file1, file2, *args, **kwargs)
+        self.assertEqual(run(comp_yuchkdat.cmp_columnar, file1, file2, *args, **kwargs), expected)
+        return expected
+
+    def test_perturbations(self):
+        ref = write(self.path('ref'), yuchkdat_text())
+        for perturbed, pert in [((), 0.), ((0,), 1e-8), ((1, 3), 1e-6), ((4,), 1e-3)]:
+            run_file = write(self.path('run'), yuchkdat_text(perturbed=perturbed, pert=pert))
+            for v_level in [-1, 0, 1]:
+                for minval in [1e-15, -1, 200.]:
+                    for columns in ['mean', 'all']:
+                        result, output = self.assertSame(run_file, ref, v_level, minval, nts, tols,
+                                                         columns=columns)
+                        if pert == 0. or pert == 1e-3:
+                            self.assertEqual(result == 0, pert == 0.)
+
+    def test_columns(self):
+        # only the min of a line of the second set differs
+        text = yuchkdat_text()
+        ref = write(self.path('ref'), text)
+        run_file = write(self.path('run'), perturb(text, 20, 3, 1.001))
+        for v_level in [0, 1]:
+            self.assertEqual(self.assertSame(run_file, ref, v_level, 1e-15, nts, tols, columns='mean')[0], 0)
+            self.assertEqual(self.assertSame(run_file, ref, v_level, 1e-15, nts, tols, columns='all')[0], 1)
+
+    def test_files_which_can_not_be_compared(self):
+        ref = write(self.path('ref'), yuchkdat_text())
+        files = [write(self.path('empty'), ''),
+                 write(self.path('text'), 'no valid line\n'),
+                 write(self.path('renamed'), yuchkdat_text().replace('  QV ', '  QC ')),
+                 self.path('missing')]
+        for f in files:
+            for v_level in [0, 1]:
+                self.assertEqual(self.assertSame(f, ref, v_level, 1e-15, nts, tols)[0], -1)
+                self.assertEqual(self.assertSame(ref, f, v_level, 1e-15, nts, tols)[0], -1)
+        # the comparison ends with the shorter file
+        short = write(self.path('short'), yuchkdat_text(nsteps=2, perturbed=(1,), pert=1e-3))
+        self.assertEqual(self.assertSame(short, ref, 0, 1e-15, nts, tols)[0], 10)
+
+    def test_profile(self):
+        ref = write(self.path('ref'), yuchkdat_text())
+        run_file = write(self.path('run'), yuchkdat_text(perturbed=(1, 2, 4), pert=1e-6))
+        profile = comp_yuchkdat.diff_profile(run_file, ref, columns='all')
+        for i in range(2):
+            for minval in [1e-15, -1]:
+                for tols_ in [tols, [1e-5, 1e-5, 1e-5], [1e-9, 1e-9, 1e-9]]:
+                    expected = run(comp_yuchkdat.cmp_, run_file, ref, 1, minval, nts, tols_, columns='all')
+                    self.assertEqual(run(profile.evaluate, 1, minval, nts, tols_), expected)
+
+    def test_select_cmp(self):
+        self.assertEqual(comp_yuchkdat.select_cmp('python', columns='all').keywords, {'columns': 'all'})
+        self.assertEqual(comp_yuchkdat.select_cmp('numpy').func, comp_yuchkdat.cmp_columnar)
+        self.assertRaises(ValueError, comp_yuchkdat.select_cmp, 'numpy', columns='min')
+        self.assertRaises(ValueError, comp_yuchkdat.select_cmp, 'fortran')
+
+
+class KeyAlignmentTest(TempDirTestCase):
+    """with align='key' the lines are matched by set, variable and level"""
+
+    def key_cmp(self, file1, file2, v_level=0):
+        return run(comp_yuchkdat.cmp_columnar, file1, file2, v_level, 1e-15, nts, tols, align='key')
+
+    def test_aligned_files(self):
+        ref = write(self.path('ref'), yuchkdat_text())
+        run_file = write(self.path('run'), yuchkdat_text(perturbed=(1, 3), pert=1e-6))
+        for v_level in [0, 1]:
+            self.assertEqual(self.key_cmp(run_file, ref, v_level),
+                             run(comp_yuchkdat.cmp_, run_file, ref, v_level, 1e-15, nts, tols))
+
+    def test_reordered_lines(self):
+        text = yuchkdat_text(perturbed=(3,), pert=1e-3)
+        lines = text.split('\n')
+        lines[17], lines[26] = lines[26], lines[17]
+        ref = write(self.path('ref'), yuchkdat_text())
+        run_file = write(self.path('run'), '\n'.join(lines))
+        self.assertEqual(run(comp_yuchkdat.cmp_, run_file, ref)[0], -1)
+        result, output = self.key_cmp(run_file, ref, 0)
+        self.assertEqual(result, 10)
+        self.assertTrue('step 3' in output)
+
+    def test_extra_and_missing_lines(self):
+        lines = yuchkdat_text().split('\n')
+        ref = write(self.path('ref'), '\n'.join(lines))
+        # a line removed in the second set, a new variable in the fourth
+        lines.insert(55, lines[54].replace('  QV ', '  QC '))
+        del lines[20]
+        run_file = write(self.path('run'), '\n'.join(lines))
+        result, output = self.key_cmp(run_file, ref, 1)
+        self.assertEqual(result, 0)
+        self.assertEqual(output.splitlines()[-3:],
+                         ['Extra lines in %s: 1, missing lines from %s: 1' % (run_file, ref),
+                          ' extra   : line 55 in file %s' % run_file,
+                          ' missing : line 21 in file %s' % ref])
+
+    def test_repeated_keys(self):
+        # lines with the same key are matched in order of occurrence
+        lines = yuchkdat_text(nsteps=1).split('\n')
+        ref = write(self.path('ref'), '\n'.join(lines[:13] + lines[3:13] + lines[13:]))
+        lines = yuchkdat_text(nsteps=1, perturbed=(0,), pert=1e-3).split('\n')
+        run_file = write(self.path('run'), '\n'.join(yuchkdat_text(nsteps=1).split('\n')[:13] + lines[3:13] + lines[13:]))
+        result, output = self.key_cmp(run_file, ref, 0)
+        self.assertEqual(result, 10)
+        line = int(re.search('at line (\d+),', output).group(1))
+        self.assertTrue(14 <= line <= 23)
+
+    def test_python_engine(self):
+        self.assertRaises(ValueError, comp_yuchkdat.select_cmp, 'python', align='key')
+        self.assertRaises(ValueError, comp_yuchkdat.diff_profile, 'f1', 'f2', align='set')
+
+
+class ReportTest(TempDirTestCase):
+    """only the topk largest differences are kept"""
+
+    def test_heap(self):
+        report = comp_yuchkdat.DiffReport(topk=2)
+        for k, d in enumerate([1., 3., 2., 3.]):
+            report.add(d, 0.1, 4, 10 + k, 20 + k)
+        self.assertEqual((report.count, report.maxdiff), (4, 3.))
+        self.assertEqual(report.worst(), [(3., 0.1, 4, 11, 21), (3., 0.1, 4, 13, 23)])
+
+    def test_engines(self):
+        ref = write(self.path('ref'), yuchkdat_text())
+        run_file = write(self.path('run'), yuchkdat_text(perturbed=(1, 2, 4), pert=1e-5))
+        for topk in [1, 4, 100]:
+            for columns in ['mean', 'all']:
+                report = comp_yuchkdat.DiffReport(topk)
+                result, output = run(comp_yuchkdat.cmp_, run_file, ref, -1, 1e-15, nts, tols,
+                                     columns=columns, report=report)
+                columnar = comp_yuchkdat.diff_profile(run_file, ref, columns=columns).report(1e-15, nts, tols, topk)
+                self.assertEqual((columnar.count, columnar.maxdiff), (report.count, report.maxdiff))
+                self.assertEqual(columnar.worst(), report.worst())
+                self.assertEqual(len(report.worst()), min(topk, result))
+        # the number of lines above threshold is given if not all are shown
+        result, output = run(comp_yuchkdat.cmp_, run_file, ref, 1, 1e-15, nts, tols, topk=3)
+        self.assertEqual(output.count('\n>'), 3)
+        self.assertTrue('%i lines above threshold, the 3 largest differences are shown' % result in output)
+
+if __name__ == "__main__":
+    unittest.main()
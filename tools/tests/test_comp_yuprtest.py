@@ -0,0 +1,273 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the YUPRTEST comparisons of comp_yuprtest: the numpy engine
+(cmp_columnar) must return the same error count and print the same output
+as the python engine (cmp_).
+"""
+
+# built-in modules
+import sys, re, unittest, StringIO
+
+# private modules
+import comp_yuprtest
+import yu_digest
+from tests.yu_files import TempDirTestCase, write, write_yuprtest, yuprtest_header, yuprtest_lines
+
+nts = [10, 15, 25]
+tols = [1e-9, 1e-7, 1e-5]
+
+
+def run(cmp, *args, **kwargs):
+    """return the result and the output of a comparison"""
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        result = cmp(*args, **kwargs)
+        return result, sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+class ParityTest(TempDirTestCase):
+    """the numpy engine gives the same result and output as cmp_"""
+
+    def assertSame(self, file1, file2, *args, **kwargs):
+        expected = run(comp_yuprtest.cmp_, file1, file2, *args, **kwargs)
+        self.assertEqual(run(comp_yuprtest.cmp_columnar, file1, file2, *args, **kwargs), expected)
+        return expected
+
+    def test_perturbations(self):
+        ref = write_yuprtest(self.path('ref'))
+        for perturbed, pert in [((), 0.), ((0,), 1e-12), ((3, 12), 1e-8), ((12, 20, 29), 1e-6), ((27,), 1e-3)]:
+            run_file = write_yuprtest(self.path('run'), perturbed=perturbed, pert=pert)
+            for v_level in [-1, 0, 1, 2]:
+                for minval in [1e-15, -1, 100.]:
+                    result, output = self.assertSame(run_file, ref, v_level, minval, nts, tols, tols)
+                    if pert == 0. or pert == 1e-3:
+                        self.assertEqual(result == 0, pert == 0.)
+        # fewer differences reported than found
+        run_file = write_yuprtest(self.path('run'), perturbed=range(30), pert=1e-3)
+        result, output = self.assertSame(run_file, ref, 2, 1e-15, nts, tols, tols, topk=3)
+        self.assertEqual(output.count('\n>'), 6)
+
+    def test_steps_of_the_files(self):
+        ref = write_yuprtest(self.path('ref'))
+        # the comparison starts at the first common step and ends with the
+        # shorter file
+        for nsteps, first in [(20, 0), (20, 5), (30, 10), (2, 28)]:
+            run_file = write_yuprtest(self.path('run'), nsteps=nsteps, first=first, perturbed=(12, 28), pert=1e-6)
+            for v_level in [0, 1, 2]:
+                self.assertSame(run_file, ref, v_level, 1e-15, nts, tols, tols)
+                self.assertSame(ref, run_file, v_level, 1e-15, nts, tols, tols)
+
+    def test_records_which_differ(self):
+        ref = write_yuprtest(self.path('ref'))
+        lines = yuprtest_lines(perturbed=(2,), pert=1e-6)
+        cases = [lines[:35] + [lines[36], lines[35]] + lines[37:],   # variables differ
+                 lines[:50] + lines[60:],                              # a step is missing
+                 lines[:35] + [lines[35].replace('U ', 'W ')] + lines[36:]]
+        for records in cases:
+            run_file = write(self.path('run'), yuprtest_header + ''.join(records))
+            for v_level in [0, 1, 2]:
+                result, output = self.assertSame(run_file, ref, v_level, 1e-15, nts, tols, tols)
+                self.assertEqual(result, -1)
+
+    def test_files_which_can_not_be_compared(self):
+        ref = write_yuprtest(self.path('ref'))
+        files = [write(self.path('empty'), ''),
+                 write(self.path('header'), yuprtest_header),
+                 write_yuprtest(self.path('later'), nsteps=5, first=40),
+                 self.path('missing')]
+        for f in files:
+            for v_level in [0, 1, 2]:
+                self.assertEqual(self.assertSame(f, ref, v_level)[0], -1)
+                self.assertEqual(self.assertSame(ref, f, v_level)[0], -1)
+
+    def test_select_cmp(self):
+        self.assertTrue(comp_yuprtest.select_cmp('python') is comp_yuprtest.cmp_)
+        self.assertEqual(comp_yuprtest.select_cmp('numpy', steps=[1]).keywords, {'cache': None, 'steps': [1]})
+        self.assertRaises(ValueError, comp_yuprtest.select_cmp, 'fortran')
+
+class ProfileTest(TempDirTestCase):
+    """a DiffProfile evaluated with several settings gives the results of cmp_"""
+
+    def test_evaluate(self):
+        ref = write_yuprtest(self.path('ref'))
+        run_file = write_yuprtest(self.path('run'), perturbed=(3, 12, 20), pert=1e-6)
+        profile = comp_yuprtest.diff_profile(run_file, ref)
+        settings = [(v_level, minval, nts_, tols_)
+                    for v_level in [0, 1, 2]
+                    for minval in [1e-15, -1, 200.]
+                    for nts_, tols_ in [(nts, tols), ([5, 10, 20], [1e-5, 1e-8, 1e-4]), ([100], [1e-15])]]
+        # twice, the differences sorted for each minval are reused
+        for setting in settings + settings:
+            expected = run(comp_yuprtest.cmp_, run_file, ref, *(setting + (setting[3],)))
+            self.assertEqual(run(profile.evaluate, *(setting + (setting[3],))), expected)
+
+    def test_maxdiff(self):
+        ref = write_yuprtest(self.path('ref'), nsteps=4)
+        run_file = write_yuprtest(self.path('run'), nsteps=4, perturbed=(2,), pert=1e-6)
+        maxdiff = comp_yuprtest.diff_profile(run_file, ref).maxdiff()
+        self.assertEqual([row[0] for row in maxdiff], [0, 1, 2, 3])
+        for row in maxdiff:
+            if row[0] == 2:
+                # the mean is perturbed by 2e-6, T is on lines 27 and 28
+                self.assertAlmostEqual(row[1], 2e-6, 10)
+                self.assertAlmostEqual(row[3], 2e-6, 10)
+                self.assertTrue(row[2] in (27, 28))
+            else:
+                self.assertEqual(row[1:], (0., 0, 0., 0))
+
+    def test_files_which_can_not_be_compared(self):
+        ref = write_yuprtest(self.path('ref'))
+        result, output = run(comp_yuprtest.diff_profile(self.path('missing'), ref).evaluate)
+        self.assertEqual((result, output), (-1, 'File %s does not exist\n' % self.path('missing')))
+        header = write(self.path('header'), yuprtest_header)
+        profile = comp_yuprtest.diff_profile(header, ref)
+        self.assertEqual(profile.maxdiff(), [])
+        self.assertEqual(run(profile.evaluate, 1), (-1, 'Comparing relative differences, min. value is 1e-15 ...\n'
+                                                        'file %s contains only header!\n' % header))
+
+class ReportTest(TempDirTestCase):
+    """only the topk largest differences are kept"""
+
+    def test_heap(self):
+        report = comp_yuprtest.DiffReport(topk=3)
+        for k, d in enumerate([1., 5., 3., 5., 2., 4., 0.5]):
+            report.add('all', d, 0.1, 10, 100 + k, 200 + k, 3)
+        report.add('t', 7., 0.2, 20, 50, 60, 9)
+        self.assertEqual(report.count, {'t': 1, 'all': 7})
+        self.assertEqual(report.maxdiff, {'t': 7., 'all': 5.})
+        # the first line comes first for equal differences
+        self.assertEqual(report.worst('all'), [(5., 0.1, 10, 101, 201, 3), (5., 0.1, 10, 103, 203, 3),
+                                               (4., 0.1, 10, 105, 205, 3)])
+        self.assertEqual(report.worst('t'), [(7., 0.2, 20, 50, 60, 9)])
+
+    def test_engines(self):
+        ref = write_yuprtest(self.path('ref'))
+        run_file = write_yuprtest(self.path('run'), perturbed=range(2, 30, 3), pert=1e-5)
+        for topk in [1, 4, 100]:
+            for minval in [1e-15, -1]:
+                report = comp_yuprtest.DiffReport(topk)
+                result, output = run(comp_yuprtest.cmp_, run_file, ref, -1, minval, nts, tols, tols, report=report)
+                columnar = comp_yuprtest.diff_profile(run_file, ref).report(minval, nts, tols, tols, topk)
+                self.assertEqual(columnar.count, report.count)
+                self.assertEqual(result, report.count['t'] + report.count['all'])
+                for cls in ['t', 'all']:
+                    self.assertEqual(columnar.maxdiff[cls], report.maxdiff[cls])
+                    self.assertEqual(columnar.worst(cls), report.worst(cls))
+                    self.assertEqual(len(report.worst(cls)), min(topk, report.count[cls]))
+
+class EnvelopeTest(TempDirTestCase):
+    """values outside of the envelope of the references are errors"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        # the min and the mean of the references differ by 1e-6 and 2e-6
+        self.refs = [write_yuprtest(self.path('ref1')),
+                     write_yuprtest(self.path('ref2'), perturbed=range(30), pert=1e-6)]
+
+    def envelope(self, run_file, v_level=0, **kwargs):
+        return run(comp_yuprtest.cmp_envelope, run_file, self.refs, v_level, **kwargs)
+
+    def test_inside(self):
+        for perturbed, pert in [((), 0.), (range(30), 1e-6), (range(30), 5e-7)]:
+            run_file = write_yuprtest(self.path('run'), perturbed=perturbed, pert=pert)
+            for v_level in [0, 1, 2]:
+                result, output = self.envelope(run_file, v_level)
+                self.assertEqual(result, 0)
+            self.assertEqual(self.envelope(run_file, 1)[1], 'no value outside of the envelope\n')
+
+    def test_outside(self):
+        # the min and the mean of all records of step 12
+        run_file = write_yuprtest(self.path('run'), perturbed=(12,), pert=2e-6)
+        result, output = self.envelope(run_file, 0)
+        self.assertEqual(result, 20)
+        failed = [line.split()[0] for line in output.splitlines() if line.endswith('FAILED')]
+        self.assertEqual(failed, ['12'])
+        result, output = self.envelope(run_file, 1)
+        lines = re.findall('nt=(\d+), \w+ at line (\d+)', output)
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0][0] == '12' and 125 <= int(lines[0][1]) <= 134)
+        result, output = self.envelope(run_file, 2, topk=3)
+        self.assertEqual(len(re.findall('\n>', output)), 3)
+        for nt, line in re.findall('nt=(\d+), \w+ at line (\d+)', output):
+            self.assertTrue(nt == '12' and 125 <= int(line) <= 134)
+        # absolute excess
+        self.assertEqual(self.envelope(run_file, 0, minval=-1)[0], 20)
+        # widened envelope
+        self.assertEqual(self.envelope(run_file, 0, margin=2.)[0], 0)
+        self.assertEqual(self.envelope(run_file, 0, tol=3e-6)[0], 0)
+        self.assertEqual(self.envelope(run_file, 0, tol=1e-7)[0], 20)
+
+    def test_records_without_reference(self):
+        run_file = write_yuprtest(self.path('run'), nsteps=35, perturbed=(32,), pert=1e-3)
+        result, output = self.envelope(run_file, 1)
+        self.assertEqual(result, 0)
+        self.assertTrue('50 records of %s are in none of the reference files' % run_file in output)
+
+    def test_files_which_can_not_be_compared(self):
+        run_file = write_yuprtest(self.path('run'))
+        self.refs.append(self.path('missing'))
+        self.assertEqual(self.envelope(run_file), (-1, 'File %s does not exist\n' % self.path('missing')))
+        self.refs.pop()
+        header = write(self.path('header'), yuprtest_header)
+        self.assertEqual(self.envelope(header), (-1, 'file %s contains only header!\n' % header))
+
+class StepsTest(TempDirTestCase):
+    """comparison of the time steps given by the digest manifest only"""
+
+    def compare(self, run_file, ref_file, steps, v_level=1):
+        # the summary of each step (v_level=0) is only printed for the
+        # compared steps, otherwise the output is the same
+        expected = run(comp_yuprtest.cmp_, run_file, ref_file, v_level, 1e-15, nts, tols, tols)
+        result = run(comp_yuprtest.cmp_columnar, run_file, ref_file, v_level, 1e-15, nts, tols, tols,
+                     steps=steps)
+        if v_level == 0:
+            self.assertEqual(result[0], expected[0])
+        else:
+            self.assertEqual(result, expected)
+        return result
+
+    def test_middle_steps(self):
+        ref = write_yuprtest(self.path('ref'))
+        yu_digest.write_manifest(ref)
+        run_file = write_yuprtest(self.path('run'), perturbed=(12, 20))
+        steps = yu_digest.check_steps(run_file, ref)
+        self.assertEqual(steps, [12, 20])
+        for v_level in [0, 1, 2]:
+            result, output = self.compare(run_file, ref, steps, v_level)
+            self.assertEqual(result, 20)
+        # the lines of step 12 are reported (4 header lines and 10 records
+        # per step), the differences of step 20 are below its thresholds
+        result, output = self.compare(run_file, ref, steps, 1)
+        lines = [(int(nt), int(line)) for nt, line in re.findall('nt=(\d+),.* at line (\d+)', output)]
+        self.assertEqual(sorted(set([nt for nt, line in lines])), [12])
+        for nt, line in lines:
+            self.assertTrue(4 + 10*nt < line <= 4 + 10*(nt+1))
+
+    def test_thresholds_of_later_steps(self):
+        # the thresholds of a step do not depend on the other compared steps
+        ref = write_yuprtest(self.path('ref'))
+        run_file = write_yuprtest(self.path('run'), perturbed=(20,))
+        for v_level in [0, 1]:
+            result, output = self.compare(run_file, ref, [20], v_level)
+            self.assertEqual(result, 0)
+        run_file = write_yuprtest(self.path('run'), perturbed=(20,), pert=1e-4)
+        result, output = self.compare(run_file, ref, [20], 0)
+        self.assertEqual(result, 20)
+
+    def test_first_common_step(self):
+        # the first step common to both files uses the first thresholds
+        ref = write_yuprtest(self.path('ref'), first=12)
+        run_file = write_yuprtest(self.path('run'), perturbed=(12,), first=12)
+        result, output = self.compare(run_file, ref, [12], 0)
+        self.assertEqual(result, 20)
+        self.compare(run_file, ref, [12, 13], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
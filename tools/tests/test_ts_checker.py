@@ -0,0 +1,130 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the execution of the checkers (ts_checker): python checkers run in
+the testsuite process and the cache of the checker results.
+"""
+
+# built-in modules
+import os, unittest
+
+# private modules
+import ts_checker
+from ts_logger import BufferedLogger
+from tests.yu_files import TempDirTestCase, write
+
+checker_source = '''#!/usr/bin/env python2
+import os, sys
+
+def check(env=None):
+    print os.path.basename(__file__) + ': ' + env['VERBOSE']
+    return int(env['RESULT'])
+
+if __name__ == "__main__":
+    sys.exit(check())
+'''
+
+
+class InProcessTest(TempDirTestCase):
+    """python checkers defining check(env) run in the testsuite process"""
+
+    def test_run_in_process(self):
+        path = write(self.path('my_check.py'), checker_source)
+        self.assertTrue(ts_checker.load_checker(path) is not None)
+        status, output = ts_checker.run_checker(path, {'VERBOSE': '1', 'RESULT': '10'}, BufferedLogger())
+        self.assertEqual((status, output), (10, 'my_check.py: 1\n'))
+        # no bytecode is written into the checkers directory
+        self.assertEqual(os.listdir(self.dir), ['my_check.py'])
+
+    def test_run_as_command(self):
+        # checkers without check(env) are run as a command
+        path = write(self.path('plain_check.py'), '#!/usr/bin/env python2\nimport sys\nsys.exit(15)\n')
+        os.chmod(path, 0755)
+        self.assertTrue(ts_checker.load_checker(path) is None)
+        status, output = ts_checker.run_checker(path, {}, BufferedLogger(), cwd=self.dir)
+        self.assertEqual(status, 15)
+
+    def test_exception(self):
+        path = write(self.path('bad_check.py'), 'def check(env):\n    raise ValueError("bad")\n')
+        status, output = ts_checker.run_checker(path, {}, BufferedLogger())
+        self.assertEqual(status, 1)
+        self.assertTrue('ValueError: bad' in output and 'bad_check.py' in output)
+
+
+class ResultCacheTest(TempDirTestCase):
+    """results of the checkers cached by the content of their inputs"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        os.mkdir(self.path('run'))
+        self.checker = write(self.path('my_check.py'), checker_source)
+        self.input = write(self.path('run', 'YUPRTEST'), 'records\n')
+        self.env = {'VERBOSE': '1', 'RESULT': '10', 'RUNDIR': self.path('run'), 'FORCEMATCH': '0'}
+        self.cache = ts_checker.ResultCache(self.path('cache'))
+        self.runs = 0
+
+    def run_cached(self, env=None, inputs=['$RUNDIR/YUPRTEST']):
+        def run():
+            self.runs += 1
+            return ts_checker.run_checker(self.checker, env or self.env, BufferedLogger())
+        return ts_checker.run_cached(self.cache, self.checker, env or self.env, inputs, run, BufferedLogger())
+
+    def test_cached(self):
+        self.assertEqual(self.run_cached(), (10, 'my_check.py: 1\n'))
+        self.assertEqual(self.run_cached(), (10, 'my_check.py: 1\n'))
+        self.assertEqual(self.runs, 1)
+        # checkers without inputs are not cached
+        self.run_cached(inputs=None)
+        self.assertEqual(self.runs, 2)
+
+    def test_input_changed(self):
+        self.run_cached()
+        write(self.input, 'other records\n')
+        self.run_cached()
+        self.assertEqual(self.runs, 2)
+        # a missing input is part of the key as well
+        os.remove(self.input)
+        self.run_cached()
+        self.run_cached()
+        self.assertEqual(self.runs, 3)
+
+    def test_checker_changed(self):
+        self.run_cached()
+        write(self.checker, checker_source.replace("': '", "' - '"))
+        ts_checker._checkers.clear()  # imported again
+        self.assertEqual(self.run_cached(), (10, 'my_check.py - 1\n'))
+        self.assertEqual(self.runs, 2)
+
+    def test_environment(self):
+        self.run_cached()
+        # the verbosity and the cache of the YU files do not change the result
+        env = dict(self.env, VERBOSE='3', YUCACHE=self.path('yucache'))
+        self.assertEqual(self.run_cached(env), (10, 'my_check.py: 1\n'))
+        self.assertEqual(self.runs, 1)
+        # other variables do
+        self.run_cached(dict(self.env, FORCEMATCH='1'))
+        self.assertEqual(self.runs, 2)
+
+    def test_status_not_cached(self):
+        # exit status which are not results of the checker are not cached
+        env = dict(self.env, RESULT='1')
+        self.run_cached(env)
+        self.run_cached(env)
+        self.assertEqual(self.runs, 2)
+
+    def test_evict(self):
+        # entries of 502 bytes, the least recently used are removed first
+        for i in range(4):
+            self.cache.store('key%i' % i, 0, 'x'*500)
+            os.utime(self.path('cache', 'key%i.res' % i), (i, i))
+        cache = ts_checker.ResultCache(self.path('cache'), maxsize=1.5/1024)  # 1.5 kB
+        cache.load('key0')
+        cache.store('key4', 0, 'x'*500)
+        self.assertEqual(sorted(os.listdir(self.path('cache'))), ['key0.res', 'key3.res', 'key4.res'])
+        self.assertEqual(cache.load('key4'), (0, 'x'*500))
+        self.assertEqual(cache.load('key1'), None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the history of the outcomes and durations of the tests (ts_history)
+and of the order and timeouts of the tests derived from it.
+"""
+
+# built-in modules
+import os, unittest
+import xml.etree.ElementTree as ET
+
+# private modules
+import ts_history, ts_scheduler
+from ts_history import History
+from tests.yu_files import TempDirTestCase, read, write
+from tests.ts_files import write_testsuite, write_output
+from tests.test_ts_test import suite_tests
+
+
+class FakeTest:
+    """test with namelists in the directory namelistdir"""
+
+    def __init__(self, namelistdir, name, depend=None, result=0, run_time=None):
+        self.type = 't'
+        self.name = name
+        self.node = ET.fromstring('<test name="%s" type="t"/>' % name)
+        self.namelistdir = namelistdir
+        self.rundir = '/work/t/%s/' % name
+        self.dependdir = depend
+        self.result = result
+        self.run_time = run_time
+
+
+class HistoryTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.namelistdir = self.path('data') + '/'
+        os.mkdir(self.namelistdir)
+        write(self.namelistdir + 'INPUT_ORG', ' &RUNCTL\n  dt=20.0,\n /\n')
+        self.history = History(self.path('history.json'))
+
+    def fake_test(self, name, **kwargs):
+        return FakeTest(self.namelistdir, name, **kwargs)
+
+    def test_record(self):
+        self.history.record(self.fake_test('a'), 10.0)
+        self.history.record(self.fake_test('a', result=20), 20.0)
+        self.history.record(self.fake_test('a', result=15), 100.0)
+        entry = self.history.tests['t/a']
+        self.assertEqual((entry['runs'], entry['failures'], entry['result']), (2, 1, 20))
+        self.assertAlmostEqual(entry['duration'], 10.0 + ts_history.smoothing*10.0)
+        self.history.save()
+        self.assertEqual(History(self.path('history.json')).tests, self.history.tests)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['data', 'history.json'])
+
+    def test_unreadable(self):
+        write(self.path('history.json'), '{not json')
+        self.assertEqual(History(self.path('history.json')).tests, {})
+        self.assertEqual(History(self.path('missing', 'history.json')).tests, {})
+        # the history is not written, without error
+        history = History(self.path('missing', 'history.json'))
+        history.record(self.fake_test('a'), 1.0)
+        history.save()
+
+    def test_failure(self):
+        a = self.fake_test('a')
+        self.assertEqual(self.history.failure(a), ts_history.changed_failure)
+        for i in range(4):
+            self.history.record(a, 1.0)
+        self.assertAlmostEqual(self.history.failure(a), 1.0/6)
+        # changed namelists
+        write(self.namelistdir + 'INPUT_ORG', ' &RUNCTL\n  dt=10.0,\n /\n')
+        self.assertEqual(self.history.failure(a), ts_history.changed_failure)
+        self.history.record(a, 1.0)
+        self.assertAlmostEqual(self.history.failure(a), 1.0/7)
+        # changed definition in the testlist
+        a.node.set('cost', '2')
+        self.assertEqual(self.history.failure(a), ts_history.changed_failure)
+
+    def test_duration(self):
+        self.assertEqual(self.history.duration(self.fake_test('a')), ts_history.default_duration)
+        for name, duration in [('a', 10.0), ('b', 30.0), ('c', 20.0)]:
+            self.history.record(self.fake_test(name), duration)
+        self.assertEqual(self.history.duration(self.fake_test('b')), 30.0)
+        self.assertEqual(self.history.duration(self.fake_test('d')), 20.0)
+
+    def test_order(self):
+        tests = [self.fake_test(name) for name in 'abcd']
+        # no history: testlist order
+        self.assertEqual([t.name for t in self.history.order(tests)], ['a', 'b', 'c', 'd'])
+        for i in range(5):
+            self.history.record(self.fake_test('a'), 10.0)
+            self.history.record(self.fake_test('b'), 10.0)
+            self.history.record(self.fake_test('c', result=20), 1.0)
+            self.history.record(self.fake_test('d'), 100.0)
+        self.assertEqual([t.name for t in self.history.order(tests)], ['c', 'a', 'b', 'd'])
+        # c runs after b it depends on, the chain b, c comes first
+        tests[2].dependdir = '../b'
+        self.assertEqual([t.name for t in self.history.order(tests)], ['b', 'c', 'a', 'd'])
+        # circular dependencies
+        tests[1].dependdir = '../c'
+        self.assertEqual(sorted([t.name for t in self.history.order(tests)]), ['a', 'b', 'c', 'd'])
+
+    def test_timeout(self):
+        a = self.fake_test('a')
+        self.assertEqual(self.history.timeout(a, 3600), 3600)
+        self.assertEqual(self.history.timeout(a), None)
+        for run_time in [100.0, 10.0]:
+            a.run_time = run_time
+            self.history.record(a, run_time)
+        self.assertEqual(self.history.timeout(a, 3600), 3600)
+        # runs without a completed model run
+        a.run_time = None
+        self.history.record(a, 1.0)
+        self.assertEqual(self.history.timeout(a, 3600), 3600)
+        a.run_time = 30.0
+        self.history.record(a, 30.0)
+        self.assertEqual(self.history.timeout(a, 3600), 300)
+        self.assertEqual(self.history.timeout(a, 200), 200)
+        self.assertEqual(self.history.timeout(a), 300)
+        # the recent run times only
+        a.run_time = 1.0
+        for i in range(ts_history.run_times):
+            self.history.record(a, 1.0)
+        self.assertEqual(self.history.tests['t/a']['times'], [1.0]*ts_history.run_times)
+        self.assertEqual(self.history.timeout(a, 3600), ts_history.timeout_min)
+
+
+class AdaptedTimeoutTest(TempDirTestCase):
+    """the scheduler adapts the timeouts of the tests to their history"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.timeout_min = ts_history.timeout_min
+        ts_history.timeout_min = 1
+
+    def tearDown(self):
+        ts_history.timeout_min = self.timeout_min
+        TempDirTestCase.tearDown(self)
+
+    def test_adapted_timeout(self):
+        write_testsuite(self.dir, ['a', 'b'])
+        history = History(self.path('history.json'))
+
+        def run(**kwargs):
+            tests, logger = suite_tests(self.dir + '/', timeout=30, **kwargs)
+            stopped = ts_scheduler.run_tests(tests, logger, history=history)
+            timeouts = [args[0] for name, args, kwargs in logger.records
+                        if name == 'info' and args[0].startswith('Timeout of the run')]
+            return stopped, [t.result for t in tests], timeouts
+
+        for i in range(ts_history.timeout_runs):
+            self.assertEqual(run(), (False, [0, 0], ['Timeout of the run: 30 s']*2))
+        self.assertEqual(len(History(self.path('history.json')).tests['t/b']['times']), ts_history.timeout_runs)
+        self.assertEqual(run()[2], ['Timeout of the run: 1 s']*2)
+        # a hanging run is stopped after its adapted timeout, as a TIMEOUT
+        write_output(self.dir, 'b', sleep=5)
+        stopped, results, timeouts = run()
+        self.assertTrue(stopped)
+        # a is not run if b runs first
+        self.assertTrue(results in [[0, 25], [30, 25]], results)
+        self.assertEqual(read(self.path('work', 't', 'b', 'result')), 'TIMEOUT')
+
+
+if __name__ == "__main__":
+    unittest.main()
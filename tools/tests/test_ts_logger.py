@@ -0,0 +1,53 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the loggers (ts_logger).
+"""
+
+# built-in modules
+import unittest
+
+# private modules
+import ts_logger
+from ts_logger import BufferedLogger
+
+
+class BufferedLoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = ts_logger.Logger('')
+        self.level = self.logger.getLevel()
+
+    def tearDown(self):
+        self.logger.setLevel(self.level)
+        ts_logger.LG.getLogger('testsuite').removeHandler(self.logger.handler)
+
+    def test_replay(self):
+        target = BufferedLogger()
+        buffered = BufferedLogger(self.logger)
+        buffered.info('a')
+        buffered.result(1, 0, 'b')
+        buffered.error('c')
+        self.assertEqual(target.records, [])
+        buffered.replay(target)
+        self.assertEqual(target.records, [('info', ('a',), {}), ('result', (1, 0, 'b'), {}),
+                                          ('error', ('c',), {})])
+        self.assertEqual(buffered.records, [])
+
+    def test_logger_interface(self):
+        # the methods of the logger used by the tests are all available
+        buffered = BufferedLogger(BufferedLogger(self.logger))
+        buffered.flush()
+        buffered.setLevel(ts_logger.DEBUG)
+        self.assertEqual(buffered.getLevel(), ts_logger.DEBUG)
+        self.assertEqual(self.logger.getLevel(), ts_logger.DEBUG)
+        for name in ['log', 'debug', 'info', 'warning', 'chckinfo', 'important', 'result', 'error',
+                     'flush', 'setLevel', 'getLevel']:
+            self.assertTrue(callable(getattr(buffered, name)), name)
+        self.assertRaises(AttributeError, getattr, BufferedLogger(), 'setLevel')
+
+
+if __name__ == "__main__":
+    unittest.main()
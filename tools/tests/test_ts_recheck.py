@@ -0,0 +1,68 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the re-check of the runs of a work directory (ts_recheck).
+"""
+
+# built-in modules
+import os, shutil, unittest
+
+# private modules
+import ts_recheck
+from ts_logger import BufferedLogger
+from tests.yu_files import TempDirTestCase, write, write_yuprtest
+from tests.ts_files import write_testsuite, options
+
+
+class RecheckTest(TempDirTestCase):
+    """the checkers run on the existing run directories"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.basedir = self.dir + '/'
+        write_testsuite(self.dir, ['a', 'b', 'c'])
+        # runs of the tests a and b, b differs from its reference
+        for name in ['a', 'b']:
+            rundir = self.path('work', 't', name)
+            shutil.copytree(self.path('data', 't', name), rundir)
+        write_yuprtest(self.path('work', 't', 'b', 'YUPRTEST'), perturbed=(3,))
+        os.makedirs(self.path('work', 't', 'old'))
+        write(self.path('work', 'notes'), 'not a test')
+        self.logger = BufferedLogger()
+
+    def discover(self, only=None):
+        return ts_recheck.discover(self.basedir, 'work', 'testlist.xml', options(), self.logger, only)
+
+    def test_discover(self):
+        tests, unknown = self.discover()
+        self.assertEqual([t.name for t in tests], ['a', 'b'])
+        self.assertEqual(unknown, ['t/old'])
+        self.assertEqual(tests[0].rundir, self.basedir + 'work/t/a/')
+        tests, unknown = self.discover(['t/b'])
+        self.assertEqual(([t.name for t in tests], unknown), (['b'], []))
+
+    def test_recheck(self):
+        tests, unknown = self.discover()
+        results = ts_recheck.recheck(tests, self.path('checkers'), nproc=2)
+        self.assertEqual([(test.name, [(c, s) for c, s, output in checks]) for test, checks in results],
+                         [('a', [('run_success_check.py', 0), ('identical_check.py', 0)]),
+                          ('b', [('run_success_check.py', 0), ('identical_check.py', 20)])])
+        self.assertEqual(ts_recheck.summary(results, unknown, self.logger), 20)
+        self.assertEqual(self.logger.records[-2:],
+                         [('warning', ('No test t/old in the testlist, not checked',), {}),
+                          ('important', ('Checked 2 tests: 1 MATCH, 1 FAIL',), {})])
+        # the output of the failed checker is shown
+        self.assertTrue(('result', (1, 20, 'identical_check.py'), {}) in self.logger.records)
+        self.assertTrue(any([name == 'chckinfo' for name, args, kwargs in self.logger.records]))
+
+    def test_missing_checker(self):
+        tests, unknown = self.discover(['t/a'])
+        results = ts_recheck.recheck(tests, self.path('missing'), nproc=1)
+        self.assertEqual([s for c, s, output in results[0][1]], [30, 30])
+        self.assertEqual(ts_recheck.summary(results, unknown, self.logger), 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the store of the outputs of previous runs (ts_runstore).
+"""
+
+# built-in modules
+import os, unittest
+
+# private modules
+import ts_runstore
+from tests.yu_files import TempDirTestCase, read, write
+from tests.ts_files import write_testsuite, write_output
+from tests.test_ts_test import suite_tests, run_test
+
+
+class FingerprintTest(TempDirTestCase):
+    """the fingerprint changes with the inputs of the run only"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.rundir = self.path('run')
+        os.makedirs(self.path('data', 'input'))
+        os.mkdir(self.rundir)
+        write(self.path('data', 'input', 'laf2011'), 'fields')
+        os.symlink(self.path('data', 'input'), self.path('run', 'input'))
+        write(self.path('run', 'INPUT_ORG'), ' &RUNCTL\n  dt=20.0,\n /\n')
+        write(self.path('run', 'model'), 'binary')
+
+    def test_fingerprint(self):
+        key = ts_runstore.fingerprint(self.rundir, ['./model'])
+        self.assertEqual(ts_runstore.fingerprint(self.rundir, ['./model']), key)
+        self.assertNotEqual(ts_runstore.fingerprint(self.rundir, ['mpirun ./model']), key)
+        # comments and blanks of the namelists do not matter
+        write(self.path('run', 'INPUT_ORG'), '! comment\n &RUNCTL\n\n  dt=20.0,   \n /\n')
+        self.assertEqual(ts_runstore.fingerprint(self.rundir, ['./model']), key)
+        write(self.path('run', 'INPUT_ORG'), ' &RUNCTL\n  dt=10.0,\n /\n')
+        self.assertNotEqual(ts_runstore.fingerprint(self.rundir, ['./model']), key)
+
+    def test_inputs(self):
+        key = ts_runstore.fingerprint(self.rundir)
+        write(self.path('run', 'model'), 'new binary')
+        key2 = ts_runstore.fingerprint(self.rundir)
+        self.assertNotEqual(key2, key)
+        # the files of the input directory by their size and modification time
+        os.utime(self.path('data', 'input', 'laf2011'), (0, 0))
+        key3 = ts_runstore.fingerprint(self.rundir)
+        self.assertNotEqual(key3, key2)
+        write(self.path('data', 'input', 'lbff0000'), 'fields')
+        self.assertNotEqual(ts_runstore.fingerprint(self.rundir), key3)
+
+    def test_save_and_restore(self):
+        store = ts_runstore.RunStore(self.path('store'))
+        key = ts_runstore.fingerprint(self.rundir)
+        self.assertEqual(store.restore(key, self.rundir), None)
+        before = ts_runstore.snapshot(self.rundir)
+        os.mkdir(self.path('run', 'output'))
+        write(self.path('run', 'output', 'lfff0000'), 'output')
+        write(self.path('run', 'YUPRTEST'), 'records')
+        write(self.path('run', 'INPUT_ORG'), ' &RUNCTL\n  dt=40.0,\n /\n')
+        os.utime(self.path('run', 'INPUT_ORG'), (0, 0))
+        store.save(key, self.rundir, before)
+        for name in ['YUPRTEST', 'INPUT_ORG', 'output/lfff0000']:
+            os.remove(self.path('run', name))
+        self.assertEqual(sorted(store.restore(key, self.rundir)), ['INPUT_ORG', 'YUPRTEST', 'output/lfff0000'])
+        self.assertEqual(read(self.path('run', 'output', 'lfff0000')), 'output')
+        # the input directory is not stored
+        self.assertFalse(os.path.exists(os.path.join(store.entry(key), 'input')))
+        # an entry is never replaced
+        write(self.path('run', 'YUPRTEST'), 'other records')
+        store.save(key, self.rundir, {})
+        self.assertEqual(read(os.path.join(store.entry(key), 'YUPRTEST')), 'records')
+
+
+class RestoredRunTest(TempDirTestCase):
+    """the outputs of an identical run are restored instead of running the model"""
+
+    def test_restored_run(self):
+        basedir = self.dir + '/'
+        write_testsuite(self.dir, ['a'])
+        store = self.path('runstore')
+
+        def restored(**kwargs):
+            tests, logger = suite_tests(basedir, runstore=store, **kwargs)
+            result = run_test(tests[0])
+            return result, any([args[0].startswith('Restored ') for name, args, kwargs in logger.records
+                                if name == 'info'])
+
+        self.assertEqual(restored(), (0, False))
+        # the model would now write other results
+        write_output(self.dir, 'a', perturbed=(3,))
+        self.assertEqual(restored(), (0, True))
+        # other number of time steps
+        self.assertEqual(restored(steps=5), (20, False))
+        self.assertEqual(restored(steps=5), (20, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the scheduler running the tests concurrently (ts_scheduler) and of
+its entry point ts_run.py.
+"""
+
+# built-in modules
+import os, sys, time, threading, subprocess, unittest
+
+# private modules
+import ts_scheduler
+from ts_logger import BufferedLogger
+from tests.yu_files import TempDirTestCase
+from tests.ts_files import write_testsuite, write_output, tools_dir
+
+
+class FakeTest:
+    """test which only records when it ran"""
+
+    def __init__(self, name, nprocs=1, duration=0.1, stop=False, depend=None):
+        self.type = 't'
+        self.name = name
+        self.rundir = '/work/t/%s/' % name
+        self.dependdir = depend
+        self.nprocs = nprocs
+        self.duration = duration
+        self.stop = stop
+        self.logger = None
+        self.timeout = None
+        self.result = 30
+
+
+class Runs:
+    """run function of the scheduler recording the runs of the fake tests"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cores = 0      # cores used by the running tests
+        self.max_cores = 0  # maximum of cores
+        self.runs = []      # (name, start, end) of each run
+
+    def __call__(self, test):
+        with self.lock:
+            self.cores += test.nprocs
+            self.max_cores = max(self.max_cores, self.cores)
+        start = time.time()
+        test.logger.info('start ' + test.name)
+        if test.duration is None:
+            raise RuntimeError('broken test')
+        time.sleep(test.duration)
+        test.logger.info('end ' + test.name)
+        test.result = 20 if test.stop else 0
+        with self.lock:
+            self.cores -= test.nprocs
+            self.runs.append((test.name, start, time.time()))
+        return test.stop
+
+    def names(self):
+        return [name for name, start, end in sorted(self.runs, key=lambda run: run[1])]
+
+    def run(self, name):
+        return [run for run in self.runs if run[0] == name][0]
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.poll_interval = ts_scheduler.poll_interval
+        ts_scheduler.poll_interval = 0.01
+        self.logger = BufferedLogger()
+        self.runs = Runs()
+
+    def tearDown(self):
+        ts_scheduler.poll_interval = self.poll_interval
+
+    def run_tests(self, tests, cores=None, **kwargs):
+        for test in tests:
+            test.logger = BufferedLogger()
+        return ts_scheduler.run_tests(tests, self.logger, cores, run=self.runs, **kwargs)
+
+    def test_dependencies(self):
+        tests = [FakeTest('a'), FakeTest('b', depend='../a'), FakeTest('c', depend='/work/t/b'),
+                 FakeTest('d', depend='../unknown')]
+        self.assertEqual(ts_scheduler.dependencies(tests), [[], [0], [1], []])
+
+    def test_sequential(self):
+        tests = [FakeTest(name) for name in 'abc']
+        self.assertFalse(self.run_tests(tests))
+        self.assertEqual(self.runs.names(), ['a', 'b', 'c'])
+        self.assertEqual(self.runs.max_cores, 1)
+        tests[1].stop = True
+        self.runs = Runs()
+        self.assertTrue(self.run_tests(tests))
+        self.assertEqual(self.runs.names(), ['a', 'b'])
+        self.runs = Runs()
+        self.assertFalse(self.run_tests(tests, stop_on_error=False))
+        self.assertEqual(self.runs.names(), ['a', 'b', 'c'])
+
+    def test_budget(self):
+        tests = [FakeTest(name, nprocs=2, duration=0.2) for name in 'abcd'] + [FakeTest('e', nprocs=8)]
+        self.assertFalse(self.run_tests(tests, cores=4))
+        self.assertEqual(self.runs.max_cores, 8)
+        self.assertEqual(sorted(self.runs.names()), ['a', 'b', 'c', 'd', 'e'])
+        # at most two tests of 2 processes at a time, the large test alone
+        e = self.runs.run('e')
+        for name in 'abcd':
+            run = self.runs.run(name)
+            self.assertTrue(run[2] <= e[1] or run[1] >= e[2])
+        starts = sorted([self.runs.run(name)[1] for name in 'abcd'])
+        self.assertTrue(starts[2] >= min([self.runs.run(name)[2] for name in 'ab']))
+
+    def test_concurrent_dependencies(self):
+        tests = [FakeTest('a', duration=0.2), FakeTest('b', depend='../a'), FakeTest('c', duration=0.2)]
+        self.assertFalse(self.run_tests(tests, cores=4))
+        self.assertTrue(self.runs.run('b')[1] >= self.runs.run('a')[2])
+        self.assertTrue(self.runs.run('c')[1] < self.runs.run('a')[2])
+
+    def test_stop(self):
+        tests = [FakeTest('a', stop=True), FakeTest('b', duration=0.3), FakeTest('c')]
+        self.assertTrue(self.run_tests(tests, cores=2))
+        # the running test completes, no test is started
+        self.assertEqual(sorted(self.runs.names()), ['a', 'b'])
+        self.assertEqual([t.result for t in tests], [20, 0, 30])
+
+    def test_crash(self):
+        tests = [FakeTest('a', duration=None), FakeTest('b')]
+        self.assertTrue(self.run_tests(tests, cores=1))
+        self.assertEqual(tests[0].result, 30)
+        self.assertTrue('broken test' in self.logger.records[-1][1][0])
+
+    def test_messages(self):
+        # the messages of each test are written together when it has finished
+        tests = [FakeTest('a', duration=0.3), FakeTest('b', duration=0.1)]
+        self.assertFalse(self.run_tests(tests, cores=2))
+        self.assertEqual([args[0] for name, args, kwargs in self.logger.records],
+                         ['start b', 'end b', 'start a', 'end a'])
+        self.assertEqual([t.logger.records for t in tests], [[], []])
+
+    def test_circular_dependencies(self):
+        tests = [FakeTest('a', depend='../b'), FakeTest('b', depend='../a')]
+        self.assertFalse(self.run_tests(tests, cores=2))
+        self.assertEqual(self.runs.names(), ['a', 'b'])
+        self.assertEqual(self.logger.records[0], ('warning', ('Circular test dependencies: t/a, t/b',), {}))
+
+
+class EntryPointTest(TempDirTestCase):
+    """ts_run.py runs the tests of a testlist"""
+
+    def ts_run(self, *args):
+        p = subprocess.Popen([sys.executable, os.path.join(tools_dir, 'ts_run.py'), '-e', 'model.sh',
+                              '-n', '1', '--mpicmd=', '-v', '0'] + list(args), cwd=self.dir,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = p.communicate()[0]
+        return p.returncode, output
+
+    def test_ts_run(self):
+        write_testsuite(self.dir, ['a', 'b', 'c'], extra={'b': ['<depend>../a</depend>']})
+        for cores in [[], ['--cores', '2']]:
+            status, output = self.ts_run(*cores)
+            self.assertEqual(status, 0, output)
+            self.assertEqual(output.count('MATCH'), 3 * 3, output)
+        write_output(self.dir, 'b', perturbed=(3,))
+        status, output = self.ts_run('--cores', '2')
+        self.assertEqual(status, 1, output)
+        self.assertTrue('RESULT t/b: test b' in output)
+        status, output = self.ts_run('-o', 't,c')
+        self.assertEqual(status, 0, output)
+        self.assertFalse('RESULT t/b' in output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the content-addressed store of reference files (ts_store).
+"""
+
+# built-in modules
+import os, unittest
+
+# private modules
+import ts_store
+import yu_reader
+from tests.yu_files import TempDirTestCase, read, write
+
+
+class StoreTest(TempDirTestCase):
+    """references are stored once and linked into the test directories"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.data = self.path('data')
+        self.storedir = os.path.join(self.data, ts_store.objects_dir)
+        for d in ['run', 'data/test1', 'data/test2']:
+            os.makedirs(self.path(d))
+
+    def store(self, link='hard'):
+        return ts_store.RefStore(self.storedir, link, nproc=2)
+
+    def test_add(self):
+        source = write(self.path('run', 'YUPRTEST'), 'records\n')
+        store = self.store()
+        obj = store.add(source)
+        self.assertEqual(obj, store.object_path(yu_reader.file_digest(source)))
+        self.assertEqual(read(obj), 'records\n')
+        self.assertEqual(os.stat(obj).st_mode & 0777, 0444)
+        self.assertEqual(store.add(source), obj)
+        gz = store.add(source, 'gz')
+        self.assertEqual(gz, obj + '.gz')
+        self.assertEqual(yu_reader.file_digest(gz), yu_reader.file_digest(source))
+        self.assertRaises(ValueError, ts_store.RefStore, self.storedir, 'move')
+
+    def test_update(self):
+        names = [write(self.path('run', 'YUPRTEST'), 'records\n'), write(self.path('run', 'YUCHKDAT'), 'sets\n')]
+        for link in ts_store.link_modes:
+            store = self.store(link)
+            target = self.path('data', 'test1')
+            self.assertEqual(sorted(store.update(names, target)), [(names[1], True, None), (names[0], True, None)])
+            self.assertEqual(read(os.path.join(target, 'YUPRTEST')), 'records\n')
+            self.assertEqual(os.path.islink(os.path.join(target, 'YUPRTEST')), link == 'symlink')
+            # unchanged files are not written again
+            self.assertEqual(sorted(store.update(names, target)), [(names[1], False, None), (names[0], False, None)])
+            write(names[0], 'new records\n')
+            self.assertEqual(store.update(names[:1], target), [(names[0], True, None)])
+            self.assertEqual(read(os.path.join(target, 'YUPRTEST')), 'new records\n')
+            write(names[0], 'records\n')
+            for name in os.listdir(target):
+                os.remove(os.path.join(target, name))
+
+    def test_shared_objects(self):
+        source = write(self.path('run', 'YUPRTEST'), 'records\n')
+        store = self.store()
+        store.update([source], self.path('data', 'test1'))
+        store.update([source], self.path('data', 'test2'))
+        obj = store.add(source)
+        self.assertTrue(os.path.samefile(self.path('data', 'test1', 'YUPRTEST'), obj))
+        self.assertTrue(os.path.samefile(self.path('data', 'test2', 'YUPRTEST'), obj))
+
+    def test_compressed(self):
+        source = write(self.path('run', 'YUPRTEST'), 'records\n')
+        target = self.path('data', 'test1')
+        write(os.path.join(target, 'YUPRTEST'), 'old records\n')
+        store = self.store()
+        self.assertEqual(store.update([source], target, 'gz'), [(source, True, None)])
+        self.assertEqual(sorted(os.listdir(target)), ['YUPRTEST.gz'])
+        self.assertEqual(yu_reader.file_digest(os.path.join(target, 'YUPRTEST')), yu_reader.file_digest(source))
+        self.assertEqual(store.update([source], target), [(source, True, None)])
+        self.assertEqual(sorted(os.listdir(target)), ['YUPRTEST'])
+
+    def test_errors(self):
+        store = self.store()
+        name, changed, error = store.update([self.path('run', 'missing')], self.path('data', 'test1'))[0]
+        self.assertTrue(changed)
+        self.assertTrue('missing' in error)
+
+    def test_collect(self):
+        names = [write(self.path('run', 'YUPRTEST'), 'records\n'), write(self.path('run', 'YUCHKDAT'), 'sets\n')]
+        self.store('hard').update(names[:1], self.path('data', 'test1'))
+        self.store('symlink').update(names[1:], self.path('data', 'test2'))
+        unused = self.store().add(write(self.path('run', 'YUSPECIF'), 'specif\n'))
+        self.assertEqual(ts_store.collect(self.data, dry_run=True), [unused])
+        self.assertTrue(os.path.exists(unused))
+        self.assertEqual(ts_store.collect(self.data), [unused])
+        self.assertFalse(os.path.exists(unused))
+        os.remove(self.path('data', 'test1', 'YUPRTEST'))
+        os.remove(self.path('data', 'test2', 'YUCHKDAT'))
+        self.assertEqual(len(ts_store.collect(self.data)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
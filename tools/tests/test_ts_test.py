@@ -0,0 +1,219 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the lifecycle of a test (ts_test) in a synthetic testsuite, see
+tests/ts_files.
+"""
+
+# built-in modules
+import os, time, threading, unittest
+
+# private modules
+import ts_run
+from ts_error import StopError
+from ts_logger import BufferedLogger
+from tests.yu_files import TempDirTestCase, read, write
+from tests.ts_files import write_testsuite, write_checker, write_output, options
+
+slow_checker = '''#!/bin/sh
+sleep 1
+echo "%s done"
+exit %i
+'''
+
+
+def suite_tests(basedir, **kwargs):
+    """return the tests of the testsuite in basedir and their logger"""
+    logger = BufferedLogger()
+    return ts_run.load_tests(basedir, 'testlist.xml', options(**kwargs), ts_run.Conf(basedir), logger), logger
+
+
+def run_test(test):
+    """prepare, run and check test as the testsuite does, returns its result"""
+    test.prepare()
+    test.prerun()
+    test.start()
+    test.wait()
+    try:
+        test.check()
+    except StopError:
+        pass
+    test.write_result()
+    return test.result
+
+
+order_checker = '''#!/bin/sh
+echo %s >> order
+exit %i
+'''
+
+
+def checker_results(logger):
+    """return the (checker, result) logged for each checker"""
+    return [(args[2], args[1]) for name, args, kwargs in logger.records if name == 'result' and args[0] == 1]
+
+
+class CheckersTest(TempDirTestCase):
+    """the checkers of a test and their results"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.basedir = self.dir + '/'
+
+    def checker_order(self, checkers, results):
+        """run a test with the checkers (testlist elements) which exit with
+        results, returns the order in which they ran and their results"""
+        write_testsuite(self.dir, ['a'], checkers=checkers)
+        for name, result in results.items():
+            write_checker(self.dir, name, order_checker % (name, result))
+        tests, logger = suite_tests(self.basedir)
+        run_test(tests[0])
+        try:
+            order = read(self.path('order')).split()
+        except IOError:
+            order = []
+        return order, checker_results(logger), logger
+
+    def test_prerequisites(self):
+        checkers = ['<checker cost="1" requires="b.sh">c.sh</checker>',
+                    '<checker cost="5">b.sh</checker>',
+                    '<checker cost="2">a.sh</checker>']
+        order, results, logger = self.checker_order(checkers, {'a.sh': 0, 'b.sh': 10, 'c.sh': 0})
+        # the cheapest checker first, once its prerequisites have run
+        self.assertEqual(order, ['a.sh', 'b.sh', 'c.sh'])
+        self.assertEqual(results, [('c.sh', 0), ('b.sh', 10), ('a.sh', 0)])
+
+    def test_skipped_checkers(self):
+        checkers = ['<checker requires="a.sh">b.sh</checker>',
+                    '<checker requires="b.sh">c.sh</checker>',
+                    '<checker>a.sh</checker>']
+        order, results, logger = self.checker_order(checkers, {'a.sh': 20, 'b.sh': 0, 'c.sh': 0})
+        self.assertEqual(order, ['a.sh'])
+        self.assertEqual(results, [('b.sh', 15), ('c.sh', 15), ('a.sh', 20)])
+        outputs = [args[0] for name, args, kwargs in logger.records if name == 'chckinfo']
+        self.assertEqual(outputs, ['skipped since a.sh FAIL', 'skipped since b.sh skipped'])
+
+    def test_circular_prerequisites(self):
+        checkers = ['<checker requires="b.sh">a.sh</checker>', '<checker requires="a.sh">b.sh</checker>']
+        order, results, logger = self.checker_order(checkers, {'a.sh': 0, 'b.sh': 0})
+        self.assertEqual(sorted(order), ['a.sh', 'b.sh'])
+        self.assertEqual(results, [('a.sh', 0), ('b.sh', 0)])
+        self.assertTrue(('warning', ('Circular prerequisites of the checkers a.sh, b.sh',), {}) in logger.records)
+
+    def test_default_prerequisites(self):
+        # the comparisons are skipped if the run did not complete
+        write_testsuite(self.dir, ['a'])
+        os.chmod(write(self.path('broken.sh'), '#!/bin/sh\n'), 0755)
+        tests, logger = suite_tests(self.basedir, exe='broken.sh')
+        self.assertEqual(run_test(tests[0]), 30)
+        self.assertEqual(checker_results(logger), [('run_success_check.py', 30), ('identical_check.py', 15)])
+
+    def test_concurrent_checkers(self):
+        checkers = ['<checker>slow%i.sh</checker>' % i for i in range(3)]
+        write_testsuite(self.dir, ['a'], checkers=checkers)
+        for i in range(3):
+            write_checker(self.dir, 'slow%i.sh' % i, slow_checker % ('slow%i' % i, 10*i))
+        for jobs in [1, 3]:
+            tests, logger = suite_tests(self.basedir, checker_jobs=jobs)
+            started = time.time()
+            self.assertEqual(run_test(tests[0]), 20)
+            elapsed = time.time() - started
+            self.assertTrue(elapsed >= 3 if jobs == 1 else elapsed < 2.9, elapsed)
+            # results and outputs in the order of the testlist
+            self.assertEqual(checker_results(logger), [('slow0.sh', 0), ('slow1.sh', 10), ('slow2.sh', 20)])
+            outputs = [args[0] for name, args, kwargs in logger.records if name == 'chckinfo']
+            self.assertEqual(outputs, ['slow0 done', 'slow1 done', 'slow2 done'])
+            self.assertEqual(read(self.path('work', 't', 'a', 'result')), 'FAIL')
+
+
+    def test_inprocess_checkers(self):
+        write_testsuite(self.dir, ['a'])
+        for perturbed in [(), (5,)]:
+            write_output(self.dir, 'a', perturbed=perturbed)
+            records = []
+            for inprocess in [False, True]:
+                tests, logger = suite_tests(self.basedir, checker_inprocess=inprocess, v_level=2)
+                self.assertEqual(run_test(tests[0]), 20 if perturbed else 0)
+                records.append([r for r in logger.records if r[0] in ['chckinfo', 'result']])
+            self.assertEqual(records[1], records[0])
+            self.assertEqual(checker_results(logger), [('run_success_check.py', 0),
+                                                       ('identical_check.py', 20 if perturbed else 0)])
+
+    def test_cached_results(self):
+        write_testsuite(self.dir, ['a'])
+
+        def cached(**kwargs):
+            tests, logger = suite_tests(self.basedir, **kwargs)
+            result = run_test(tests[0])
+            return result, sorted([args[0].split('/')[-1] for name, args, kwargs in logger.records
+                                   if name == 'debug' and args[0].startswith('Cached: ')])
+
+        # disabled by default
+        self.assertEqual(cached(), (0, []))
+        self.assertEqual(cached(), (0, []))
+        cache = self.path('cache')
+        self.assertEqual(cached(checker_cache=cache), (0, []))
+        self.assertEqual(cached(checker_cache=cache), (0, ['identical_check.py', 'run_success_check.py']))
+        # the verbosity does not change the result
+        self.assertEqual(cached(checker_cache=cache, v_level=3), (0, ['identical_check.py', 'run_success_check.py']))
+        # new output of the run
+        write_output(self.dir, 'a', perturbed=(5,))
+        self.assertEqual(cached(checker_cache=cache), (20, ['run_success_check.py']))
+        self.assertEqual(cached(checker_cache=cache), (20, ['identical_check.py', 'run_success_check.py']))
+
+
+class LifecycleTest(TempDirTestCase):
+    """the lifecycle of a test does not change the working directory and the
+    environment of the process"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.basedir = self.dir + '/'
+        self.cwd = os.getcwd()
+        os.mkdir(self.path('elsewhere'))
+        os.chdir(self.path('elsewhere'))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        TempDirTestCase.tearDown(self)
+
+    def test_process_state(self):
+        write_testsuite(self.dir, ['a'])
+        environ = dict(os.environ)
+        tests, logger = suite_tests(self.basedir)
+        self.assertEqual(run_test(tests[0]), 0)
+        write_output(self.dir, 'a', perturbed=(3,))
+        tests[0].update_yufiles()
+        self.assertEqual(os.getcwd(), self.path('elsewhere'))
+        self.assertEqual(dict(os.environ), environ)
+        self.assertEqual(os.listdir(self.path('elsewhere')), [])
+        self.assertEqual(read(self.path('work', 't', 'a', 'result')), 'MATCH')
+        self.assertEqual(read(self.path('data', 't', 'a', 'YUPRTEST')), read(self.path('work', 't', 'a', 'YUPRTEST')))
+
+    def test_threads(self):
+        # tests driven from threads of the same process
+        write_testsuite(self.dir, ['a', 'b', 'c'])
+        for name in 'abc':
+            write_output(self.dir, name, perturbed=(3,) if name == 'b' else (), sleep=1)
+        tests, logger = suite_tests(self.basedir)
+        results = {}
+
+        def run(test):
+            results[test.name] = run_test(test)
+
+        threads = [threading.Thread(target=run, args=(test,)) for test in tests]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(time.time() - started < 2.9)
+        self.assertEqual(results, {'a': 0, 'b': 20, 'c': 0})
+        self.assertEqual([read(self.path('work', 't', name, 'result')) for name in 'abc'], ['MATCH', 'FAIL', 'MATCH'])
+        self.assertEqual(os.getcwd(), self.path('elsewhere'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the execution of the system commands (ts_utilities.system_command).
+"""
+
+# built-in modules
+import os, time, unittest
+
+# private modules
+import ts_utilities
+from ts_utilities import system_command
+from ts_error import StopError
+from ts_logger import BufferedLogger
+from tests.yu_files import TempDirTestCase
+
+
+class SystemCommandTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.logger = BufferedLogger()
+        self.output_limit = ts_utilities.output_limit
+
+    def tearDown(self):
+        ts_utilities.output_limit = self.output_limit
+        TempDirTestCase.tearDown(self)
+
+    def test_output(self):
+        status, output = system_command('echo one; echo two >&2; exit 3', self.logger, return_output=True,
+                                        throw_exception=False, issue_error=False)
+        self.assertEqual((status, output), (3, 'one\ntwo\n'))
+        self.assertRaises(StopError, system_command, 'exit 1', self.logger, issue_error=False)
+
+    def test_large_output(self):
+        # more output than the pipe can hold
+        cmd = 'for i in $(seq 1 50000); do echo "line $i"; done'
+        status, output = system_command(cmd, self.logger, return_output=True)
+        self.assertEqual(status, 0)
+        lines = output.splitlines()
+        self.assertEqual((len(lines), lines[0], lines[-1]), (50000, 'line 1', 'line 50000'))
+
+    def test_output_limit(self):
+        ts_utilities.output_limit = 100
+        status, output = system_command('seq 1 1000', self.logger, return_output=True)
+        lines = output.splitlines()
+        # the last lines within the limit
+        self.assertEqual(lines[0], '[976 lines of output omitted]')
+        self.assertEqual(lines[1:], [str(i) for i in range(977, 1001)])
+        self.assertTrue(len(output) - len(lines[0]) - 1 <= 100)
+        # a single line longer than the limit is kept
+        status, output = system_command('printf "%0200i\\n" 1', self.logger, return_output=True)
+        self.assertEqual(len(output), 201)
+
+    def test_logged_output(self):
+        system_command('printf "a\\nb\\n"', self.logger)
+        self.assertEqual([args[0] for name, args, kwargs in self.logger.records if name == 'debug'][1:],
+                         ['   Out: a', '   Out: b'])
+
+    def test_cwd_env(self):
+        status, output = system_command('pwd; echo $TS_VALUE', self.logger, return_output=True,
+                                        cwd=self.dir, env={'TS_VALUE': 'value', 'PATH': os.environ['PATH']})
+        self.assertEqual(output, os.path.realpath(self.dir) + '\nvalue\n')
+        self.assertNotEqual(os.getcwd(), self.dir)
+
+    def test_timeout(self):
+        started = time.time()
+        status = system_command('echo start; sleep 10', self.logger, timeout=1, throw_exception=False)
+        self.assertEqual(status, -2)
+        self.assertTrue(time.time() - started < 5)
+
+    def test_abort(self):
+        calls = []
+
+        def abort():
+            calls.append(time.time())
+            return len(calls) > 2
+
+        started = time.time()
+        status, output = system_command('echo start; sleep 10; echo end', self.logger, abort=abort, interval=0.1,
+                                        return_output=True, throw_exception=False, issue_error=False)
+        self.assertEqual((status, output), (-4, 'start\n'))
+        self.assertTrue(time.time() - started < 5)
+        # a failing abort check is disabled
+        status = system_command('sleep 0.3', self.logger, abort=lambda: 1/0, interval=0.1)
+        self.assertEqual(status, 0)
+        self.assertTrue(any([args[0].startswith('Abort check of system command disabled')
+                             for name, args, kwargs in self.logger.records if name == 'warning']))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the on-disk cache of parsed YU files (yu_cache).
+"""
+
+# built-in modules
+import os, unittest
+
+# other modules
+import numpy as np
+
+# private modules
+import yu_cache
+import parse_yuprtest
+import comp_yuprtest
+from tests.yu_files import TempDirTestCase, write, write_yuprtest
+from tests.test_comp_yuprtest import run, nts, tols
+
+
+class CountingParser:
+    """parse function counting its calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, filename):
+        self.calls += 1
+        f = open(filename, 'r')
+        try:
+            return {'text': np.array(f.read())}
+        finally:
+            f.close()
+
+
+class CacheTest(TempDirTestCase):
+    """entries are reused while the file is unchanged"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.cache = yu_cache.YuCache(self.path('cache'))
+        self.parse = CountingParser()
+
+    def load(self, filename, kind='text'):
+        return str(self.cache.load(filename, kind, self.parse)['text'])
+
+    def test_hit(self):
+        path = write(self.path('f'), 'content')
+        for i in range(3):
+            self.assertEqual(self.load(path), 'content')
+        self.assertEqual(self.parse.calls, 1)
+        # other kinds of the same file have their own entry
+        self.load(path, 'other')
+        self.assertEqual(self.parse.calls, 2)
+
+    def test_changed_file(self):
+        path = write(self.path('f'), 'content')
+        self.load(path)
+        write(path, 'changed')
+        os.utime(path, (0, 0))
+        self.assertEqual(self.load(path), 'changed')
+        self.assertEqual(self.parse.calls, 2)
+
+    def test_touched_file(self):
+        path = write(self.path('f'), 'content')
+        self.load(path)
+        write(path, 'content')
+        os.utime(path, (0, 0))
+        self.assertEqual(self.load(path), 'content')
+        self.assertEqual(self.parse.calls, 1)
+
+    def test_broken_entry(self):
+        path = write(self.path('f'), 'content')
+        self.load(path)
+        for name in os.listdir(self.path('cache')):
+            write(self.path('cache', name), 'not a npz file')
+        self.assertEqual(self.load(path), 'content')
+        self.assertEqual(self.parse.calls, 2)
+
+    def test_evict(self):
+        files = [write(self.path('f%i' % i), 'x'*300000) for i in range(5)]
+        for i, path in enumerate(files[:4]):
+            self.load(path)
+            os.utime(self.path('cache', self.cache._entry(os.path.abspath(path), 'text')), (i, i))
+        self.assertEqual(len(os.listdir(self.path('cache'))), 4)
+        # the least recently used entries are removed when a new one is stored
+        small = yu_cache.YuCache(self.path('cache'), maxsize=0.7)
+        small.load(files[4], 'text', self.parse)
+        entries = sorted(os.listdir(self.path('cache')))
+        self.assertEqual(entries, sorted([os.path.basename(small._entry(os.path.abspath(files[i]), 'text'))
+                                          for i in [3, 4]]))
+
+    def test_from_environ(self):
+        self.assertEqual(yu_cache.from_environ({}), None)
+        self.assertEqual(yu_cache.from_environ({'YUCACHE': ''}), None)
+        cache = yu_cache.from_environ({'YUCACHE': self.path('c'), 'YUCACHE_SIZE': '10'})
+        self.assertEqual((cache.cachedir, cache.maxsize), (self.path('c'), 10.))
+
+    def test_yuprtest(self):
+        ref = write_yuprtest(self.path('ref'))
+        run_file = write_yuprtest(self.path('run'), perturbed=(4, 17), pert=1e-6)
+        d = parse_yuprtest.read_yuprtest(ref)
+        for i in range(2):
+            cached = parse_yuprtest.read_yuprtest(ref, cache=self.cache)
+            for name, array in d.to_arrays().items():
+                np.testing.assert_array_equal(cached.to_arrays()[name], array)
+        expected = run(comp_yuprtest.cmp_, run_file, ref, 1, 1e-15, nts, tols, tols)
+        self.assertEqual(run(comp_yuprtest.cmp_columnar, run_file, ref, 1, 1e-15, nts, tols, tols,
+                             cache=self.cache), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the digest manifests of YUPRTEST files (yu_digest) and of the bit
+identity shortcut of identical_check.py.
+"""
+
+# built-in modules
+import os, unittest
+
+# private modules
+import yu_digest
+import ts_checker
+from tests.yu_files import TempDirTestCase, read, write, write_yuprtest, yuprtest_header, yuprtest_lines
+from tests.test_comp_yuprtest import run
+
+checkers_dir = os.path.dirname(os.path.dirname(os.path.abspath(ts_checker.__file__)))
+
+namelist = ''' &RUNCTL
+  dt = 40.0,
+  lyuprdbg = .TRUE.,
+ /
+'''
+
+
+class ManifestTest(TempDirTestCase):
+    """manifests are written, read and invalidated with the file"""
+
+    def test_step_digests(self):
+        path = write_yuprtest(self.path('f'), nsteps=3, first=2)
+        digest, steps = yu_digest.step_digests(path)
+        text = read(path)
+        self.assertEqual([s[:3] for s in steps], [(2, 5, 10), (3, 15, 10), (4, 25, 10)])
+        for nt, first, n, d, offset in steps:
+            self.assertEqual(text[offset:].split('\n', 1)[0].split()[1], str(nt))
+
+    def test_write_and_read(self):
+        path = write_yuprtest(self.path('f'))
+        self.assertEqual(yu_digest.read_manifest(path), None)
+        yu_digest.write_manifest(path)
+        self.assertEqual(yu_digest.read_manifest(path), yu_digest.step_digests(path))
+        # manifests written without the byte offsets
+        text = read(path + yu_digest.manifest_suffix)
+        write(path + yu_digest.manifest_suffix, '\n'.join([' '.join(line.split()[:5]) for line in text.split('\n')]))
+        self.assertEqual([s[:4] + (None,) for s in yu_digest.step_digests(path)[1]],
+                         yu_digest.read_manifest(path)[1])
+
+    def test_stale_manifest(self):
+        path = write_yuprtest(self.path('f'))
+        yu_digest.write_manifest(path)
+        # same content, new modification time
+        write_yuprtest(path)
+        os.utime(path, (0, 0))
+        self.assertNotEqual(yu_digest.read_manifest(path), None)
+        # same size, other content
+        write_yuprtest(path, perturbed=(3,))
+        os.utime(path, (0, 0))
+        self.assertEqual(yu_digest.read_manifest(path), None)
+        # other size
+        write_yuprtest(path, nsteps=29)
+        self.assertEqual(yu_digest.read_manifest(path), None)
+        # broken manifest
+        yu_digest.write_manifest(path)
+        write(path + yu_digest.manifest_suffix, 'file 1234\n')
+        self.assertEqual(yu_digest.read_manifest(path), None)
+
+    def test_check_steps(self):
+        ref = write_yuprtest(self.path('ref'))
+        run_file = write_yuprtest(self.path('run'))
+        self.assertEqual(yu_digest.check_steps(run_file, ref), None)  # no manifest
+        yu_digest.write_manifest(ref)
+        self.assertEqual(yu_digest.check_steps(run_file, ref), [])
+        write_yuprtest(run_file, perturbed=(0, 12, 29))
+        self.assertEqual(yu_digest.check_steps(run_file, ref), [0, 12, 29])
+        # runs starting later or stopping earlier
+        write_yuprtest(run_file, nsteps=20, first=5, perturbed=(12,))
+        self.assertEqual(yu_digest.check_steps(run_file, ref), [12])
+        # an incomplete last step differs
+        write(run_file, yuprtest_header + ''.join(yuprtest_lines(nsteps=10)[:95]))
+        self.assertEqual(yu_digest.check_steps(run_file, ref), [9])
+
+    def test_steps_which_can_not_be_compared(self):
+        ref = write_yuprtest(self.path('ref'))
+        yu_digest.write_manifest(ref)
+        lines = yuprtest_lines()
+        for text in [yuprtest_header + ''.join(lines[:50] + lines[60:]),  # a step is missing
+                     yuprtest_header + ''.join(lines[:55] + lines[56:]),  # a record is missing
+                     yuprtest_header,
+                     '']:
+            run_file = write(self.path('run'), text)
+            self.assertEqual(yu_digest.check_steps(run_file, ref), None)
+        self.assertEqual(yu_digest.check_steps(self.path('missing'), ref), None)
+        # no common step
+        run_file = write_yuprtest(self.path('run'), nsteps=3, first=40)
+        self.assertEqual(yu_digest.check_steps(run_file, ref), None)
+
+    def test_file_digest(self):
+        file1 = write_yuprtest(self.path('f1'))
+        file2 = write_yuprtest(self.path('f2'))
+        file3 = write_yuprtest(self.path('f3'), perturbed=(29,))
+        self.assertEqual(yu_digest.step_digests(file1)[0], yu_digest.yu_reader.file_digest(file1))
+        self.assertEqual(yu_digest.yu_reader.file_digest(file1), yu_digest.yu_reader.file_digest(file2))
+        self.assertNotEqual(yu_digest.yu_reader.file_digest(file1), yu_digest.yu_reader.file_digest(file3))
+
+
+class IdenticalCheckTest(TempDirTestCase):
+    """identical_check.py gives the same status with and without manifest"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.checker = ts_checker._import(os.path.join(checkers_dir, 'identical_check.py'))
+        for d in ['run', 'ref']:
+            os.mkdir(self.path(d))
+            write(self.path(d, 'INPUT_ORG'), namelist)
+        self.env = {'VERBOSE': '2', 'RUNDIR': self.path('run'), 'REFOUTDIR': self.path('ref')}
+
+    def check(self, engine):
+        env = dict(self.env, YUENGINE=engine)
+        return run(self.checker.check, env)
+
+    def test_shortcut(self):
+        ref = write_yuprtest(self.path('ref', 'YUPRTEST'))
+        for perturbed in [(), (7,), (29,)]:
+            write_yuprtest(self.path('run', 'YUPRTEST'), perturbed=perturbed)
+            for engine in ['python', 'numpy']:
+                if os.path.exists(ref + yu_digest.manifest_suffix):
+                    os.remove(ref + yu_digest.manifest_suffix)
+                status, output = self.check(engine)
+                self.assertEqual(status, 20 if perturbed else 0)
+                yu_digest.write_manifest(ref)
+                status, output = self.check(engine)
+                self.assertEqual(status, 20 if perturbed else 0)
+                self.assertEqual('same digests' in output, not perturbed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the time step index of YUPRTEST files (yu_index).
+"""
+
+# built-in modules
+import os, unittest
+
+# private modules
+import yu_index
+import yu_digest
+from tests.yu_files import TempDirTestCase, read, write, write_yuprtest, yuprtest_header, yuprtest_lines
+
+
+class IndexTest(TempDirTestCase):
+    """the index gives the records of each time step"""
+
+    def test_build_and_load(self):
+        path = write_yuprtest(self.path('f'), nsteps=5, first=3)
+        index = yu_index.build_index(path)
+        self.assertEqual((index.nts, index.linenos, index.size), ([3, 4, 5, 6, 7], [5, 15, 25, 35, 45],
+                                                                  os.path.getsize(path)))
+        self.assertEqual(yu_index.load_index(path), None)
+        yu_digest.write_manifest(path)
+        loaded = yu_index.load_index(path)
+        self.assertEqual((loaded.nts, loaded.offsets, loaded.linenos), (index.nts, index.offsets, index.linenos))
+        self.assertTrue(yu_index.step_index(path).size is None)
+
+    def test_read_step(self):
+        path = write_yuprtest(self.path('f'), nsteps=5, first=3)
+        lines = read(path).splitlines(True)
+        index = yu_index.step_index(path)
+        for nt in range(3, 8):
+            self.assertEqual(index.read_step(nt), lines[4 + 10*(nt-3):14 + 10*(nt-3)])
+        self.assertEqual(index.read_step(2), [])
+        self.assertEqual(index.read_step(8), [])
+
+    def test_locate_step(self):
+        path = write_yuprtest(self.path('f'), nsteps=5, first=3)
+        index = yu_index.build_index(path)
+        f = open(path, 'rb')
+        try:
+            start = index.offsets[0]
+            for nt, offset in [(0, start), (3, start), (5, index.offsets[2]), (7, index.offsets[4]), (8, index.size)]:
+                self.assertEqual(yu_index.locate_step(f, nt, start, index.size), offset)
+        finally:
+            f.close()
+
+    def test_not_ascending(self):
+        lines = yuprtest_lines(nsteps=3)
+        path = write(self.path('f'), yuprtest_header + ''.join(lines[20:] + lines[:20]))
+        self.assertRaises(ValueError, yu_index.build_index, path)
+
+
+class DivergenceTest(TempDirTestCase):
+    """the first record which differs is found by bisection"""
+
+    def test_first_divergence(self):
+        ref = write_yuprtest(self.path('ref'))
+        run_file = self.path('run')
+        for manifest in [False, True]:
+            if manifest:
+                yu_digest.write_manifest(ref)
+            write_yuprtest(run_file)
+            self.assertEqual(yu_index.first_divergence(run_file, ref), None)
+            for k in [0, 1, 13, 29]:
+                write_yuprtest(run_file, perturbed=range(k, 30))
+                self.assertEqual(yu_index.first_divergence(run_file, ref), (k, 5 + 10*k, 'PP'))
+
+    def test_records_of_a_step(self):
+        ref = write_yuprtest(self.path('ref'))
+        lines = yuprtest_lines(perturbed=range(8, 30))
+        ref_lines = yuprtest_lines()
+        # the step 8 differs from its fourth record (T, level 2) only
+        lines[80:83] = ref_lines[80:83]
+        run_file = write(self.path('run'), yuprtest_header + ''.join(lines))
+        self.assertEqual(yu_index.first_divergence(run_file, ref), (8, 88, 'T'))
+
+    def test_steps_of_the_files(self):
+        ref = write_yuprtest(self.path('ref'))
+        # shorter run, later start
+        run_file = write_yuprtest(self.path('run'), nsteps=10, first=5, perturbed=range(9, 30))
+        self.assertEqual(yu_index.first_divergence(run_file, ref), (9, 95, 'PP'))
+        run_file = write_yuprtest(self.path('run'), nsteps=10, first=5)
+        self.assertEqual(yu_index.first_divergence(run_file, ref), None)
+        # no record
+        self.assertEqual(yu_index.first_divergence(write(run_file, yuprtest_header), ref), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
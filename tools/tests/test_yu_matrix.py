@@ -0,0 +1,73 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the pairwise reproducibility matrix of N runs (yu_matrix).
+"""
+
+# built-in modules
+import os, unittest
+
+# other modules
+import numpy as np
+
+# private modules
+import yu_matrix
+from tests.yu_files import TempDirTestCase, write, write_yuprtest
+
+
+class MatrixTest(TempDirTestCase):
+    """the first differing time step and the groups of identical runs"""
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.files = [write_yuprtest(self.path('a')),
+                      write_yuprtest(self.path('b')),
+                      write_yuprtest(self.path('c'), perturbed=range(12, 30), pert=1e-6),
+                      write_yuprtest(self.path('d'), nsteps=10),
+                      write_yuprtest(self.path('e'), nsteps=5, first=40)]
+
+    def test_matrix(self):
+        matrix = yu_matrix.ReproMatrix(self.files, nproc=1)
+        self.assertEqual(matrix.first.tolist(), [[-1, -1, 12, -1, -1],
+                                                 [-1, -1, 12, -1, -1],
+                                                 [12, 12, -1, -1, -1],
+                                                 [-1, -1, -1, -1, -1],
+                                                 [-1, -1, -1, -1, -1]])
+        self.assertEqual(matrix.ncommon.tolist(), [[300, 300, 300, 100, 0],
+                                                   [300, 300, 300, 100, 0],
+                                                   [300, 300, 300, 100, 0],
+                                                   [100, 100, 100, 100, 0],
+                                                   [0, 0, 0, 0, 50]])
+        self.assertAlmostEqual(matrix.maxrel[0, 2], 2e-6, 10)
+        self.assertTrue(matrix.maxabs[0, 2] > 0)
+        self.assertEqual(matrix.maxabs[0, 1], 0.)
+        self.assertEqual(matrix.groups(), [[0, 1, 3], [2], [4]])
+
+    def test_report(self):
+        report = yu_matrix.ReproMatrix(self.files[:3], nproc=1).report(['A', 'B', 'C'])
+        lines = report.splitlines()
+        self.assertEqual([line.split() for line in lines[4:7]], [['1', '=', '=', '12', 'A'],
+                                                                 ['2', '=', '=', '12', 'B'],
+                                                                 ['3', '12', '12', '=', 'C']])
+        self.assertEqual(lines[-1], 'Bit identical results: [1,2] [3]')
+        # no common time step
+        report = yu_matrix.ReproMatrix([self.files[0], self.files[4]], nproc=1).report()
+        self.assertEqual(report.splitlines()[4].split(), ['1', '=', '-', self.files[0]])
+
+    def test_pool(self):
+        serial = yu_matrix.ReproMatrix(self.files, nproc=1)
+        pool = yu_matrix.ReproMatrix(self.files, nproc=2)
+        for name in ['maxabs', 'maxrel', 'first', 'ncommon']:
+            self.assertTrue(np.array_equal(getattr(pool, name), getattr(serial, name)))
+
+    def test_run_label(self):
+        os.mkdir(self.path('run'))
+        self.assertEqual(yu_matrix.run_label(self.path('run')), self.path('run'))
+        write(self.path('run', 'INPUT_ORG'), ' &RUNCTL\n  nprocx = 4,\n  nprocy = 2,\n /\n')
+        self.assertEqual(yu_matrix.run_label(self.path('run')), self.path('run') + ' (4x2)')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the streaming readers of YU files (yu_reader), plain or compressed.
+"""
+
+# built-in modules
+import os, gzip, unittest
+
+# private modules
+import yu_reader
+import yu_digest
+import yu_index
+import comp_yuprtest
+from tests.test_comp_yuprtest import run, nts, tols
+from tests.yu_files import TempDirTestCase, read, write, write_yuprtest, yuprtest_header
+
+
+class ReaderTest(TempDirTestCase):
+    """lines and records are read as by readlines"""
+
+    def test_lines(self):
+        path = write(self.path('f'), 'a\nb\n\nc')
+        self.assertEqual(list(yu_reader.lines(path)), [(1, 'a\n'), (2, 'b\n'), (3, '\n'), (4, 'c')])
+        self.assertEqual(yu_reader.count_lines(path), 4)
+        self.assertEqual(yu_reader.count_lines(path, limit=2), 2)
+        self.assertEqual(yu_reader.read_lines(path, [4, 2]), {2: 'b\n', 4: 'c'})
+        self.assertEqual(yu_reader.read_lines(path, [7]), {})
+        self.assertEqual(yu_reader.read_lines(path, []), {})
+        self.assertEqual(yu_reader.count_lines(write(self.path('empty'), '')), 0)
+
+    def test_line_blocks(self):
+        path = write_yuprtest(self.path('f'))
+        blocks = list(yu_reader.line_blocks(path, sizehint=1000))
+        self.assertTrue(len(blocks) > 1)
+        first = 1
+        text = ''
+        for start, block in blocks:
+            self.assertEqual(start, first)
+            first += len(block)
+            text += ''.join(block)
+        self.assertEqual(text, read(path))
+
+    def test_paired_lines(self):
+        file1 = write(self.path('f1'), 'a\nb\nc\n')
+        file2 = write(self.path('f2'), 'A\nB\n')
+        self.assertEqual(list(yu_reader.paired_lines(file1, file2)), [('a\n', 'A\n'), ('b\n', 'B\n')])
+
+    def test_yuprtest_records(self):
+        path = write_yuprtest(self.path('f'), nsteps=3)
+        records = list(yu_reader.yuprtest_records(path))
+        lines = read(path).splitlines(True)
+        self.assertEqual(len(records), 30)
+        self.assertEqual(records[0], (5, lines[4], lines[4].split()))
+        self.assertEqual([r[1] for r in records], lines[4:])
+        self.assertEqual(list(yu_reader.yuprtest_records(write(self.path('h'), yuprtest_header))), [])
+
+    def test_aligned_yuprtest_records(self):
+        file1 = write_yuprtest(self.path('f1'), nsteps=10)
+        file2 = write_yuprtest(self.path('f2'), nsteps=3, first=4)
+        for a, b in [(file1, file2), (file2, file1)]:
+            pairs = list(yu_reader.aligned_yuprtest_records(a, b))
+            self.assertEqual(len(pairs), 30)
+            for rec1, rec2 in pairs:
+                self.assertEqual(rec1[1], rec2[1])
+            self.assertEqual(int(pairs[0][0][2][1]), 4)
+        # no common time step
+        file3 = write_yuprtest(self.path('f3'), nsteps=3, first=20)
+        self.assertEqual(list(yu_reader.aligned_yuprtest_records(file1, file3)), [])
+        self.assertEqual(list(yu_reader.aligned_yuprtest_records(file1, write(self.path('e'), ''))), [])
+
+
+class CompressedTest(TempDirTestCase):
+    """compressed files are read as the uncompressed file"""
+
+    def gzip(self, source, target):
+        f = gzip.open(target, 'wb')
+        try:
+            f.write(read(source))
+        finally:
+            f.close()
+        return target
+
+    def test_read(self):
+        plain = write_yuprtest(self.path('plain'))
+        self.gzip(plain, self.path('ref.gz'))
+        ref = self.path('ref')
+        self.assertEqual(yu_reader.yufile_path(ref), ref + '.gz')
+        self.assertTrue(yu_reader.yufile_exists(ref))
+        self.assertFalse(yu_reader.yufile_exists(self.path('missing')))
+        self.assertEqual(list(yu_reader.lines(ref)), list(yu_reader.lines(plain)))
+        self.assertEqual(yu_reader.file_digest(ref), yu_reader.file_digest(plain))
+        # recognized by the first bytes, whatever the name
+        self.gzip(plain, self.path('other'))
+        self.assertEqual(yu_reader.file_digest(self.path('other')), yu_reader.file_digest(plain))
+
+    def test_copy(self):
+        plain = write_yuprtest(self.path('plain'))
+        target = write(self.path('ref'), 'old reference')
+        self.assertEqual(yu_reader.copy_yufile(plain, target, 'gz'), target + '.gz')
+        self.assertFalse(os.path.exists(target))
+        self.assertEqual(yu_reader.file_digest(target), yu_reader.file_digest(plain))
+        self.assertEqual(yu_reader.copy_yufile(target, target), target)
+        self.assertFalse(os.path.exists(target + '.gz'))
+        self.assertEqual(read(target), read(plain))
+        self.assertRaises(ValueError, yu_reader.copy_yufile, plain, target, 'bz2')
+
+    def test_xz_without_lzma(self):
+        if yu_reader.lzma is not None:
+            return  # only without the lzma module
+        write(self.path('ref.xz'), '\xfd7zXZ\x00 compressed')
+        self.assertRaises(IOError, yu_reader.open_yufile, self.path('ref'))
+        self.assertRaises(IOError, yu_reader.copy_yufile, write_yuprtest(self.path('plain')), self.path('ref'), 'xz')
+
+    def test_comparisons(self):
+        plain = write_yuprtest(self.path('plain'))
+        ref = self.gzip(plain, self.path('ref.gz'))[:-3]
+        run_file = write_yuprtest(self.path('run'), perturbed=range(9, 30), pert=1e-6)
+        for cmp in [comp_yuprtest.cmp_, comp_yuprtest.cmp_columnar]:
+            for v_level in [0, 1, 2]:
+                result, output = run(cmp, run_file, ref, v_level, 1e-15, nts, tols, tols)
+                self.assertEqual((result, output.replace(ref, plain)),
+                                 run(cmp, run_file, plain, v_level, 1e-15, nts, tols, tols))
+        # the byte offsets of the manifest are those of the uncompressed file
+        yu_digest.write_manifest(ref)
+        self.assertEqual(yu_digest.read_manifest(ref), yu_digest.step_digests(plain))
+        self.assertEqual(yu_index.load_index(ref).offsets, yu_index.build_index(plain).offsets)
+        self.assertEqual(yu_index.load_index(ref).read_step(9), yu_index.build_index(plain).read_step(9))
+        self.assertEqual(yu_digest.check_steps(run_file, ref), range(9, 30))
+        self.assertEqual(yu_index.first_divergence(run_file, ref), (9, 95, 'PP'))
+        self.assertEqual(yu_index.first_divergence(self.gzip(run_file, self.path('run.gz')), ref), (9, 95, 'PP'))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Tests of the YUPRTEST watcher (yu_watch) and of the abort of the commands
+run by system_command (ts_utilities).
+"""
+
+# built-in modules
+import os, sys, time, unittest, StringIO
+
+# private modules
+import comp_yuprtest
+from yu_watch import YuWatcher
+from ts_utilities import system_command
+from ts_logger import BufferedLogger
+from tests.yu_files import TempDirTestCase, write, write_yuprtest, yuprtest_header, yuprtest_lines
+
+nts = [10, 15, 25]
+tols = [1e-9, 1e-7, 1e-5]
+
+
+class WatcherTest(TempDirTestCase):
+    """comparison of a growing YUPRTEST file"""
+
+    def grow(self, watcher, text, pieces):
+        """write text in pieces to the watched file, polling after each piece,
+        returns the number of bytes written when the watcher failed"""
+        f = open(watcher.filename, 'w')
+        try:
+            size = len(text)
+            for k in range(pieces):
+                f.write(text[k*size/pieces:(k+1)*size/pieces])
+                f.flush()
+                if watcher.poll():
+                    return (k+1)*size/pieces
+        finally:
+            f.close()
+        return None
+
+    def test_same_verdict_as_cmp(self):
+        ref = write_yuprtest(self.path('ref'))
+        for perturbed, pert in [((), 0.), ((12,), 1e-8), ((12,), 1e-6), ((27,), 1e-6), ((27,), 1e-4)]:
+            run_file = self.path('run')
+            text = yuprtest_header + ''.join(yuprtest_lines(perturbed=perturbed, pert=pert))
+            watcher = YuWatcher(run_file, ref, 1e-15, nts, tols, tols)
+            failed = self.grow(watcher, text, 37)
+            stdout = sys.stdout
+            sys.stdout = StringIO.StringIO()
+            try:
+                errors = comp_yuprtest.cmp_(run_file, ref, -1, 1e-15, nts, tols, tols)
+            finally:
+                sys.stdout = stdout
+            self.assertEqual(failed is not None, errors != 0, (perturbed, pert))
+            if failed is not None:
+                self.assertEqual(watcher.failed_step, perturbed[0])
+                self.assertTrue(failed < len(text))
+
+    def test_incomplete_lines(self):
+        ref = write_yuprtest(self.path('ref'))
+        watcher = YuWatcher(self.path('run'), ref, 1e-15, nts, tols, tols)
+        lines = yuprtest_lines(perturbed=(5,), pert=1e-3)
+        # a line is only compared once complete
+        text = yuprtest_header + ''.join(lines[:20]) + lines[50][:30]
+        self.assertEqual(self.grow(watcher, text, 1), None)
+        # a line which is not a record stops the comparison without failure
+        for bad in ['\n', '   \n', ' PP\n', ' PP  xx\n']:
+            watcher = YuWatcher(self.path('run'), ref, 1e-15, nts, tols, tols)
+            text = yuprtest_header + ''.join(lines[:20]) + bad + ''.join(lines[20:])
+            self.assertEqual(self.grow(watcher, text, 5), None, repr(bad))
+            self.assertEqual(watcher.failure, None)
+
+
+class AbortTest(TempDirTestCase):
+    """commands aborted by system_command"""
+
+    def test_abort_kills_process_group(self):
+        pidfile = self.path('pid')
+        logger = BufferedLogger()
+        start = time.time()
+        status = system_command('sleep 30 & echo $! > %s; sleep 30' % pidfile, logger, throw_exception=False,
+                                issue_error=False, abort=lambda: os.path.exists(pidfile), interval=0.1)
+        self.assertEqual(status, -4)
+        self.assertTrue(time.time() - start < 10)
+        # the background process was killed too (it may remain a zombie
+        # if there is no init process to reap it)
+        pid = int(open(pidfile).read())
+        try:
+            status = open('/proc/%i/stat' % pid).read().split()[2]
+        except IOError:
+            status = 'X'
+        self.assertTrue(status in 'XZ', status)
+
+    def test_abort_exception(self):
+        # an exception of abort disables it, the command runs to its end
+        def abort():
+            raise IndexError('list index out of range')
+        logger = BufferedLogger()
+        status, output = system_command('sleep 0.3; echo done', logger, throw_exception=False, abort=abort,
+                                        interval=0.05, return_output=True)
+        self.assertEqual((status, output), (0, 'done\n'))
+        self.assertEqual([r[0] for r in logger.records if r[0] in ['warning', 'error']], ['warning'])
+
+    def test_watched_run(self):
+        # model writing a diverging YUPRTEST file, aborted by the watcher
+        ref = write_yuprtest(self.path('ref'))
+        lines = yuprtest_lines(perturbed=(3,), pert=1e-3)
+        write(self.path('records'), ''.join(lines))
+        model = write(self.path('model.sh'),
+                      'cat > YUPRTEST <<EOF\n%sEOF\n'
+                      'while read line; do echo "$line" >> YUPRTEST; sleep 0.01; done < records\n'
+                      'sleep 30\n' % yuprtest_header)
+        watcher = YuWatcher(self.path('YUPRTEST'), ref, 1e-15, nts, tols, tols)
+        start = time.time()
+        status = system_command('sh model.sh', BufferedLogger(), throw_exception=False, issue_error=False,
+                                abort=watcher.poll, interval=0.05, cwd=self.dir)
+        self.assertEqual(status, -4)
+        self.assertEqual(watcher.failed_step, 3)
+        self.assertTrue(time.time() - start < 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
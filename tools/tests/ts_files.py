@@ -0,0 +1,120 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Synthetic testsuite directories used by the tests: a testlist, the namelists
+and reference files of the tests in data/ and a fake model, which writes the
+files of output/<type>/<name> into its run directory. The checkers are
+links to those of this repository.
+"""
+
+# built-in modules
+import os, copy
+
+# private modules
+import ts_checker
+from default_values import DefaultValues
+from tests.yu_files import write, write_yuprtest, yuchkdat_text
+
+tools_dir = os.path.dirname(os.path.abspath(ts_checker.__file__))
+checkers_dir = os.path.dirname(tools_dir)
+
+namelists = {
+    'INPUT_ORG': ''' &LMGRID
+ /
+ &RUNCTL
+  dt=20.0,
+  nprocx=1,
+  nprocy=1,
+  nprocio=0,
+  nstop=%(nstop)i,
+  lyuprdbg=.TRUE.,
+ /
+''',
+    'INPUT_IO': ''' &IOCTL
+ ngribout=1,
+ /
+''',
+    'INPUT_DIA': ''' &DIACTL
+ ltestsuite=.TRUE.,
+ /
+'''}
+
+# the model copies its output and sleeps for the number of seconds given by
+# the file sleep of the output directory
+model = '''#!/bin/sh
+out=../../../output/$(basename $(dirname $PWD))/$(basename $PWD)
+cp $out/YU* . 2>/dev/null
+sleep $(cat $out/sleep 2>/dev/null || echo 0)
+echo "CLEAN UP"
+'''
+
+test_xml = '''  <test name="%(name)s" type="%(type)s">
+    <description>%(description)s</description>
+    <autoparallel>1</autoparallel>%(extra)s%(checkers)s
+  </test>
+'''
+
+
+def write_testsuite(basedir, names, nstop=10, extra=None, checkers=None):
+    """write a testsuite in basedir with the tests t/name of names, which
+    are checked with checkers (by default run_success_check.py and
+    identical_check.py), and the model model.sh. The reference and the
+    output of each test are the same YUPRTEST file and the testlist entry
+    of a test is completed with the elements extra[name]."""
+    extra = extra or {}
+    if checkers is None:
+        checkers = ['<checker>run_success_check.py</checker>', '<checker>identical_check.py</checker>']
+    os.mkdir(os.path.join(basedir, 'checkers'))
+    for name in os.listdir(checkers_dir):
+        if os.path.splitext(name)[1] in ['.py', '.sh', '.rb']:
+            os.symlink(os.path.join(checkers_dir, name), os.path.join(basedir, 'checkers', name))
+    os.symlink(tools_dir, os.path.join(basedir, 'tools'))
+    write(os.path.join(basedir, 'model.sh'), model)
+    os.chmod(os.path.join(basedir, 'model.sh'), 0755)
+    os.makedirs(os.path.join(basedir, 'data', 't', 'input'))
+    tests = ''
+    for name in names:
+        for d in ['data', 'output']:
+            os.makedirs(os.path.join(basedir, d, 't', name))
+            write_yuprtest(os.path.join(basedir, d, 't', name, 'YUPRTEST'))
+            write(os.path.join(basedir, d, 't', name, 'YUCHKDAT'), yuchkdat_text())
+        for nl, text in namelists.items():
+            write(os.path.join(basedir, 'data', 't', name, nl), text % {'nstop': nstop})
+        write(os.path.join(basedir, 'data', 't', name, 'exe.log'), 'CLEAN UP\n')
+        tests += test_xml % {'name': name, 'type': 't', 'description': 'test ' + name,
+                             'extra': ''.join(['\n    ' + e for e in extra.get(name, [])]),
+                             'checkers': ''.join(['\n    ' + c for c in checkers])}
+    write(os.path.join(basedir, 'testlist.xml'), '<testlist>\n' + tests + '</testlist>\n')
+
+
+def write_checker(basedir, name, text):
+    """write the checker name of the testsuite in basedir"""
+    path = write(os.path.join(basedir, 'checkers', name), text)
+    os.chmod(path, 0755)
+    return path
+
+
+def write_output(basedir, name, perturbed=(), pert=1e-6, sleep=None):
+    """set the YUPRTEST file written by the model for the test t/name and
+    the duration of its run"""
+    write_yuprtest(os.path.join(basedir, 'output', 't', name, 'YUPRTEST'), perturbed=perturbed, pert=pert)
+    if sleep is not None:
+        write(os.path.join(basedir, 'output', 't', name, 'sleep'), str(sleep))
+
+
+def options(**kwargs):
+    """return the options of the testsuite to run the tests of write_testsuite"""
+    options = copy.copy(DefaultValues())
+    options.workdir = 'work'
+    options.exe = 'model.sh'
+    options.nprocs = 1
+    options.mpicmd = ''
+    options.use_wrappers = False
+    options.only = None
+    options.update_namelist = False
+    options.update_yufiles = False
+    for name, value in kwargs.items():
+        setattr(options, name, value)
+    return options
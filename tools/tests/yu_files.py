@@ -0,0 +1,91 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Synthetic YU files and temporary directories used by the tests.
+"""
+
+# built-in modules
+import os, shutil, tempfile, random, unittest
+
+yuprtest_header = '''#  header 1
+#  header 2
+#  header 3
+#  var  nt  lev min imin jmin lev max imax jmax mean
+'''
+
+variables = ['PP', 'T', 'U', 'V', 'QV']
+
+
+def yuprtest_lines(nsteps=30, perturbed=(), pert=1e-6, first=0):
+    """return the records of a YUPRTEST file with nsteps time steps starting
+    at first, the values of the time steps perturbed are multiplied by 1+pert
+    (min) and 1+2*pert (mean)"""
+    lines = []
+    for nt in range(first, first+nsteps):
+        for var in variables:
+            for lev in [1, 2]:
+                r = random.Random(nt*1000 + sum(map(ord, var))*7 + lev)
+                vmin, vmax, vmean = r.uniform(1, 300), r.uniform(300, 600), r.uniform(1, 300)
+                if nt in perturbed:
+                    vmin *= 1 + pert
+                    vmean *= 1 + 2*pert
+                lines.append(' %4s %5i %3i %22.15E %4i %4i %3i %22.15E %4i %4i %22.15E\n'
+                             % (var, nt, lev, vmin, 3, 4, lev, vmax, 5, 6, vmean))
+    return lines
+
+
+def write_yuprtest(path, nsteps=30, perturbed=(), pert=1e-6, first=0):
+    """write a YUPRTEST file, see yuprtest_lines"""
+    write(path, yuprtest_header + ''.join(yuprtest_lines(nsteps, perturbed, pert, first)))
+    return path
+
+
+def yuchkdat_text(nsteps=5, perturbed=(), pert=1e-6):
+    """return the content of a YUCHKDAT file with nsteps sets, the values of
+    the sets of the steps perturbed are multiplied by 1+pert"""
+    text = ''
+    for step in range(nsteps):
+        text += ' Check of fields at nstep (hour):       step: %i\n\n' % step
+        text += '   var  ee  lev     min    imin  jmin     max     imax  jmax     mean\n'
+        for var in variables:
+            for lev in [1, 2]:
+                r = random.Random(step*1000 + sum(map(ord, var))*7 + lev)
+                vmin, vmax, vmean = r.uniform(1, 300), r.uniform(300, 600), r.uniform(1, 300)
+                if step in perturbed:
+                    vmin, vmax, vmean = [v*(1 + pert) for v in (vmin, vmax, vmean)]
+                text += '  %-4s %4i %4i %14.7E %4i %4i %14.7E %4i %4i %14.7E\n' \
+                        % (var, 1, lev, vmin, 3, 4, vmax, 5, 6, vmean)
+        text += '\n'
+    return text
+
+
+def write(path, text):
+    f = open(path, 'w')
+    try:
+        f.write(text)
+    finally:
+        f.close()
+    return path
+
+
+def read(path):
+    f = open(path, 'r')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+class TempDirTestCase(unittest.TestCase):
+    """test case with a temporary directory self.dir, removed afterwards"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='ts_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def path(self, *names):
+        return os.path.join(self.dir, *names)
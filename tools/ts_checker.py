@@ -0,0 +1,287 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Execution of the checkers. Python checkers with a function check(env), env
+being the checker environment as returned by read_environ, are imported once
+and run in the testsuite process. Their output is captured for each thread
+so that checkers can run concurrently. All other checkers (ruby and shell
+scripts, python checkers without check(env)) are run as a command.
+
+The results of the checkers are cached, keyed by the content of the checker,
+of the testsuite tools, of the files read by the checker and by the checker
+environment, so that a checker is not run again on unchanged files.
+"""
+
+# built-in modules
+import os, sys, imp, glob, string, hashlib, inspect, tempfile, threading, traceback
+from StringIO import StringIO
+
+# private modules
+from ts_utilities import system_command
+import yu_reader
+
+_checkers = {}             # imported checkers by path, None if run as a command
+_lock = threading.Lock()   # protects the import of the checkers
+
+# files read by the checkers whose results are cached (patterns using the
+# variables of the checker environment), see ResultCache
+checker_inputs = {
+    'run_success_check.py'      : ['$RUNDIR/$LOGFILE'],
+    'identical_check.py'        : ['$RUNDIR/INPUT_*', '$RUNDIR/YUPRTEST', '$REFOUTDIR/YUPRTEST'],
+    'tolerance_check.py'        : ['$RUNDIR/INPUT_*', '$RUNDIR/YUPRTEST', '$REFOUTDIR/YUPRTEST',
+                                   '$NAMELISTDIR/$TOLERANCE', '$NAMELISTDIR/../$TOLERANCE'],
+    'output_tolerance_check.py' : ['$RUNDIR/INPUT_*', '$RUNDIR/YUCHKDAT', '$REFOUTDIR/YUCHKDAT',
+                                   '$NAMELISTDIR/$TOLERANCE', '$NAMELISTDIR/../$TOLERANCE'],
+    'checktimings.py'           : ['$RUNDIR/$LOGFILE', '$RUNDIR/$LOGFILE_SLURM', '$RUNDIR/$TIMINGS'],
+}
+cached_results = [0, 10, 15, 20, 30]  # other exit status are not cached
+
+# variables of the checker environment which do not change the result of the
+# checkers and are not part of the key of the cached results
+uncached_environ = ['VERBOSE', 'YUCACHE', 'YUCACHE_SIZE']
+
+
+def load_checker(path):
+    """return the checker module of path if it can be run in the testsuite
+    process, None if it must be run as a command"""
+
+    key = os.path.realpath(path)
+    with _lock:
+        if key not in _checkers:
+            _checkers[key] = _import(path)
+        return _checkers[key]
+
+
+def run_checker(path, env, logger, cwd=None, environ=None):
+    """run the checker path with the checker environment env (the TS_*
+    variables without prefix, see read_environ), returns the exit status and
+    the output of the checker. Checkers run as a command are started in the
+    directory cwd with the environment variables environ."""
+
+    module = load_checker(path)
+    if module is None:
+        return system_command(path, logger, return_output=True, throw_exception=False,
+                              issue_error=False, cwd=cwd, env=environ)
+
+    logger.debug('InProc: '+path)
+    output = StringIO()
+    _capture.start(output)
+    try:
+        try:
+            status = module.check(env)
+        except SystemExit as e:
+            status = e.code
+        except Exception:
+            # as the python interpreter does for a checker run as a command
+            traceback.print_exc(file=output)
+            status = 1
+    finally:
+        _capture.stop()
+    if status is None:
+        status = 0
+    elif not isinstance(status, int):
+        output.write(str(status) + '\n')
+        status = 1
+    return status, output.getvalue()
+
+
+class ResultCache:
+    """Cache of checker results in directory cachedir, limited to maxsize MB"""
+
+    def __init__(self, cachedir, maxsize=64):
+        self.cachedir = cachedir
+        self.maxsize = maxsize
+
+    def key(self, path, env, inputs):
+        """return the key of the result of the checker path, run with the
+        checker environment env on the files given by the patterns inputs"""
+        h = hashlib.sha1()
+        h.update(_tools_digest())
+        h.update(yu_reader.file_digest(path))
+        for k in sorted(env):
+            if k not in uncached_environ:
+                h.update('%s=%s\n' % (k, env[k]))
+        for pattern in inputs:
+            pattern = os.path.normpath(string.Template(pattern).safe_substitute(env))
+            files = sorted(glob.glob(pattern)) or [yu_reader.yufile_path(pattern)]
+            for f in files:
+                h.update(f + '\n')
+                h.update(yu_reader.file_digest(f) if os.path.isfile(f) else 'missing')
+        return h.hexdigest()
+
+    def load(self, key):
+        """return the exit status and output stored for key, None if absent"""
+        entry = self._entry(key)
+        try:
+            f = open(entry, 'rb')
+            try:
+                status = int(f.readline())
+                output = f.read()
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            os.utime(entry, None)  # the modification time of an entry is its last use
+        except OSError:
+            pass
+        return status, output
+
+    def store(self, key, status, output):
+        # write to a temporary file and rename it, so that concurrent
+        # checkers never see a partial entry
+        entry = self._entry(key)
+        try:
+            if not os.path.isdir(self.cachedir):
+                os.makedirs(self.cachedir)
+            fd, tmp = tempfile.mkstemp(dir=self.cachedir, suffix='.tmp')
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write('%i\n' % status)
+                f.write(output)
+            finally:
+                f.close()
+            os.rename(tmp, entry)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            return
+        self._evict(entry)
+
+    def _entry(self, key):
+        return os.path.join(self.cachedir, key + '.res')
+
+    def _evict(self, keep):
+        """remove least recently used entries until the cache is below maxsize"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cachedir):
+            if not name.endswith('.res'):
+                continue
+            entry = os.path.join(self.cachedir, name)
+            try:
+                stat = os.stat(entry)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+        for mtime, size, entry in sorted(entries):
+            if total <= self.maxsize*1024*1024:
+                break
+            if entry == keep:
+                continue
+            try:
+                os.remove(entry)
+                total -= size
+            except OSError:
+                pass
+
+
+def run_cached(cache, path, env, inputs, run, logger):
+    """return the exit status and output of the checker path, from the cache
+    if possible, else run() is called and its result stored. inputs are the
+    patterns of the files read by the checker, None if it is not cached."""
+    if cache is None or inputs is None:
+        return run()
+    try:
+        key = cache.key(path, env, inputs)
+    except (IOError, OSError):
+        return run()
+    result = cache.load(key)
+    if result is not None:
+        logger.debug('Cached: '+path)
+        return result
+    status, output = run()
+    if status in cached_results:
+        cache.store(key, status, output)
+    return status, output
+
+
+#----------------------------------------------------------------------------
+# Local functions
+_tools = []  # digest of the testsuite tools
+
+
+def _tools_digest():
+    """return the digest of the python modules of the tools directory, which
+    are used by the checkers"""
+    with _lock:
+        if not _tools:
+            h = hashlib.sha1()
+            for f in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+                h.update(yu_reader.file_digest(f))
+            _tools.append(h.hexdigest())
+        return _tools[0]
+
+
+def _import(path):
+    """import the python checker path, None if it is not a python checker
+    with a function check(env) or if it can not be imported"""
+    if not path.endswith('.py'):
+        return None
+    name = 'ts_checker_' + os.path.splitext(os.path.basename(path))[0]
+    # the source is compiled without writing bytecode into the checkers
+    # directory, and __file__ is the checker itself as when it is run as a
+    # command (the checkers name their messages after it)
+    module = imp.new_module(name)
+    module.__file__ = path
+    try:
+        f = open(path, 'rU')
+        try:
+            code = compile(f.read(), path, 'exec')
+        finally:
+            f.close()
+        exec code in module.__dict__
+    except (Exception, SystemExit):
+        return None  # the error is reported when run as a command
+    check = getattr(module, 'check', None)
+    if not inspect.isfunction(check) or not inspect.getargspec(check).args:
+        return None
+    return module
+
+
+class _ThreadOutput:
+    """replacement of sys.stdout and sys.stderr which writes to the buffer of
+    the current thread if it has one and to the original stream otherwise"""
+
+    def __init__(self, stream, local):
+        self._stream = stream
+        self._local = local
+
+    def write(self, text):
+        buf = getattr(self._local, 'buffer', None)
+        (self._stream if buf is None else buf).write(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if getattr(self._local, 'buffer', None) is None:
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _Capture:
+    """capture of the output of the checkers run in the testsuite process"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._installed = False
+
+    def start(self, buf):
+        with _lock:
+            if not self._installed:
+                sys.stdout = _ThreadOutput(sys.stdout, self._local)
+                sys.stderr = _ThreadOutput(sys.stderr, self._local)
+                self._installed = True
+        self._local.buffer = buf
+
+    def stop(self):
+        self._local.buffer = None
+
+
+_capture = _Capture()
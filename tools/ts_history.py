@@ -0,0 +1,205 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+History of the outcomes and durations of the tests, used to run first the
+tests which are most likely to fail early. A FAIL or CRASH stops the
+testsuite, so the tests are ordered by their probability to fail divided by
+their duration, which gives the shortest expected time to the first failure.
+The probability of a test to fail is estimated from its recorded results and
+is raised if its namelists or its definition in testlist.xml changed since
+its last run. A test always runs after the test it depends on (<depend>),
+see History.order.
+
+The durations of the model runs of a test also give its timeout: a high
+percentile of its recent run times multiplied by a safety factor, so that a
+hanging test is stopped long before the global timeout (see History.timeout).
+"""
+
+# built-in modules
+import os, sys, glob, json, math, hashlib, tempfile
+import xml.etree.ElementTree as ET
+
+# private modules
+import yu_reader
+from ts_scheduler import dependencies
+
+changed_failure = 0.5   # lowest probability to fail of a test which changed
+default_duration = 60.0 # seconds, duration of a test without history if no test has one
+smoothing = 0.3         # weight of the last run in the average duration
+run_times = 20          # number of recent run times kept for each test
+timeout_runs = 3        # run times needed before the timeout of a test is adapted
+timeout_percentile = 95 # percentile of the run times ...
+timeout_factor = 3.0    # ... multiplied by this safety factor
+timeout_min = 60        # seconds, lowest adapted timeout
+
+
+class History:
+    """Outcomes and durations of the tests, stored in the file path"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tests = {}
+        try:
+            f = open(path, 'r')
+            try:
+                self.tests = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            pass  # no history yet, or not readable: start a new one
+
+    def record(self, test, duration):
+        """record the result of test, which ran for duration seconds"""
+        if test.result == 15:
+            return  # SKIP, the test did not run
+        entry = self.tests.setdefault(_key(test), {'runs': 0, 'failures': 0})
+        entry['runs'] += 1
+        if test.result >= 20:
+            entry['failures'] += 1
+        if 'duration' in entry:
+            entry['duration'] += smoothing*(duration - entry['duration'])
+        else:
+            entry['duration'] = duration
+        entry['result'] = test.result
+        entry['inputs'] = inputs_digest(test)
+        # wall time of the completed model run, not set if it was restored
+        # (see ts_runstore) or did not complete
+        if getattr(test, 'run_time', None) is not None:
+            entry['times'] = (entry.get('times', []) + [test.run_time])[-run_times:]
+
+    def save(self):
+        """write the history, replacing the file atomically"""
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            f = os.fdopen(fd, 'w')
+            try:
+                json.dump(self.tests, f, indent=1, sort_keys=True)
+            finally:
+                f.close()
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            pass  # the history is only an optimization
+
+    def failure(self, test):
+        """return the estimated probability of test to fail"""
+        entry = self.tests.get(_key(test))
+        if entry is None:
+            return changed_failure
+        # the first run counts as half a failure (Laplace estimate)
+        p = (entry['failures'] + 1.0) / (entry['runs'] + 2.0)
+        if entry.get('inputs') != inputs_digest(test):
+            p = max(p, changed_failure)
+        return p
+
+    def duration(self, test):
+        """return the expected duration of test, in seconds"""
+        entry = self.tests.get(_key(test))
+        if entry is not None and 'duration' in entry:
+            return entry['duration']
+        known = sorted([e['duration'] for e in self.tests.values() if 'duration' in e])
+        if known:
+            return known[len(known)/2]
+        return default_duration
+
+    def timeout(self, test, default=None):
+        """return the timeout of the model run of test, in seconds: the
+        percentile timeout_percentile of its recent run times multiplied by
+        timeout_factor, but not above the global timeout default. Returns
+        default for tests with less than timeout_runs recorded runs."""
+        entry = self.tests.get(_key(test))
+        times = sorted(entry.get('times', [])) if entry is not None else []
+        if len(times) < timeout_runs:
+            return default
+        k = int(math.ceil(timeout_percentile/100.0*len(times))) - 1
+        timeout = max(int(math.ceil(times[max(k, 0)]*timeout_factor)), timeout_min)
+        if default:
+            timeout = min(timeout, int(default))
+        return timeout
+
+    def order(self, tests):
+        """return the tests ordered by decreasing probability to fail divided
+        by their duration, each test after the test it depends on. A test
+        others depend on is ranked by the best chain of tests it starts."""
+
+        depends = dependencies(tests)
+        dependents = [[j for j in range(len(tests)) if i in depends[j]] for i in range(len(tests))]
+        failure = [self.failure(t) for t in tests]
+        duration = [max(self.duration(t), 1e-3) for t in tests]
+        chains = {}
+
+        def chain(i, visiting=()):
+            """probability to fail and duration of the best chain from test i"""
+            if i not in chains:
+                best = (failure[i], duration[i])
+                for j in dependents[i]:
+                    if j in visiting:
+                        continue  # circular dependencies
+                    p, t = chain(j, visiting + (i,))
+                    p, t = 1.0 - (1.0 - failure[i])*(1.0 - p), duration[i] + t
+                    if p/t > best[0]/best[1]:
+                        best = (p, t)
+                chains[i] = best
+            return chains[i]
+
+        pending = range(len(tests))
+        placed = set()
+        ordered = []
+        while pending:
+            ready = [i for i in pending if all([d in placed for d in depends[i]])]
+            if not ready:
+                ready = pending[:1]  # circular dependencies, keep the testlist order
+            # the testlist order decides between tests of equal rank
+            i = max(ready, key=lambda i: (chain(i)[0]/chain(i)[1], -i))
+            pending.remove(i)
+            placed.add(i)
+            ordered.append(tests[i])
+        return ordered
+
+
+def inputs_digest(test):
+    """return the digest of the namelists of test and of its definition in
+    testlist.xml, to detect tests which changed since their last run"""
+    h = hashlib.sha1()
+    h.update(ET.tostring(test.node))
+    for f in sorted(glob.glob(test.namelistdir + 'INPUT_*')):
+        h.update(os.path.basename(f) + '\n')
+        try:
+            h.update(yu_reader.file_digest(f))
+        except (IOError, OSError):
+            h.update('missing')
+    return h.hexdigest()
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _key(test):
+    return test.type + '/' + test.name
+
+
+class _Named:
+    """test given by its key type/name"""
+
+    def __init__(self, key):
+        self.type, self.name = key.split('/', 1)
+
+
+#-----------------------------------
+#execute as a script
+if __name__ == "__main__":
+
+    if len(sys.argv) == 2:
+        history = History(sys.argv[1])
+        for key in sorted(history.tests):
+            entry = history.tests[key]
+            timeout = history.timeout(_Named(key))
+            print '%-40s %4i runs %4i failures %10.1f s  timeout %s' \
+                  %(key, entry['runs'], entry['failures'], entry.get('duration', 0.0),
+                    '%i s' %(timeout) if timeout else 'default')
+    else:
+        print '''USAGE : ts_history.py history
+
+DEFINITION :      print the recorded runs, failures, average duration and
+     adapted timeout of each test of the history file'''
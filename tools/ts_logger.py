@@ -101,7 +101,7 @@ class Logger:
         self.logger.setLevel(lvl)
   
     def getLevel(self):
-        return self.logger.getEffectiveLevel(lvl)
+        return self.logger.getEffectiveLevel()
 
     def log(self, lvl, msg, *args, **kwargs):
         self.logger.log(lvl, msg, *args, **kwargs)
@@ -137,3 +137,52 @@ class Logger:
     def flush(self):
         self.handler.flush()
 
+
+
+class BufferedLogger:
+    """logger which keeps the messages until they are replayed to another
+    logger, used to write the messages of concurrent commands in order.
+    The other methods (setLevel, getLevel, ...) are those of the logger
+    wrapped, if given."""
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.records = []
+
+    def __getattr__(self, name):
+        logger = self.__dict__.get('logger')
+        if logger is None:
+            raise AttributeError(name)
+        return getattr(logger, name)
+
+    def replay(self, logger):
+        for name, args, kwargs in self.records:
+            getattr(logger, name)(*args, **kwargs)
+        self.records = []
+
+    def log(self, *args, **kwargs):
+        self.records.append(('log', args, kwargs))
+
+    def debug(self, *args, **kwargs):
+        self.records.append(('debug', args, kwargs))
+
+    def info(self, *args, **kwargs):
+        self.records.append(('info', args, kwargs))
+
+    def warning(self, *args, **kwargs):
+        self.records.append(('warning', args, kwargs))
+
+    def chckinfo(self, *args, **kwargs):
+        self.records.append(('chckinfo', args, kwargs))
+
+    def important(self, *args, **kwargs):
+        self.records.append(('important', args, kwargs))
+
+    def result(self, *args, **kwargs):
+        self.records.append(('result', args, kwargs))
+
+    def error(self, *args, **kwargs):
+        self.records.append(('error', args, kwargs))
+
+    def flush(self):
+        pass  # the messages are written when replayed
@@ -0,0 +1,166 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Re-check the runs of an existing work directory without running the model
+again, for example after a change of the tolerances or of a checker. Every
+run directory <workdir>/<type>/<name> of a test of the testlist is checked
+with the checkers of the test, using the same TS_* environment as the
+testsuite, and the checkers of all tests run in parallel. The results are
+printed as one summary.
+"""
+
+# built-in modules
+import os, sys, copy, optparse, subprocess, multiprocessing
+from multiprocessing.pool import ThreadPool
+import xml.etree.ElementTree as ET
+
+# private modules
+from ts_utilities import dir_path, status_str, checker_environ
+from ts_test import Test
+from default_values import DefaultValues
+import ts_logger
+
+
+class Conf:
+    """Auxiliary parameters of the tests, only basedir is used to check"""
+
+    def __init__(self, basedir):
+        self.basedir = basedir
+
+
+def discover(basedir, workdir, testlist, options, logger, only=None):
+    """return the tests of testlist which have a run directory in workdir,
+    and the run directories which do not belong to a test of testlist"""
+
+    tree = ET.parse(os.path.join(basedir, testlist))
+    nodes = dict(((node.attrib['type'], node.attrib['name']), node)
+                 for node in tree.getroot().iter('test'))
+    tests = []
+    unknown = []
+    root = os.path.join(basedir, workdir)
+    for typ in sorted(os.listdir(root)):
+        if not os.path.isdir(os.path.join(root, typ)):
+            continue
+        for name in sorted(os.listdir(os.path.join(root, typ))):
+            if not os.path.isdir(os.path.join(root, typ, name)):
+                continue
+            if only and typ+'/'+name not in only:
+                continue
+            if (typ, name) not in nodes:
+                unknown.append(typ+'/'+name)
+                continue
+            test = Test(nodes[(typ, name)], options, Conf(basedir), logger)
+            test.log_file = 'exe.log'  # standard output of the run, see Test.start
+            tests.append(test)
+    return tests, unknown
+
+
+def recheck(tests, checkerdir, nproc=None):
+    """run the checkers of tests in parallel, returns a list of (test, results)
+    with the list of (checker, status, output) of each test"""
+
+    jobs = []
+    for test in tests:
+        env = dict(os.environ)
+        env.update(checker_environ(test))
+        for el in test.node.findall("checker"):
+            jobs.append((test, el.text, env))
+    if nproc is None:
+        nproc = multiprocessing.cpu_count()
+
+    # each checker is a process of its own, threads are enough to start them
+    pool = ThreadPool(max(1, min(nproc, len(jobs))))
+    try:
+        outputs = pool.map(lambda job: _run_checker(checkerdir, job[0].basedir, job[1], job[2]), jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = dict((id(test), []) for test in tests)
+    for (test, checker, env), (status, output) in zip(jobs, outputs):
+        results[id(test)].append((checker, status, output))
+    return [(test, results[id(test)]) for test in tests]
+
+
+def summary(results, unknown, logger, verbose=False):
+    """print the results of each test and their count, returns the worst result"""
+
+    counts = {}
+    worst = 0
+    for test, checks in results:
+        if checks:
+            result = max([status for checker, status, output in checks])
+        else:
+            result = 15  # SKIP, no checker
+        counts[result] = counts.get(result, 0) + 1
+        worst = max(worst, result)
+        logger.result(0, result, 'RESULT %s/%s: %s' % (test.type, test.name, test.description))
+        for checker, status, output in checks:
+            if verbose or status >= 20:
+                for line in output.split('\n'):
+                    if not line == '':
+                        logger.chckinfo(line)
+            logger.result(1, status, checker)
+    for name in unknown:
+        logger.warning('No test %s in the testlist, not checked' % name)
+
+    logger.important('Checked %i tests: ' % len(results) +
+                     ', '.join(['%i %s' % (counts[s], status_str(s)) for s in sorted(counts)]))
+    return worst
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _run_checker(checkerdir, basedir, checker, env):
+    """run a checker from basedir, returns its exit status and output"""
+    try:
+        p = subprocess.Popen(os.path.join(checkerdir, checker), cwd=basedir, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = p.communicate()[0]
+        return p.returncode, output
+    except OSError as e:
+        return 30, 'Failed to start %s: %s' % (checker, e)  # CRASH
+
+
+#-----------------------------------
+#execute as a script
+if __name__ == "__main__":
+
+    dv = DefaultValues()
+    parser = optparse.OptionParser(usage='''ts_recheck.py [options] workdir
+
+DEFINITION :      run the checkers of every test of the testlist which has a
+     run directory workdir/<type>/<name>, without running the model, and
+     print a summary of the results. Returns the worst result.''')
+    parser.add_option('-b', '--basedir', default='.', help='testsuite directory (default is .)')
+    parser.add_option('-f', '--testlist', default=dv.testlist, help='testlist file (default is %default)')
+    parser.add_option('-c', '--checkerdir', default=None, help='checker directory (default is basedir/checkers)')
+    parser.add_option('-j', '--jobs', type='int', default=None, help='number of checkers run in parallel')
+    parser.add_option('-o', '--only', default=None, help='comma separated list of tests type/name to check')
+    parser.add_option('-v', '--verbosity', type='int', dest='v_level', default=dv.v_level, help='verbosity of the checkers')
+    parser.add_option('--tolerance', default=dv.tolerance, help='tolerance file name (default is %default)')
+    parser.add_option('--force-match', action='store_const', const=1, dest='forcematch', default=dv.forcematch,
+                      help='force bit-reproducibility for all tests')
+    parser.add_option('--yuengine', default=dv.yuengine, help='engine to compare YU files, python or numpy')
+    parser.add_option('--yualign', default=dv.yualign, help='alignment of the YUCHKDAT lines, line or key')
+    parser.add_option('--yucolumns', default=dv.yucolumns, help='compared columns of the YUCHKDAT lines, mean or all')
+    (opts, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error('a work directory is required')
+
+    options = copy.copy(dv)
+    for name, value in vars(opts).items():
+        setattr(options, name, value)
+    basedir = dir_path(os.path.abspath(opts.basedir))
+    options.workdir = os.path.relpath(os.path.abspath(args[0]), basedir)  # as for testsuite.py
+    options.exe = ''  # the model is not run
+    checkerdir = opts.checkerdir or basedir + 'checkers'
+
+    ts_logger.Logger.color = sys.stdout.isatty()
+    logger = ts_logger.Logger('')
+    only = opts.only.split(',') if opts.only else None
+    tests, unknown = discover(basedir, options.workdir, opts.testlist, options, logger, only)
+    results = recheck(tests, os.path.abspath(checkerdir), opts.jobs)
+    sys.exit(summary(results, unknown, logger, opts.v_level > 1))
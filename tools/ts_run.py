@@ -0,0 +1,97 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Run the tests of a testlist with the scheduler (see ts_scheduler): each test
+is prepared, run and checked as by testsuite.py, and with the option cores
+the tests run concurrently within this budget of cores. With the option
+history, the tests likely to fail are run first (see ts_history).
+"""
+
+# built-in modules
+import os, sys, copy, optparse
+import xml.etree.ElementTree as ET
+
+# private modules
+from ts_utilities import dir_path
+from ts_error import SkipError
+from ts_test import Test
+from ts_scheduler import run_tests
+from ts_history import History
+from default_values import DefaultValues
+import ts_logger
+
+
+class Conf:
+    """Auxiliary parameters of the tests"""
+
+    def __init__(self, basedir):
+        self.basedir = basedir
+        self.res_file = 'result'      # result of a test, read by the tests depending on it
+        self.yufile = 'YUPRTEST'      # required to update the reference files
+        self.par_file = 'INPUT_ORG'   # namelist with the domain decomposition and nstop
+        self.dual_params = [('nstop', 'hstop')]  # parameters given by one or the other
+
+
+def load_tests(basedir, testlist, options, conf, logger):
+    """return the tests of testlist to run (all, or the one given by the
+    option only)"""
+
+    tests = []
+    tree = ET.parse(os.path.join(basedir, testlist))
+    for node in tree.getroot().iter('test'):
+        try:
+            test = Test(node, options, conf, logger)
+        except SkipError as e:
+            logger.warning('%s/%s: %s' % (node.attrib['type'], node.attrib['name'], e))
+            continue
+        if test.run_test():
+            tests.append(test)
+    return tests
+
+
+#-----------------------------------
+#execute as a script
+if __name__ == "__main__":
+
+    dv = DefaultValues()
+    parser = optparse.OptionParser(usage='''ts_run.py [options]
+
+DEFINITION :      run the tests of the testlist in the work directory
+     workdir/<type>/<name>. Returns 1 if the testsuite was stopped by a
+     failed test, 0 otherwise.''')
+    parser.add_option('-b', '--basedir', default='.', help='testsuite directory (default is .)')
+    parser.add_option('-f', '--testlist', default=dv.testlist, help='testlist file (default is %default)')
+    parser.add_option('-w', '--workdir', default='work', help='work directory (default is %default)')
+    parser.add_option('-e', '--exe', default=dv.exe, help='executable (default is given by the testlist)')
+    parser.add_option('-n', '--nprocs', type='int', default=dv.nprocs, help='number of processes (default is %default)')
+    parser.add_option('--nprocio', type='int', default=dv.nprocio, help='number of I/O processes')
+    parser.add_option('--mpicmd', default=dv.mpicmd, help='MPI launch command (default is %default)')
+    parser.add_option('--steps', type='int', default=dv.steps, help='number of time steps')
+    parser.add_option('-t', '--timeout', type='int', default=dv.timeout, help='timeout of a run in seconds')
+    parser.add_option('-o', '--only', default=None, help='run only the test type,name')
+    parser.add_option('-v', '--verbosity', type='int', dest='v_level', default=dv.v_level, help='verbosity of the checkers')
+    parser.add_option('--tolerance', default=dv.tolerance, help='tolerance file name (default is %default)')
+    parser.add_option('--force-match', action='store_const', const=1, dest='forcematch', default=dv.forcematch,
+                      help='force bit-reproducibility for all tests')
+    parser.add_option('--use-wrappers', action='store_true', default=False, help='run the executable with a wrapper script')
+    parser.add_option('--cores', type='int', default=dv.cores,
+                      help='cores used by the tests run concurrently (default is one test at a time)')
+    parser.add_option('--history', default=dv.history,
+                      help='file of the outcomes and durations of the tests, used to order them')
+    (opts, args) = parser.parse_args()
+    if args:
+        parser.error('no argument expected')
+
+    options = copy.copy(dv)
+    for name, value in vars(opts).items():
+        setattr(options, name, value)
+    basedir = dir_path(os.path.abspath(opts.basedir))
+
+    ts_logger.Logger.color = sys.stdout.isatty()
+    logger = ts_logger.Logger('')
+    tests = load_tests(basedir, opts.testlist, options, Conf(basedir), logger)
+    history = History(options.history) if options.history else None
+    stopped = run_tests(tests, logger, options.cores, history=history)
+    sys.exit(1 if stopped else 0)
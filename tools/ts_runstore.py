@@ -0,0 +1,165 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Store of the outputs of previous runs, used to skip the model run of a test
+whose executable, namelists, input data and launch command did not change.
+A run is identified by a fingerprint of its prepared run directory. The
+outputs of a successful run (all files created or changed by the run) are
+stored under its fingerprint and copied back into the run directory instead
+of running the model again. The checkers are run as usual on the restored
+outputs.
+"""
+
+# built-in modules
+import os, sys, errno, shutil, hashlib
+
+# private modules
+import yu_reader
+
+namelist_prefix = 'INPUT_'  # namelist files, compared after canonicalization
+
+
+def fingerprint(rundir, extra=[]):
+    """return the fingerprint of the prepared run directory rundir and of the
+    strings extra (launch command, number of processes, ...). Regular files
+    are identified by their content, namelists by their canonical content
+    and directories linked into rundir (input data) by the names, sizes and
+    modification times of their files."""
+
+    h = hashlib.sha1()
+    for s in extra:
+        h.update(s + '\n')
+    for path in _walk(rundir):
+        name = os.path.relpath(path, rundir)
+        h.update(name + '\n')
+        if os.path.islink(path):
+            h.update('-> ' + os.path.realpath(path) + '\n')
+            h.update(_tree_identity(path))
+        elif os.path.basename(path).startswith(namelist_prefix):
+            h.update(hashlib.sha1(canonical_namelist(path)).hexdigest())
+        else:
+            h.update(yu_reader.file_digest(path))
+    return h.hexdigest()
+
+
+def canonical_namelist(filename):
+    """return the content of a namelist file without comment lines, empty
+    lines and repeated blanks"""
+    lines = []
+    f = open(filename, 'r')
+    try:
+        for line in f:
+            line = ' '.join(line.split())
+            if line and not line.startswith('!'):
+                lines.append(line)
+    finally:
+        f.close()
+    return '\n'.join(lines)
+
+
+def snapshot(rundir):
+    """return the size and modification time of the files of rundir"""
+    files = {}
+    for path in _walk(rundir):
+        if not os.path.islink(path):
+            stat = os.stat(path)
+            files[os.path.relpath(path, rundir)] = (stat.st_size, stat.st_mtime)
+    return files
+
+
+class RunStore:
+    """Outputs of previous runs in directory storedir, by fingerprint"""
+
+    def __init__(self, storedir):
+        self.storedir = storedir
+
+    def entry(self, key):
+        return os.path.join(self.storedir, key[:2], key[2:])
+
+    def restore(self, key, rundir):
+        """copy the outputs stored for the fingerprint key into rundir,
+        returns the list of restored files, None if there is no entry"""
+        entry = self.entry(key)
+        if not os.path.isdir(entry):
+            return None
+        restored = []
+        for path in _walk(entry):
+            name = os.path.relpath(path, entry)
+            target = os.path.join(rundir, name)
+            _makedirs(os.path.dirname(target))
+            shutil.copy2(path, target)
+            restored.append(name)
+        return restored
+
+    def save(self, key, rundir, before):
+        """store the files of rundir which are not in the snapshot before or
+        have changed since, as the outputs of the run with fingerprint key"""
+        entry = self.entry(key)
+        if os.path.isdir(entry):
+            return
+        tmp = '%s.tmp.%i' % (entry, os.getpid())
+        try:
+            for name, stat in sorted(snapshot(rundir).items()):
+                if before.get(name) == stat:
+                    continue
+                _makedirs(os.path.dirname(os.path.join(tmp, name)))
+                shutil.copy2(os.path.join(rundir, name), os.path.join(tmp, name))
+            _makedirs(tmp)
+            os.rename(tmp, entry)
+        except (IOError, OSError):
+            # the store is only an optimization
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _walk(top):
+    """return the files and links to directories below top, sorted"""
+    paths = []
+    for root, dirs, files in os.walk(top):
+        for d in dirs:
+            if os.path.islink(os.path.join(root, d)):
+                paths.append(os.path.join(root, d))
+        paths += [os.path.join(root, f) for f in files]
+    return sorted(paths)
+
+
+def _tree_identity(top):
+    """return the names, sizes and modification times of the files below top"""
+    if os.path.isfile(top):
+        stat = os.stat(top)
+        return '%i %r\n' % (stat.st_size, stat.st_mtime)
+    lines = []
+    for root, dirs, files in os.walk(top, followlinks=True):
+        dirs.sort()
+        for f in sorted(files):
+            try:
+                stat = os.stat(os.path.join(root, f))
+            except OSError:
+                continue
+            lines.append('%s %i %r\n' % (os.path.relpath(os.path.join(root, f), top),
+                                         stat.st_size, stat.st_mtime))
+    return ''.join(lines)
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+#-----------------------------------
+#execute as a script
+if __name__ == "__main__":
+
+    if len(sys.argv) == 2:
+        print fingerprint(sys.argv[1])
+    else:
+        print '''USAGE : ts_runstore.py rundir
+
+DEFINITION :      print the fingerprint of a prepared run directory (without
+     the launch command)'''
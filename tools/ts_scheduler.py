@@ -0,0 +1,155 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Scheduler running the tests of the testsuite concurrently. A test is started
+as soon as the test it depends on (<depend> in testlist.xml) has finished
+and enough cores of the budget are free for its nprocs processes. Each test
+runs in a thread of its own (the tests use absolute paths and pass the
+working directory and environment to their commands), its log messages are
+buffered and written when the test has finished. Without budget the tests
+run one after the other, as before.
+"""
+
+# built-in modules
+import os, time, traceback, threading
+
+# private modules
+from ts_error import StopError, SkipError
+from ts_logger import BufferedLogger
+
+poll_interval = 0.2  # seconds between two checks of the running tests
+
+
+def run_test(test):
+    """run all steps of a test, returns True if the testsuite must stop"""
+    stop = False
+    try:
+        test.prepare()
+        test.prerun()
+        test.start()
+        test.wait()
+        test.check()
+    except SkipError as e:
+        test.logger.warning(str(e))
+        test.result = 15 # SKIP
+    except StopError as e:
+        if str(e):
+            test.logger.error(str(e))
+        stop = True
+    test.write_result()
+    return stop
+
+
+def dependencies(tests):
+    """return for each test the position of the tests it depends on"""
+    rundirs = dict((os.path.normpath(test.rundir), i) for i, test in enumerate(tests))
+    depends = []
+    for test in tests:
+        if test.dependdir is None:
+            depends.append([])
+            continue
+        # dependdir is either relative to the run directory or absolute
+        dependdir = os.path.normpath(os.path.join(test.rundir, test.dependdir))
+        depends.append([rundirs[dependdir]] if dependdir in rundirs else [])
+    return depends
+
+
+def run_tests(tests, logger, cores=None, stop_on_error=True, run=run_test, history=None):
+    """run the tests with at most cores processes in total (one test at a
+    time if cores is None). After a test requiring a stop of the testsuite
+    (StopError), no further test is started if stop_on_error is set.
+    With a history (see ts_history), the tests likely to fail early are run
+    first, their timeouts are adapted to their recent run times and the
+    outcome and duration of each test are recorded.
+    Returns True if the testsuite was stopped."""
+
+    if history is not None:
+        tests = history.order(tests)
+        logger.debug('Test order: '+', '.join(['%s/%s' % (t.type, t.name) for t in tests]))
+        for test in tests:
+            test.timeout = history.timeout(test, test.timeout)
+    try:
+        return _run_tests(tests, logger, cores, stop_on_error, run, history)
+    finally:
+        if history is not None:
+            history.save()
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _run_tests(tests, logger, cores, stop_on_error, run, history):
+
+    if not cores:
+        for test in tests:
+            started = time.time()
+            stop = run(test)
+            if history is not None:
+                history.record(test, time.time() - started)
+            if stop and stop_on_error:
+                return True
+        return False
+
+    depends = dependencies(tests)
+    pending = range(len(tests))
+    running = {}    # position of the running tests: (thread, logger of the test, start time)
+    outcomes = {}   # position of the finished tests: True if the testsuite must stop
+    finished = set()
+    stopped = False
+    while running or (pending and not stopped):
+
+        # start the tests whose dependencies have finished, in the order of
+        # the testlist, as long as they fit in the budget
+        if not stopped:
+            used = sum([_cores(tests[i], cores) for i in running])
+            ready = [i for i in pending if all([d in finished for d in depends[i]])]
+            if not ready and not running:
+                logger.warning('Circular test dependencies: ' +
+                               ', '.join(['%s/%s' % (tests[i].type, tests[i].name) for i in pending]))
+                ready = pending[:1]
+            for i in ready:
+                if used + _cores(tests[i], cores) > cores:
+                    continue
+                used += _cores(tests[i], cores)
+                logger_i = tests[i].logger
+                tests[i].logger = BufferedLogger(logger_i)
+                t = threading.Thread(target=_run_thread, args=(tests[i], run, outcomes, i))
+                t.daemon = True
+                t.start()
+                running[i] = (t, logger_i, time.time())
+                pending.remove(i)
+
+        # collect the tests which have finished
+        time.sleep(poll_interval)
+        for i, (t, logger_i, started) in running.items():
+            if t.is_alive():
+                continue
+            t.join()
+            if history is not None:
+                history.record(tests[i], time.time() - started)
+            del running[i]
+            finished.add(i)
+            buffered = tests[i].logger
+            tests[i].logger = logger_i
+            buffered.replay(logger)
+            stop = outcomes.get(i, True)
+            if stop and stop_on_error:
+                stopped = True
+    return stopped
+
+
+def _cores(test, cores):
+    """cores used by a test, a test larger than the budget runs alone"""
+    return min(test.nprocs, cores)
+
+
+def _run_thread(test, run, outcomes, i):
+    """run a test in a thread and store whether the testsuite must stop"""
+    try:
+        stop = run(test)
+    except Exception:
+        test.logger.error(traceback.format_exc())
+        test.result = 30 # CRASH
+        stop = True
+    outcomes[i] = stop
@@ -0,0 +1,175 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Content-addressed store of reference files. Each file is stored once under
+the sha1 digest of its (uncompressed) content in the objects directory of
+data/ and the test directories refer to it by a hard link, a symbolic link
+or a copy. Identical references of different tests (restart chains, domain
+decompositions, ...) share one object, and files whose content did not
+change are not written again when the references are updated. Files in the
+test directories are replaced atomically by renaming.
+"""
+
+# built-in modules
+import os, sys, errno, shutil, threading, multiprocessing
+from multiprocessing.pool import ThreadPool
+
+# private modules
+import yu_reader
+
+objects_dir = '.objects'                 # name of the store in the data directory
+link_modes = ['hard', 'symlink', 'copy']  # how test directories refer to the objects
+
+
+class RefStore:
+    """Store of reference files in directory storedir, the files of the test
+    directories are linked to the objects as given by link (see link_modes)"""
+
+    def __init__(self, storedir, link='hard', nproc=None):
+        if link not in link_modes:
+            raise ValueError('Unknown link mode ' + str(link))
+        self.storedir = storedir
+        self.link = link
+        if nproc is None:
+            nproc = multiprocessing.cpu_count()
+        self.nproc = nproc
+
+    def object_path(self, digest, compress=None):
+        """return the path of the object with content digest"""
+        suffix = '' if compress is None else '.' + compress
+        return os.path.join(self.storedir, digest[:2], digest[2:] + suffix)
+
+    def add(self, source, compress=None):
+        """store the file source, compressed with gzip or xz if compress is
+        'gz' or 'xz', and return the path of its object"""
+        return self._add(source, yu_reader.file_digest(source), compress)
+
+    def update(self, names, targetdir, compress=None):
+        """store the files names and link them into targetdir. The files are
+        hashed and stored in parallel. Returns a list of (name, changed, error)
+        where changed is False if the file of targetdir already referred to
+        the same content and error the message of a failed update or None."""
+        nproc = max(1, min(self.nproc, len(names)))
+        if nproc > 1:
+            pool = ThreadPool(nproc)
+            try:
+                return pool.map(lambda name: self._update(name, targetdir, compress), names)
+            finally:
+                pool.close()
+                pool.join()
+        return [self._update(name, targetdir, compress) for name in names]
+
+    def _add(self, source, digest, compress):
+        path = self.object_path(digest, compress)
+        if not os.path.exists(path):
+            _makedirs(os.path.dirname(path))
+            tmp = yu_reader.copy_yufile(source, _tmp_name(path), compress)
+            os.chmod(tmp, 0444)  # objects are shared, they must not be changed in place
+            os.rename(tmp, path)
+        return path
+
+    def _update(self, name, targetdir, compress):
+        try:
+            digest = yu_reader.file_digest(name)
+            obj = self._add(name, digest, compress)
+            target = os.path.join(targetdir, os.path.basename(name))
+            path = target if compress is None else target + '.' + compress
+            changed = not self._same(path, obj, digest)
+            if changed:
+                self._link(obj, path)
+            # remove the other versions of target, see yu_reader.copy_yufile
+            for other in [target] + [target + suffix for suffix in yu_reader.compressed_suffixes]:
+                if other != path and os.path.lexists(other):
+                    os.remove(other)
+            return name, changed, None
+        except (IOError, OSError) as e:
+            return name, True, str(e)
+
+    def _same(self, path, obj, digest):
+        """True if path already refers to the content of obj"""
+        if not os.path.exists(path):
+            return False
+        if self.link == 'copy':
+            return not os.path.islink(path) and yu_reader.file_digest(path) == digest
+        if self.link == 'symlink' and not os.path.islink(path):
+            return False
+        return os.path.samefile(path, obj)
+
+    def _link(self, obj, path):
+        """make path refer to obj, replacing the file path atomically"""
+        tmp = _tmp_name(path)
+        link = self.link
+        if link == 'hard':
+            try:
+                os.link(obj, tmp)
+            except OSError as e:
+                # no hard links across file systems
+                if e.errno not in [errno.EXDEV, errno.EPERM, errno.EMLINK]:
+                    raise
+                link = 'symlink'
+        if link == 'symlink':
+            os.symlink(os.path.relpath(obj, os.path.dirname(os.path.abspath(path))), tmp)
+        elif link == 'copy':
+            shutil.copyfile(obj, tmp)
+        os.rename(tmp, path)
+
+
+def collect(datadir, dry_run=False):
+    """remove the objects of the store in datadir which are no longer
+    referred to by a file of datadir, returns the list of removed objects"""
+    storedir = os.path.join(datadir, objects_dir)
+    linked = set()
+    for root, dirs, files in os.walk(datadir):
+        if objects_dir in dirs:
+            dirs.remove(objects_dir)
+        for f in files:
+            path = os.path.join(root, f)
+            if os.path.islink(path):
+                linked.add(os.path.realpath(path))
+    removed = []
+    for root, dirs, files in os.walk(storedir):
+        for f in files:
+            path = os.path.join(root, f)
+            # hard links are counted by the file system
+            if os.stat(path).st_nlink == 1 and os.path.realpath(path) not in linked:
+                removed.append(path)
+                if not dry_run:
+                    os.remove(path)
+    return removed
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _tmp_name(path):
+    """return a temporary name next to path, unique for the thread"""
+    return '%s.tmp.%i.%i' % (path, os.getpid(), threading.current_thread().ident)
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+#-----------------------------------
+#execute as a script
+if __name__ == "__main__":
+
+    args = sys.argv[1:]
+    dry_run = args[:1] == ['-n']
+    if dry_run:
+        args = args[1:]
+
+    if len(args) == 1:
+        for path in collect(args[0], dry_run):
+            print ('unreferenced ' if dry_run else 'removed ') + path
+    else:
+        print '''USAGE : ts_store.py [-n] datadir
+
+DEFINITION :      remove the objects of the reference store of datadir
+     (datadir/''' + objects_dir + ''') which are no longer used by any test
+     directory, or only list them with -n'''
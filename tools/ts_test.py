@@ -8,12 +8,21 @@ evaluate a single test.
 """
 
 # built-in modules
-import os, sys, copy, math, re, glob
+import os, sys, copy, math, re, glob, time
+from multiprocessing.pool import ThreadPool
 
 # private modules
 from ts_error import StopError, SkipError
-from ts_utilities import dir_path, status_str, pretty_status_str, system_command, change_dir, write_environ
+from ts_utilities import dir_path, status_str, pretty_status_str, system_command, checker_environ, read_environ
 from ts_fortran_nl import get_param, replace_param
+from ts_logger import BufferedLogger
+import ts_checker
+import yu_reader
+import yu_digest
+import ts_store
+import ts_runstore
+import yu_tolerance
+from yu_watch import YuWatcher
 
 # information
 __author__     = "Nicolo Lardelli, Xavier Lapillonne, Oliver Fuhrer"
@@ -25,6 +34,23 @@ __email__      = "cosmo-wg6@cosmo.org"
 __maintainer__ = "xavier.lapillonne@meteoswiss.ch"
 
 
+# prerequisites of the checkers which do not declare them in testlist.xml
+# (attribute requires), the comparisons are not run if the run failed
+checker_requires = {
+    'identical_check.py'         : ['run_success_check.py'],
+    'tolerance_check.py'         : ['run_success_check.py'],
+    'output_tolerance_check.py'  : ['run_success_check.py'],
+    'data_assimilation_check.rb' : ['run_success_check.py'],
+}
+
+# relative cost of the checkers which do not declare it in testlist.xml
+# (attribute cost), cheap checkers are run first
+checker_cost = {
+    'run_success_check.py' : 1.0,
+}
+default_cost = 10.0
+
+
 class Test:
     """Class representing a test and allows setting up, running and evaluating a test"""
 
@@ -39,6 +65,7 @@ class Test:
         self.conf = copy.copy(conf) # storage of the auxiliary parameters
         self.logger = logger            # store logger
         self.result = 30                # default to CRASH
+        self.watcher = None             # watcher of the YUPRTEST file during the run
 
         # define prerun actions
         if node.findtext('prerun'):
@@ -103,6 +130,11 @@ class Test:
         # set tolerance folder name (used by tolerance checker)
         self.tolerance=self.options.tolerance
 
+        # timeout of the model run (may be adapted to the history of the
+        # test, see ts_history) and duration of the completed run
+        self.timeout = self.options.timeout
+        self.run_time = None
+
 
     def run_test(self):
         """ check whether this test should be carried out in case "only" option is used"""
@@ -137,16 +169,14 @@ class Test:
     def prerun(self):
         """check dependencies and perform any prerun actions"""
 
-        # change to run directory
-        status = change_dir(self.rundir, self.logger)
-
-        # check whether dependencies have run
+        # check whether dependencies have run (dependdir may be relative to the run directory)
         if self.dependdir != None:
+            dependdir = os.path.join(self.rundir, self.dependdir)
             try:
-                f = open(self.dependdir + '/' + self.conf.res_file, "r")
+                f = open(dependdir + '/' + self.conf.res_file, "r")
                 dresult = f.readline()
 
-                if dresult == 'CRASH':
+                if dresult == 'CRASH' or dresult == 'TIMEOUT':
                     raise SkipError('Required test %s has crashed' %(self.dependdir))
                # if dresult == 'SKIP':
                #     raise SkipError('Required test %s has been skipped' %(self.dependdir))
@@ -162,7 +192,7 @@ class Test:
                 raise SkipError('Restart is not compatible with short tests')
 
             # copy restart file
-            status = system_command('/bin/cp '+self.dependdir+'/output/lr* '+self.rundir+'output/', self.logger, throw_exception=False)
+            status = system_command('/bin/cp '+dependdir+'/output/lr* '+self.rundir+'output/', self.logger, throw_exception=False)
             if status:
                 raise SkipError('Problem with restart file from '+self.dependdir)
 
@@ -172,9 +202,6 @@ class Test:
 
         self.logger.info('Starting test')
 
-        # change to run directory for this test
-        status = change_dir(self.rundir, self.logger)
-        
         # generate launch command
         self.log_file = 'exe.log'
         redirect_output = '> %s 2>&1' %(self.log_file)
@@ -191,22 +218,60 @@ class Test:
         
         # writes the wrapper script in case a wrapper run of testsuite is required
         if self.options.use_wrappers:
-            f = open('wrapper.sh','w')
+            f = open(self.rundir+'wrapper.sh','w')
             f.write('#!/bin/sh\n')
             f.write('./'+self.executable+redirect_output+'\n')
             f.close()
-            status = os.chmod('wrapper.sh',0755)
+            status = os.chmod(self.rundir+'wrapper.sh',0755)
             if status:
                 raise StopError('Problem changing permissions on wrapper.sh')
             run_cmd = run_cmd + ' ./' + 'wrapper.sh'
         else:
             run_cmd=run_cmd + ' ./' + self.executable + ' ' + redirect_output
 
-        # displays the run command
+        # outputs of a previous run with the same executable, namelists,
+        # input data and launch command are restored instead of running
+        store = None
+        if getattr(self.options, 'runstore', None):
+            store = ts_runstore.RunStore(self.options.runstore)
+            key = ts_runstore.fingerprint(self.rundir, [run_cmd, str(self.nprocs)])
+            self.logger.debug('Run fingerprint: '+key)
+            restored = store.restore(key, self.rundir)
+            if restored is not None:
+                self.logger.info('Restored %i output files of an identical run from %s' \
+                                 %(len(restored), store.entry(key)))
+                return
+            before = ts_runstore.snapshot(self.rundir)
+
+        # displays the run command and its timeout
         self.logger.info('Executing: '+run_cmd)
+        if self.timeout:
+            self.logger.info('Timeout of the run: %s s' %(self.timeout))
+
+        # compare the YUPRTEST file with the reference while the model runs,
+        # the run is aborted as soon as the YUPRTEST check is bound to fail
+        self.watcher = self.__setup_watcher()
+        if self.watcher is not None:
+            abort = self.watcher.poll
+        else:
+            abort = None
 
         # executes the run command
-        status = system_command(run_cmd, self.logger, issue_error=False, timeout=self.options.timeout)
+        started = time.time()
+        status = system_command(run_cmd, self.logger, issue_error=False, timeout=self.timeout, \
+                                abort=abort, throw_exception=False, cwd=self.rundir)
+        if self.watcher is not None and self.watcher.failure is not None:
+            self.logger.error('Run aborted at time step %i, YUPRTEST comparison failed: %s' \
+                              %(self.watcher.failed_step, self.watcher.failure))
+        elif status == -2:
+            self.result = 25 # TIMEOUT
+            raise StopError('Run exceeded the timeout of %s s' %(self.timeout))
+        elif status:
+            raise StopError('Error with system command: '+run_cmd)
+        else:
+            self.run_time = time.time() - started
+            if store is not None:
+                store.save(key, self.rundir, before)
 
 
     def wait(self):
@@ -219,28 +284,82 @@ class Test:
     def check(self):
         """perform checks"""
 
-        # change to base directory
-        status = change_dir(self.basedir, self.logger)
+        # run aborted by the YUPRTEST watcher, the checkers are not run
+        if self.watcher is not None and self.watcher.failure is not None:
+            self.logger.chckinfo('YUPRTEST comparison failed during the run: '+self.watcher.failure)
+            self.logger.result(1, 20, 'yuprtest watcher (time step %i)' %(self.watcher.failed_step))
+            self.result = 20
+            raise StopError
 
-        # scan for the checker within the xml tree
+        # scan for the checker within the xml tree, with their prerequisites
+        # and cost, given by the attributes requires and cost or by default
+        # (see checker_requires and checker_cost)
         checkerlist = []
+        requires = []
+        cost = []
+        inputs = {}  # files read by the checkers, see ts_checker.checker_inputs
         checker_nodes = self.node.findall("checker")
         for el in checker_nodes:
             checkerlist.append(el.text)   
-
-        # assignement of the environment variables for checker
-        write_environ(self)
+            if el.get('inputs') is not None:
+                inputs[el.text] = [f.strip() for f in el.get('inputs').split(',') if f.strip()]
+            else:
+                inputs[el.text] = ts_checker.checker_inputs.get(el.text)
+            if el.get('requires') is not None:
+                requires.append([r.strip() for r in el.get('requires').split(',') if r.strip()])
+            else:
+                requires.append(checker_requires.get(el.text, []))
+            cost.append(float(el.get('cost', checker_cost.get(el.text, default_cost))))
+
+        # environment variables for the checkers, python checkers with
+        # check(env) are run in this process with the environment passed as
+        # argument (see ts_checker)
+        environ = dict(os.environ)
+        environ.update(checker_environ(self))
+        inprocess = getattr(self.options, 'checker_inprocess', False)
+        env = read_environ(environ)
+        # cache of the checker results, if requested
+        cachedir = getattr(self.options, 'checker_cache', None)
+        cache = None
+        if cachedir:
+            cache = ts_checker.ResultCache(cachedir, float(getattr(self.options, 'checker_cache_size', 64)))
+
+        # the checkers run as soon as their prerequisites have run, the
+        # cheapest first, and are skipped if one of the prerequisites failed
+        outputs = [None]*len(checkerlist)
+        results = {}     # result of the checkers which have run
+        skipped = set()  # checkers which have been skipped
+        pending = range(len(checkerlist))
+        while pending:
+            ready = [i for i in pending if all([r in results or r in skipped or r not in checkerlist \
+                                                for r in requires[i]])]
+            if not ready:
+                self.logger.warning('Circular prerequisites of the checkers ' + \
+                                    ', '.join([checkerlist[i] for i in pending]))
+                ready = pending
+            ready.sort(key=lambda i: cost[i])
+            wave = []
+            for i in ready:
+                failed = [r for r in requires[i] if r in skipped or results.get(r, 0) >= 20]
+                if failed:
+                    reason = ', '.join([r + (' skipped' if r in skipped else ' ' + status_str(results[r])) \
+                                        for r in failed])
+                    outputs[i] = (15, 'skipped since ' + reason, BufferedLogger()) # SKIP
+                    skipped.add(checkerlist[i])
+                else:
+                    wave.append(i)
+            for i, output in zip(wave, self.__run_checkers([checkerlist[i] for i in wave], env, environ, \
+                                                           inprocess, inputs, cache)):
+                outputs[i] = output
+                results[checkerlist[i]] = output[0]
+            pending = [i for i in pending if i not in ready]
 
         # traversing of the checkerlist
         summary_list = []
-        for checker in checkerlist:
+        for checker, (checker_result, soutput, logger) in zip(checkerlist, outputs):
 
-            self.logger.debug(checker+' START')
+            logger.replay(self.logger)
 
-            # run checker and save result
-            checker_result,soutput = system_command('checkers/'+checker, self.logger, \
-                                                          return_output=True,throw_exception=False, \
-                                                          issue_error=False)
             # print checker output
             for line in soutput.split('\n'):
                 if not line=='':
@@ -262,19 +381,61 @@ class Test:
             raise StopError
 
 
+    def __run_checkers(self, checkers, env, environ, inprocess, inputs, cache):
+        """run the checkers from the base directory, up to checker_jobs of
+        them concurrently, returns the result, the output and the buffered
+        messages of each checker. The results are taken from the cache if
+        the files read by the checker did not change."""
+
+        def run_checker(checker):
+            logger = BufferedLogger(self.logger)
+            logger.debug(checker+' START')
+            path = self.basedir+'checkers/'+checker
+            if checker in local:
+                run = lambda: ts_checker.run_checker(path, dict(env), logger)
+            else:
+                run = lambda: system_command(path, logger, \
+                                             return_output=True,throw_exception=False, \
+                                             issue_error=False, cwd=self.basedir, env=environ)
+            checker_result,soutput = ts_checker.run_cached(cache, path, env, \
+                                                           inputs.get(checker), run, logger)
+            return checker_result, soutput, logger
+
+        # checkers run in this process hold the interpreter lock, they are
+        # run one after the other while the commands run on the pool
+        local = [c for c in checkers if inprocess and ts_checker.load_checker(self.basedir+'checkers/'+c)]
+        commands = [i for i, c in enumerate(checkers) if c not in local]
+        njobs = max(1, min(int(getattr(self.options, 'checker_jobs', 1)), len(commands)))
+        if njobs <= 1:
+            return [run_checker(checker) for checker in checkers]
+        outputs = [None]*len(checkers)
+        pool = ThreadPool(njobs)
+        try:
+            pending = pool.map_async(run_checker, [checkers[i] for i in commands])
+            for i, checker in enumerate(checkers):
+                if checker in local:
+                    outputs[i] = run_checker(checker)
+            for i, output in zip(commands, pending.get()):
+                outputs[i] = output
+        finally:
+            pool.close()
+            pool.join()
+        return outputs
+
+
     def write_result(self):
         """print result of current test to stdout as well as result file"""
 
         # print the final result 
         self.logger.result(0, self.result, 'RESULT %s/%s: %s' %(self.type,self.name,self.description))
 
-        # change to run directory for this test
-        status = change_dir(self.rundir, self.logger)
-
-        # write in a file (this is used for test dependency)
-        f = open(self.conf.res_file, "w")
+        # write in a file (this is used for test dependency), renamed once
+        # complete since dependent tests may run concurrently
+        res_file = self.rundir + self.conf.res_file
+        f = open(res_file + '.tmp', "w")
         f.write(status_str(self.result))
         f.close()
+        os.rename(res_file + '.tmp', res_file)
        
        
 
@@ -286,11 +447,8 @@ class Test:
 
         # checks if is the test is a titular test
         if re.match(pattern,text):
-            status = change_dir(self.rundir, self.logger)
             self.logger.important('Updating namelist data/'+self.type+'/'+self.name)
-            cmd = 'cp INPUT* '+self.namelistdir
-            self.logger.debug('Executing: '+cmd)
-            status = system_command(cmd, self.logger)
+            self.__update_references(sorted(glob.glob(self.rundir+'INPUT*')))
             self.result = 0 # MATCH
         else:
             raise SkipError('No test repository ' +'data/'+self.type+'/'+self.name)
@@ -306,20 +464,74 @@ class Test:
 
         # checks if is the test is a titular test
         if re.match(pattern,text):
-            status = change_dir(self.rundir, self.logger)
-            if not os.path.exists(self.conf.yufile):
+            if not os.path.exists(self.rundir+self.conf.yufile):
                 raise SkipError('No file ' +self.conf.yufile+' in '+self.rundir)
 
+            # the reference files are compressed if requested ("gz" or "xz")
+            compress = getattr(self.options, 'yucompress', None)
             self.logger.info('Updating exe.log YU* ' + self.namelistdir)
-            cmd = 'cp exe.log YU* '+self.namelistdir
-            self.logger.debug('Executing: '+cmd)
-            status = system_command(cmd, self.logger)
+            changed = self.__update_references([self.rundir+'exe.log'] + sorted(glob.glob(self.rundir+'YU*')), compress)
+
+            # digest manifest of the new reference, used by the identity checks
+            yuprtest = self.namelistdir + 'YUPRTEST'
+            if yu_reader.yufile_exists(yuprtest) and \
+               ('YUPRTEST' in changed or yu_digest.read_manifest(yuprtest) is None):
+                self.logger.info('Writing digest manifest ' + yuprtest + yu_digest.manifest_suffix)
+                yu_digest.write_manifest(yuprtest)
             self.result = 0 # MATCH
         else:
             raise SkipError('No test repository ' +'data/'+self.type+'/'+self.name)
 
 
 
+    def __update_references(self, names, compress=None):
+        """store the files names of the run directory in the reference store
+        of data/ and link them into the namelist directory, returns the names
+        (without directory) of the files which changed"""
+
+        store = ts_store.RefStore(self.basedir + 'data/' + ts_store.objects_dir,
+                                  getattr(self.options, 'reflink', 'hard'))
+        changed = []
+        for path, modified, error in store.update(names, self.namelistdir, compress):
+            name = os.path.basename(path)
+            if error is not None:
+                self.logger.warning('Error updating ' + name + ': ' + error)
+            elif modified:
+                self.logger.debug('Updated ' + self.namelistdir + name)
+                changed.append(name)
+            else:
+                self.logger.debug('Unchanged ' + self.namelistdir + name)
+        return changed
+
+    def __setup_watcher(self):
+        """return the watcher comparing the YUPRTEST file of the run with the
+        reference, using the thresholds of the YUPRTEST checkers of this test
+        (the strictest if both are used), None if not requested"""
+
+        if not getattr(self.options, 'yuwatch', False):
+            return None
+        checkers = [el.text for el in self.node.findall("checker")]
+        reference = self.refoutdir + 'YUPRTEST'
+        if not yu_reader.yufile_exists(reference):
+            return None
+
+        try:
+            if 'identical_check.py' in checkers:
+                thresholds = yu_tolerance.identical
+            elif 'tolerance_check.py' in checkers:
+                dt = float(get_param(self.rundir+'INPUT_ORG', 'dt'))
+                thresholds = yu_tolerance.thresholds(self.namelistdir, self.tolerance, dt, \
+                                                     int(self.options.forcematch))
+            else:
+                return None
+        except Exception as e:
+            self.logger.warning('YUPRTEST watcher disabled: '+str(e))
+            return None
+
+        self.logger.info('Watching YUPRTEST during the run')
+        return YuWatcher(self.rundir+'YUPRTEST', reference, *thresholds)
+
+
     def __setup_directory(self):
         """generate test directory including all required links and sub-directories"""
 
@@ -327,24 +539,26 @@ class Test:
 
         node = self.node
 
-        # create run directory and move there
+        # create run directory, the commands below run there
         status = system_command('/bin/mkdir -p '+self.rundir, self.logger)
-        status = change_dir(self.rundir, self.logger)
 
         # removal of all the possible pre-existing files
-        status = system_command('/bin/rm -r -f *', self.logger)
+        status = system_command('/bin/rm -r -f *', self.logger, cwd=self.rundir)
         
         # explicit copy of the namelists (copy is required since we will apply the change_par)
-        status = system_command('/bin/cp -f '+self.namelistdir+'INPUT_* .', self.logger)
+        status = system_command('/bin/cp -f '+self.namelistdir+'INPUT_* .', self.logger, cwd=self.rundir)
+        # the namelists of data/ may be links to the read-only objects of the
+        # reference store (see ts_store), whose mode is kept by cp
+        status = system_command('/bin/chmod u+w INPUT_*', self.logger, cwd=self.rundir)
 
         # copy of the auxiliary input parameters if exists
         if not glob.glob(os.path.join(dir_path(self.inputdir)+'in_aux/', '*'))==[]:
-            status = system_command('/bin/cp -f -r '+dir_path(self.inputdir)+'in_aux/* ./', self.logger)
+            status = system_command('/bin/cp -f -r '+dir_path(self.inputdir)+'in_aux/* ./', self.logger, cwd=self.rundir)
 
         # linking input binary fields
-        status = system_command('/bin/ln -s '+dir_path(self.inputdir)+'input .', self.logger)
+        status = system_command('/bin/ln -s '+dir_path(self.inputdir)+'input .', self.logger, cwd=self.rundir)
         # generation of the output folder
-        status = system_command('/bin/mkdir -p output', self.logger)
+        status = system_command('/bin/mkdir -p output', self.logger, cwd=self.rundir)
 
 
     def __setup_executable(self):
@@ -358,7 +572,7 @@ class Test:
         # copy of the executable
         if not os.path.exists(self.basedir+self.executable):
             raise SkipError('Executable '+self.basedir+self.executable+' does not exist')
-        status = system_command('/bin/cp '+self.basedir+self.executable+' .', self.logger)
+        status = system_command('/bin/cp '+self.basedir+self.executable+' .', self.logger, cwd=self.rundir)
         
 
     def __adapt_namelists(self):
@@ -375,7 +589,7 @@ class Test:
                 self.logger.error('changepar encountered without file attribute')
                 continue
 
-            filename = str(filename)
+            filename = self.rundir + str(filename)
             newparname = str(chpar.attrib['name'])
             
             # look if optional attribute occurrence exists
@@ -410,10 +624,10 @@ class Test:
         if self.options.nprocio is not None:
             nprocio = self.options.nprocio
         else:
-            nprocio = int(get_param(self.conf.par_file,'nprocio'))
+            nprocio = int(get_param(self.rundir+self.conf.par_file,'nprocio'))
 
         # sets the number of I/O processors
-        replace_param(self.conf.par_file,'nprocio',' nprocio= %i' %nprocio)
+        replace_param(self.rundir+self.conf.par_file,'nprocio',' nprocio= %i' %nprocio)
 
         # generates the parallelist
         parlist = []
@@ -427,8 +641,8 @@ class Test:
         # writes the new MPI decomposition
         nprocx = parlist[ap-1][0]
         nprocy = parlist[ap-1][1]
-        replace_param(self.conf.par_file, 'nprocx', ' nprocx= %i' %nprocx)
-        replace_param(self.conf.par_file, 'nprocy', ' nprocy= %i' %nprocy)
+        replace_param(self.rundir+self.conf.par_file, 'nprocx', ' nprocx= %i' %nprocx)
+        replace_param(self.rundir+self.conf.par_file, 'nprocy', ' nprocy= %i' %nprocy)
                                  
         # echo to log
         self.logger.info('Processors distribution set to ' + 
@@ -443,7 +657,7 @@ class Test:
 
             modstring = 'nstop=' + str(self.options.steps)
             parname = 'nstop'
-            filename = self.conf.par_file
+            filename = self.rundir + self.conf.par_file
             if get_param(filename,'nstop') == '':
                 parname = 'hstop'
             replace_param(filename, parname, modstring)
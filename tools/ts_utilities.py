@@ -7,7 +7,7 @@ Collection of general purpose utility functions
 """
 
 # built-in modules
-import re, os, subprocess
+import re, os, subprocess, signal, time, threading, collections
 
 # private modules
 from ts_error import StopError
@@ -40,28 +40,65 @@ def dir_path(path):
         return path+'/'
 
 
-def change_dir(dir, logger, throw_exception=True):
-    """wrapper to issue a change of working directory and handle errors"""
-
-    logger.debug('ChgDir: '+dir+' (from '+str(os.getcwd())+')')
-
-    status = os.chdir(dir)
-
-    if status:
-        if throw_exception:
-            raise StopError('Problem changing to directory '+dir)
-        else:
-            logger.error('Problem changing to directory '+dir)
-
-
-def system_command(cmd, logger, throw_exception=True, return_output=False, issue_error=True, timeout=None):
-    """wrapper to launch systems commands and handle stdout/stderr and exit status correctly"""
-
-    # launch command
+output_limit = 1024*1024  # bytes of the output of a command kept by system_command
+
+
+class _OutputReader(threading.Thread):
+    """thread reading the output of a command while it runs, the lines are
+    forwarded to the logger or, if keep is set, the last output_limit bytes
+    are kept"""
+
+    def __init__(self, stream, logger, keep):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.stream = stream
+        self.logger = logger
+        self.keep = keep
+        self.lines = collections.deque()
+        self.size = 0
+        self.dropped = 0
+
+    def run(self):
+        for line in iter(self.stream.readline, ''):
+            if not self.keep:
+                self.logger.debug('   Out: '+line.rstrip())
+                continue
+            self.lines.append(line)
+            self.size += len(line)
+            while self.size > output_limit and len(self.lines) > 1:
+                self.size -= len(self.lines.popleft())
+                self.dropped += 1
+        self.stream.close()
+
+    def output(self):
+        lines = ''.join(self.lines)
+        if self.dropped:
+            lines = '[%i lines of output omitted]\n' %(self.dropped) + lines
+        return lines
+
+
+def system_command(cmd, logger, throw_exception=True, return_output=False, issue_error=True, timeout=None, abort=None, interval=1.0, \
+                   cwd=None, env=None):
+    """wrapper to launch systems commands and handle stdout/stderr and exit status correctly.
+    If abort is given, it is called every interval seconds while the command runs and the
+    process group of the command is killed as soon as it returns True. The command runs in
+    the directory cwd with the environment env (those of the testsuite if None). The output
+    is read while the command runs, only its last output_limit bytes are returned"""
+
+    # the command is polled if it may be aborted or if the timeout is not
+    # supported by subprocess (python 2)
+    poll = abort is not None or (timeout and not timeout_supported)
+
+    # launch command, in its own process group if it is polled
     status = 0
     try:
         logger.debug('SysCmd: '+cmd)
-        s = subprocess.Popen(cmd,shell=True,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+        s = subprocess.Popen(cmd,shell=True,stdout=subprocess.PIPE,stderr=subprocess.STDOUT, \
+                             preexec_fn=os.setsid if poll else None, cwd=cwd, env=env, bufsize=-1)
+        # the output is read concurrently (buffered, not byte by byte), a
+        # command writing more than the pipe can hold would block otherwise
+        reader = _OutputReader(s.stdout, logger, return_output)
+        reader.start()
     except Exception as e:
         if issue_error:
             logger.error(e)
@@ -71,30 +108,54 @@ def system_command(cmd, logger, throw_exception=True, return_output=False, issue
     # wait for command termination
     if not status:
         try:
-            if timeout_supported and timeout:
+            if poll:
+                start = time.time()
+                while s.poll() is None:
+                    if abort is not None:
+                        try:
+                            aborted = abort()
+                        except Exception as e:
+                            # the command then runs to its end as if abort was not given
+                            logger.warning('Abort check of system command disabled: %s' %(e))
+                            abort = None
+                            aborted = False
+                        if aborted:
+                            logger.error('Aborting system command: '+cmd)
+                            kill_group(s)
+                            status = -4
+                            break
+                    if timeout and time.time()-start > int(timeout):
+                        raise subprocess.TimeoutExpired(cmd, timeout)
+                    # returns as soon as the output is closed, usually at the end of the
+                    # command, but a command may close it early (exec ... > file)
+                    if reader.is_alive():
+                        reader.join(interval)
+                    else:
+                        time.sleep(interval)
+            elif timeout_supported and timeout:
                 s.wait(timeout=int(timeout))
             else:
                 s.wait()
         except subprocess.TimeoutExpired:
             logger.error('Timeout for system command: '+cmd)
-            s.kill()
-            s.wait()
+            if poll:
+                kill_group(s)
+            else:
+                s.kill()
+                s.wait()
             status = -2
         except Exception as e:
             logger.error(e)
             logger.error('Problem with waiting for system command: '+cmd)
+            if poll:
+                kill_group(s)
             status = -3
 
-    # wait for command termination and log output to logger
+    # wait for the end of the output
     lines=''
     if status != -1:
-        while True:
-            line = s.stdout.readline()
-            if not line:
-                break
-            lines += line
-            if not return_output:
-                logger.debug('   Out: '+line.rstrip())
+        reader.join()
+        lines = reader.output()
     if not status:
         status = s.returncode
 
@@ -112,6 +173,20 @@ def system_command(cmd, logger, throw_exception=True, return_output=False, issue
         return status
     
 
+def kill_group(s, grace=5.0):
+    """terminate the process group of the subprocess s, which must have been
+    started in its own session, and kill it if it does not end within grace seconds"""
+    for sig in [signal.SIGTERM, signal.SIGKILL]:
+        try:
+            os.killpg(s.pid, sig)
+        except OSError:
+            break  # process group already ended
+        end = time.time() + grace
+        while s.poll() is None and time.time() < end:
+            time.sleep(0.1)
+    s.wait()
+
+
 def status_str(status):
     """return status string from status code"""
 
@@ -120,6 +195,7 @@ def status_str(status):
      10: 'OK',
      15: 'SKIP',
      20: 'FAIL',
+     25: 'TIMEOUT',
      30: 'CRASH'
     }
     return status_map.get(status, 'UNKNOWN')
@@ -138,6 +214,7 @@ def pretty_status_str(status,color,bold):
      10: 32, # green
      15: 37, # white
      20: 31, # red
+     25: 35, # magenta
      30: 31, # red
     }
     color_code=color_map.get(status,41)
@@ -152,23 +229,36 @@ def pretty_status_str(status,color,bold):
     return COL_ON+status_str(status)+COL_OFF
 
 
-def write_environ(test):
-    """write environment variables for checkers"""
-
-    os.environ['TS_BASEDIR'] = test.basedir
-    os.environ['TS_REFOUTDIR'] = test.refoutdir
-    os.environ['TS_VERBOSE'] = str(test.options.v_level)
-    os.environ['TS_RUNDIR'] = test.rundir
-    os.environ['TS_LOGFILE'] = test.log_file
-    os.environ['TS_NAMELISTDIR'] = test.namelistdir
-    os.environ['TS_TOLERANCE'] = test.tolerance
-    os.environ['TS_FORCEMATCH'] = str(test.options.forcematch)
-
-def read_environ():
-    """read environment variables and store into local map"""
+def checker_environ(test):
+    """return the environment variables for the checkers of test"""
+
+    env = {}
+    env['TS_BASEDIR'] = test.basedir
+    env['TS_REFOUTDIR'] = test.refoutdir
+    env['TS_VERBOSE'] = str(test.options.v_level)
+    env['TS_RUNDIR'] = test.rundir
+    env['TS_LOGFILE'] = test.log_file
+    env['TS_NAMELISTDIR'] = test.namelistdir
+    env['TS_TOLERANCE'] = test.tolerance
+    env['TS_FORCEMATCH'] = str(test.options.forcematch)
+    env['TS_YUENGINE'] = str(getattr(test.options, 'yuengine', 'python'))
+    env['TS_YUALIGN'] = str(getattr(test.options, 'yualign', 'line'))
+    env['TS_YUCOLUMNS'] = str(getattr(test.options, 'yucolumns', 'mean'))
+    # cache of parsed reference files, shared by all tests of the work directory
+    yucache = getattr(test.options, 'yucache', None)
+    if yucache is None:
+        yucache = dir_path(test.basedir) + dir_path(test.options.workdir) + '.yucache'
+    env['TS_YUCACHE'] = yucache
+    env['TS_YUCACHE_SIZE'] = str(getattr(test.options, 'yucache_size', 1024))
+    return env
+
+def read_environ(variables=None):
+    """read environment variables (or the map variables) and store into local map"""
     prefix = "TS_"
     environ = {}
-    for k, v in os.environ.iteritems():
+    if variables is None:
+        variables = os.environ
+    for k, v in variables.iteritems():
         if k.startswith(prefix):
             key = k.partition(prefix)[2]
             environ[key] = v
@@ -0,0 +1,142 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+On-disk cache of parsed YU files. The arrays of a parsed file are stored in
+a .npz file together with the path, size, modification time and content hash
+of the file they were read from. Entries are invalidated when the file
+changes and the least recently used entries are removed when the cache
+exceeds its maximal size.
+"""
+
+# built-in modules
+import os, hashlib, tempfile, zipfile
+
+# other modules
+try:
+    import numpy as np
+except ImportError:
+    np = None  # caching is disabled without numpy
+
+# private modules
+import yu_reader
+
+
+class YuCache:
+    """Cache of parsed YU files in directory cachedir, limited to maxsize MB"""
+
+    def __init__(self, cachedir, maxsize=1024):
+        self.cachedir = cachedir
+        self.maxsize = maxsize
+
+    def load(self, filename, kind, parse):
+        """return the arrays of filename parsed as kind, parse(filename) returns
+        a dictionary of arrays and is only called if the cache is not valid"""
+
+        path = os.path.abspath(yu_reader.yufile_path(filename))
+        entry = self._entry(path, kind)
+        stat = os.stat(path)
+
+        arrays = self._read(entry)
+        if arrays is not None and str(arrays['__path']) == path:
+            # unchanged file
+            if int(arrays['__size']) == stat.st_size and float(arrays['__mtime']) == stat.st_mtime:
+                self._touch(entry)
+                return _strip(arrays)
+            # file touched or copied, but same content
+            digest = yu_reader.file_digest(path)
+            if str(arrays['__hash']) == digest:
+                arrays = _strip(arrays)
+                self._write(entry, path, stat, digest, arrays)
+                return arrays
+        else:
+            digest = None
+
+        arrays = parse(filename)
+        if digest is None:
+            digest = yu_reader.file_digest(path)
+        # store only if the file did not change while parsing
+        if os.stat(path).st_mtime == stat.st_mtime:
+            self._write(entry, path, stat, digest, arrays)
+        return arrays
+
+    def _entry(self, path, kind):
+        return os.path.join(self.cachedir, hashlib.sha1(kind + ':' + path).hexdigest() + '.npz')
+
+    def _read(self, entry):
+        try:
+            f = np.load(entry)
+            try:
+                return dict((k, f[k]) for k in f.files)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError, KeyError, zipfile.BadZipfile):
+            return None
+
+    def _write(self, entry, path, stat, digest, arrays):
+        # write to a temporary file and rename it, so that concurrent
+        # checkers never see a partial entry
+        try:
+            if not os.path.isdir(self.cachedir):
+                os.makedirs(self.cachedir)
+            fd, tmp = tempfile.mkstemp(dir=self.cachedir, suffix='.tmp')
+            f = os.fdopen(fd, 'wb')
+            try:
+                np.savez(f, __path=np.array(path), __size=np.array(stat.st_size),
+                         __mtime=np.array(stat.st_mtime), __hash=np.array(digest), **arrays)
+            finally:
+                f.close()
+            os.rename(tmp, entry)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            return
+        self._evict(entry)
+
+    def _touch(self, entry):
+        # the modification time of an entry is its last use
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+
+    def _evict(self, keep):
+        """remove least recently used entries until the cache is below maxsize"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cachedir):
+            if not name.endswith('.npz'):
+                continue
+            entry = os.path.join(self.cachedir, name)
+            try:
+                stat = os.stat(entry)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+        for mtime, size, entry in sorted(entries):
+            if total <= self.maxsize*1024*1024:
+                break
+            if entry == keep:
+                continue
+            try:
+                os.remove(entry)
+                total -= size
+            except OSError:
+                pass
+
+
+def from_environ(env):
+    """return the cache defined by the YUCACHE and YUCACHE_SIZE entries of the
+    checker environment (see read_environ), None if caching is disabled"""
+    cachedir = env.get('YUCACHE', '')
+    if not cachedir or np is None:
+        return None
+    return YuCache(cachedir, float(env.get('YUCACHE_SIZE', 1024)))
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _strip(arrays):
+    """remove the cache metadata from the arrays of an entry"""
+    return dict((k, v) for k, v in arrays.iteritems() if not k.startswith('__'))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Digest manifests of YUPRTEST files. The manifest is written next to a
+reference file and contains the sha1 digest of the whole file and of the
+records of each time step. A run file can then be checked for bit identity
+in one streaming pass by comparing the digests, only the time steps with
+different digests need to be compared numerically.
+"""
+
+# built-in modules
+import os, sys, hashlib
+
+# private modules
+import yu_reader
+from yu_reader import comment_type
+
+manifest_suffix = '.digest'  # manifest of file X is X.digest
+
+
+def step_digests(filename):
+    """return the digest of the whole file and a list of (nt, first line, number
+    of lines, digest, byte offset) with the digest and the position of the
+    records of each time step"""
+
+    whole = hashlib.sha1()
+    steps = []
+    header = True
+    nt = None
+    block = []
+    offset = 0
+    for i, line in yu_reader.lines(filename):
+        whole.update(line)
+        offset += len(line)
+        tokens = line.split(None, 2)
+        if header:
+            if not tokens or tokens[0] == comment_type:
+                continue
+            header = False
+        if tokens[1] != nt:
+            if block:
+                steps.append(_step(nt, first, block, start))
+            nt = tokens[1]
+            first = i
+            start = offset - len(line)
+            block = []
+        block.append(line)
+    if block:
+        steps.append(_step(nt, first, block, start))
+    return whole.hexdigest(), steps
+
+
+def write_manifest(filename):
+    """write the manifest of a YUPRTEST file"""
+    digest, steps = step_digests(filename)
+    stat = os.stat(yu_reader.yufile_path(filename))
+    f = open(filename + manifest_suffix, 'w')
+    try:
+        f.write('# digest manifest of %s\n' % os.path.basename(filename))
+        f.write('file %s %i %r\n' % (digest, stat.st_size, stat.st_mtime))
+        for nt, first, n, d, offset in steps:
+            f.write('step %i %i %i %s %i\n' % (nt, first, n, d, offset))
+    finally:
+        f.close()
+
+
+def read_manifest(filename):
+    """return the step digests stored in the manifest of filename (see
+    step_digests), None if there is no manifest or if it is out of date.
+    The byte offsets are None in manifests written without them."""
+
+    path = filename + manifest_suffix
+    if not os.path.exists(path):
+        return None
+    steps = []
+    digest = None
+    try:
+        for i, line in yu_reader.lines(path):
+            tokens = line.split()
+            if tokens[0] == 'file':
+                digest, size, mtime = tokens[1], int(tokens[2]), float(tokens[3])
+            elif tokens[0] == 'step':
+                offset = int(tokens[5]) if len(tokens) > 5 else None
+                steps.append((int(tokens[1]), int(tokens[2]), int(tokens[3]), tokens[4], offset))
+    except (IndexError, ValueError):
+        return None
+    if digest is None:
+        return None
+
+    # the manifest is valid as long as the file has the same content
+    stat = os.stat(yu_reader.yufile_path(filename))
+    if stat.st_size != size:
+        return None
+    if stat.st_mtime != mtime and yu_reader.file_digest(filename) != digest:
+        return None
+    return digest, steps
+
+
+def differing_steps(steps1, steps2):
+    """return the time steps whose records differ, as seen by the comparison of
+    cmp_ which starts at the first common step and pairs the records until the
+    end of the shorter file. Returns None if the steps of both files do not
+    have the same records, in which case the files have to be fully compared."""
+
+    # cmp_ does not compare files with only a header
+    for steps in [steps1, steps2]:
+        if not steps or steps[-1][1] + steps[-1][2] - 1 <= 4:
+            return None
+    nts1 = [s[0] for s in steps1]
+    nts2 = [s[0] for s in steps2]
+    for nts in [nts1, nts2]:
+        if any(a >= b for a, b in zip(nts[:-1], nts[1:])):
+            return None
+    common = set(nts1) & set(nts2)
+    if not common:
+        return None
+    j1 = nts1.index(min(common))
+    j2 = nts2.index(min(common))
+
+    differ = []
+    for k, (s1, s2) in enumerate(zip(steps1[j1:], steps2[j2:])):
+        if s1[0] != s2[0]:
+            return None
+        if s1[2] != s2[2]:
+            # only allowed for the last step of the shorter file
+            last1 = j1 + k == len(steps1) - 1
+            last2 = j2 + k == len(steps2) - 1
+            if not ((last1 and s1[2] < s2[2]) or (last2 and s2[2] < s1[2])):
+                return None
+        if s1[2] != s2[2] or s1[3] != s2[3]:
+            differ.append(s1[0])
+    return differ
+
+
+def check_steps(file1, file2):
+    """return the time steps whose records differ between file1 and the
+    reference file2 according to the manifest of file2, an empty list if the
+    files are bit identical and None if the digests can not tell"""
+    try:
+        manifest = read_manifest(file2)
+        if manifest is None:
+            return None
+        return differing_steps(step_digests(file1)[1], manifest[1])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _step(nt, first, block, offset):
+    return int(nt), first, len(block), hashlib.sha1(''.join(block)).hexdigest(), offset
+
+
+#-----------------------------------
+#execute as a script
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        for filename in sys.argv[1:]:
+            write_manifest(filename)
+            print 'wrote ' + filename + manifest_suffix
+    else:
+        print '''USAGE : yu_digest.py file [file ...]
+
+DEFINITION :      write the digest manifest file.digest of YUPRTEST files,
+     used by identical_check.py and tolerance_check.py to check for bit
+     identical results without comparing the files numerically'''
@@ -0,0 +1,245 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Time step index of YUPRTEST files. The index holds the byte offset of the
+first record of each time step, so that the records of any time step can be
+read without reading the file from the beginning. The index of a reference
+file is taken from its digest manifest (see yu_digest) or built in one pass.
+Files without index are searched by bisection over the byte offsets, since
+the time steps of a YUPRTEST file are in ascending order.
+"""
+
+# built-in modules
+import sys, bisect, itertools
+
+# private modules
+import yu_reader
+import yu_digest
+from yu_reader import comment_type
+
+
+class StepIndex:
+    """Byte offsets of the time steps of a YUPRTEST file"""
+
+    def __init__(self, filename, nts, offsets, linenos, size):
+        self.filename = filename  # name of indexed file
+        self.nts = nts            # time steps in ascending order
+        self.offsets = offsets    # byte offset of the first record of each time step
+        self.linenos = linenos    # line number of the first record of each time step
+        self.size = size          # size of the file in bytes, None if not known
+
+    def __len__(self):
+        return len(self.nts)
+
+    def find(self, nt):
+        """return the position of time step nt in the index, None if absent"""
+        k = bisect.bisect_left(self.nts, nt)
+        if k < len(self.nts) and self.nts[k] == nt:
+            return k
+        return None
+
+    def read_step(self, nt):
+        """return the records of time step nt, an empty list if absent"""
+        k = self.find(nt)
+        if k is None:
+            return []
+        f = yu_reader.open_yufile(self.filename)
+        try:
+            f.seek(self.offsets[k])
+            if k+1 < len(self.nts):
+                return f.read(self.offsets[k+1] - self.offsets[k]).splitlines(True)
+            return f.read().splitlines(True)
+        finally:
+            f.close()
+
+
+def build_index(filename):
+    """index a YUPRTEST file in one pass"""
+    nts = []
+    offsets = []
+    linenos = []
+    header = True
+    offset = 0
+    nt = None
+    for i, line in yu_reader.lines(filename):
+        tokens = line.split(None, 2)
+        if header and (not tokens or tokens[0] == comment_type):
+            offset += len(line)
+            continue
+        header = False
+        if tokens[1] != nt:
+            nt = tokens[1]
+            nts.append(int(nt))
+            offsets.append(offset)
+            linenos.append(i)
+        offset += len(line)
+    _check_ascending(nts, filename)
+    return StepIndex(filename, nts, offsets, linenos, offset)
+
+
+def load_index(filename):
+    """return the index stored in the digest manifest of filename, None if
+    there is no valid manifest or if it was written without byte offsets"""
+    manifest = yu_digest.read_manifest(filename)
+    if manifest is None:
+        return None
+    steps = manifest[1]
+    if any(s[4] is None for s in steps):
+        return None
+    nts = [s[0] for s in steps]
+    _check_ascending(nts, filename)
+    # the offsets are those of the uncompressed file
+    return StepIndex(filename, nts, [s[4] for s in steps], [s[1] for s in steps], None)
+
+
+def step_index(filename):
+    """return the index of filename from its manifest or index it in one pass"""
+    index = load_index(filename)
+    if index is None:
+        index = build_index(filename)
+    return index
+
+
+def locate_step(f, nt, start, end):
+    """return the byte offset of the first record with a time step >= nt in
+    the open file f, between the byte offsets start and end which are at the
+    beginning of a line. The file is searched by bisection, reading one line
+    per iteration."""
+    lo, hi = start, end
+    while lo < hi:
+        mid = (lo + hi) // 2
+        pos, line = _line_at(f, mid, start)
+        if pos < end and _step_of(line) < nt:
+            lo = pos + 1
+        else:
+            hi = mid
+    return min(_line_at(f, lo, start)[0], end)
+
+
+def first_divergence(file1, file2):
+    """return (nt, line number in file2, variable) of the first record of file1
+    which differs from the record of file2, None if the common time steps are
+    the same. Like in comp_yuprtest.cmp_, the comparison ends with the shorter
+    file. Once two runs diverge, their results are assumed to differ in all
+    later time steps, so that only about log2(number of time steps) time steps
+    are read. file2 is indexed (see step_index) and file1 is searched by
+    bisection, the records are compared token by token."""
+
+    index = step_index(file2)
+    f = yu_reader.open_yufile(file1)
+    try:
+        start = _data_start(f)
+        size = _file_size(f)
+        if start >= size or not len(index):
+            return None
+
+        # time steps of file2 which are also in the range of file1
+        first = _step_of(_line_at(f, start, start)[1])
+        last = _step_of(_last_line(f, start, size))
+        steps = [nt for nt in index.nts if first <= nt <= last]
+
+        def diff(nt):
+            begin = locate_step(f, nt, start, size)
+            end = locate_step(f, nt+1, begin, size)
+            f.seek(begin)
+            records1 = f.read(end - begin).splitlines()
+            records2 = index.read_step(nt)
+            if not records1:
+                return 0  # time step missing in file1
+            for i, (rec1, rec2) in enumerate(itertools.izip(records1, records2)):
+                if rec1.split() != rec2.split():
+                    return i
+            return None
+
+        # bisection for the first time step with differences
+        lo, hi = 0, len(steps)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if diff(steps[mid]) is None:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(steps):
+            return None
+        nt = steps[lo]
+        i = diff(nt)
+        rec2 = index.read_step(nt)[i]
+        return nt, index.linenos[index.find(nt)] + i, rec2.split()[0]
+    finally:
+        f.close()
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _check_ascending(nts, filename):
+    if any(a >= b for a, b in zip(nts[:-1], nts[1:])):
+        raise ValueError('Time steps are not in ascending order in file %s' % filename)
+
+
+def _step_of(line):
+    """return the time step of a record"""
+    return int(line.split(None, 2)[1])
+
+
+def _data_start(f):
+    """return the byte offset of the first record after the header"""
+    f.seek(0)
+    while True:
+        pos = f.tell()
+        line = f.readline()
+        tokens = line.split(None, 1)
+        if not line or (tokens and tokens[0] != comment_type):
+            return pos
+
+
+def _file_size(f):
+    """return the size of the (uncompressed) content of the open file f"""
+    try:
+        f.seek(0, 2)
+    except (IOError, ValueError):
+        # compressed files can not seek from the end
+        while f.read(1 << 20):
+            pass
+    return f.tell()
+
+
+def _line_at(f, pos, start):
+    """return the offset and text of the first line beginning at or after pos"""
+    if pos <= start:
+        f.seek(start)
+    else:
+        f.seek(pos - 1)
+        f.readline()
+    pos = f.tell()
+    return pos, f.readline()
+
+
+def _last_line(f, start, size):
+    """return the last line of the file"""
+    n = 4096
+    while True:
+        f.seek(max(start, size - n))
+        lines = f.read(size - max(start, size - n)).splitlines()
+        if len(lines) > 1 or size - n <= start:
+            return lines[-1]
+        n *= 2
+
+
+#-----------------------------------
+#execute as a script
+if __name__ == "__main__":
+
+    if len(sys.argv) == 3:
+        divergence = first_divergence(sys.argv[1], sys.argv[2])
+        if divergence is None:
+            print 'no differences in the common time steps'
+        else:
+            print 'first difference at time step %i, variable %s (line %i of %s)' \
+                % (divergence[0], divergence[2], divergence[1], sys.argv[2])
+    else:
+        print '''USAGE : yu_index.py file1 file2
+
+DEFINITION :      find the first time step and variable where the YUPRTEST
+     file file1 differs from file2, using the index of file2'''
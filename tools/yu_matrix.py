@@ -0,0 +1,208 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Pairwise reproducibility matrix of the YUPRTEST files of N runs, for example
+of a test run with different domain decompositions (see autoparallel). Each
+file is parsed once, the records of all files are matched by time step,
+variable and occurrence and the maximal absolute and relative differences
+and the first time step with differences are computed for each pair of files.
+"""
+
+# built-in modules
+import os, sys, multiprocessing
+
+# other modules
+import numpy as np
+
+# private modules
+import parse_yuprtest
+from ts_fortran_nl import get_param
+
+yufile = 'YUPRTEST'      # name of special testsuite output
+nlfile = 'INPUT_ORG'     # namelist file containing the domain decomposition
+pool_size = 4            # a process pool is used from this number of files on
+
+
+class ReproMatrix:
+    """Pairwise differences of the YUPRTEST files of N runs. The values
+    compared are those which are not integers (min/max indices) in at least
+    one of the files, as in comp_yuprtest.cmp_ with minval=-1. Relative
+    differences are taken with respect to the larger absolute value and only
+    for values above minval."""
+
+    def __init__(self, files, minval=1e-15, nproc=None):
+        self.files = files
+        self.minval = minval
+        n = len(files)
+        self.maxabs = np.zeros((n, n))                   # maximal absolute difference
+        self.maxrel = np.zeros((n, n))                   # maximal relative difference
+        self.first = -np.ones((n, n), dtype=np.int64)    # first time step with differences, -1 if none
+        self.ncommon = np.zeros((n, n), dtype=np.int64)  # number of records in both files
+
+        if nproc is None:
+            nproc = multiprocessing.cpu_count()
+        nproc = min(nproc, n)
+
+        # parse each file once
+        if n >= pool_size and nproc > 1:
+            pool = multiprocessing.Pool(nproc)
+            try:
+                data = pool.map(_parse, files)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            data = [_parse(f) for f in files]
+
+        # common keys of the records of all files
+        varnames = []
+        for d in data:
+            varnames += [name for name in d.varnames if name not in varnames]
+        nocc = max([len(d) for d in data] + [1])
+        _shared[:] = [(d, d.record_keys(varnames, nocc), d.intmask()) for d in data]
+
+        # differences of each pair of files, the workers of the pool inherit
+        # the parsed files
+        pairs = [(i, j) for i in range(n) for j in range(i+1, n)]
+        try:
+            if n >= pool_size and nproc > 1:
+                pool = multiprocessing.Pool(nproc)
+                try:
+                    results = pool.map(_pair, [(i, j, minval) for i, j in pairs])
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                results = [_pair((i, j, minval)) for i, j in pairs]
+        finally:
+            del _shared[:]
+
+        for (i, j), (maxabs, maxrel, first, ncommon) in zip(pairs, results):
+            for a, b in [(i, j), (j, i)]:
+                self.maxabs[a, b] = maxabs
+                self.maxrel[a, b] = maxrel
+                self.first[a, b] = first
+                self.ncommon[a, b] = ncommon
+        for i in range(n):
+            self.ncommon[i, i] = len(data[i])
+
+    def groups(self):
+        """return the groups of files (as lists of indices) with bit identical results,
+        a file joins the first group whose files are all identical to it (files
+        with fewer time steps may be identical to files which differ)"""
+        groups = []
+        for i in range(len(self.files)):
+            for g in groups:
+                if all([self.first[i, j] < 0 and self.ncommon[i, j] > 0 for j in g]):
+                    g.append(i)
+                    break
+            else:
+                groups.append([i])
+        return groups
+
+    def report(self, labels=None):
+        """return the matrix as a compact table"""
+        n = len(self.files)
+        if labels is None:
+            labels = self.files
+        lines = ['Reproducibility of %i YUPRTEST files (first time step with differences,' % n,
+                 '= if bit identical, - if no common time step):', '']
+        lines.append('      ' + ''.join(['%7i' % (j+1) for j in range(n)]))
+        for i in range(n):
+            row = []
+            for j in range(n):
+                if self.ncommon[i, j] == 0:
+                    row.append('%7s' % '-')
+                elif i == j or self.first[i, j] < 0:
+                    row.append('%7s' % '=')
+                else:
+                    row.append('%7i' % self.first[i, j])
+            lines.append('%5i ' % (i+1) + ''.join(row) + '   ' + labels[i])
+        diffs = [(i, j) for i in range(n) for j in range(i+1, n) if self.first[i, j] >= 0]
+        if diffs:
+            lines += ['', 'Maximal differences (absolute, relative):']
+            for i, j in diffs:
+                lines.append('%5i -%3i   %1.2e   %1.2e' % (i+1, j+1, self.maxabs[i, j], self.maxrel[i, j]))
+        lines += ['', 'Bit identical results: ' +
+                  ' '.join(['[' + ','.join([str(i+1) for i in g]) + ']' for g in self.groups()])]
+        return '\n'.join(lines)
+
+
+def run_label(path):
+    """return a label for a run directory or YUPRTEST file with the domain
+    decomposition of the run if it can be found"""
+    rundir = path if os.path.isdir(path) else os.path.dirname(path)
+    label = path
+    try:
+        nprocx = get_param(os.path.join(rundir, nlfile), 'nprocx')
+        nprocy = get_param(os.path.join(rundir, nlfile), 'nprocy')
+        if nprocx and nprocy:
+            label += ' (%sx%s)' % (nprocx.strip(), nprocy.strip())
+    except Exception:
+        pass
+    return label
+
+
+#----------------------------------------------------------------------------
+# Local functions
+_shared = []  # parsed files, keys and integer masks used by _pair
+
+
+def _parse(filename):
+    return parse_yuprtest.read_yuprtest(filename)
+
+
+def _pair(args):
+    """return the maximal absolute and relative difference, the first time
+    step with differences (-1 if none) and the number of common records of
+    the files i and j"""
+    i, j, minval = args
+    d1, key1, int1 = _shared[i]
+    d2, key2, int2 = _shared[j]
+    common, r1, r2 = np.intersect1d(key1, key2, assume_unique=True, return_indices=True)
+    m = min(d1.values.shape[1], d2.values.shape[1])
+    v1 = d1.values[r1, :m]
+    v2 = d2.values[r2, :m]
+    compared = d1.numeric[r1, :m] & d2.numeric[r2, :m] & ~(int1[r1, :m] & int2[r2, :m])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        absdiff = np.where(compared, np.abs(v1-v2), 0.)
+        scale = np.maximum(np.abs(v1), np.abs(v2))
+        reldiff = np.where(compared & (scale > minval), absdiff/scale, 0.)
+    differ = np.flatnonzero((absdiff > 0).any(axis=1))
+    first = int(d1.nt[r1[differ]].min()) if len(differ) else -1
+    maxabs = float(absdiff.max()) if absdiff.size else 0.
+    maxrel = float(reldiff.max()) if reldiff.size else 0.
+    return maxabs, maxrel, first, len(r1)
+
+
+#-----------------------------------
+#execute as a script
+if __name__ == "__main__":
+
+    args = sys.argv[1:]
+    nproc = None
+    minval = 1e-15
+    while args and args[0] in ['-j', '-m']:
+        if args[0] == '-j':
+            nproc = int(args[1])
+        else:
+            minval = float(args[1])
+        args = args[2:]
+
+    if len(args) >= 2:
+        files = [os.path.join(a, yufile) if os.path.isdir(a) else a for a in args]
+        matrix = ReproMatrix(files, minval, nproc)
+        print matrix.report([run_label(a) for a in args])
+        sys.exit(0 if len(matrix.groups()) == 1 else 1)
+    else:
+        print '''USAGE : yu_matrix.py [-j nproc] [-m minval] run1 run2 [run3 ...]
+
+DEFINITION :      compare the YUPRTEST files of N run directories (or
+     YUPRTEST files) pairwise, for example runs of the same test with
+     different domain decompositions, and print which runs are bit
+     identical, the first time step with differences and the maximal
+     absolute and relative differences (for values above minval) of each
+     pair. Each file is parsed once, with nproc processes if there are
+     many files. Returns 0 if all results are bit identical.'''
\ No newline at end of file
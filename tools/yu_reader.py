@@ -0,0 +1,216 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Streaming readers for YU files. Records are read lazily one line at a time
+so that the memory used by the comparisons does not depend on the file size.
+"""
+
+# built-in modules
+import os, itertools, hashlib, gzip, shutil
+
+# other modules
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None  # only required for xz compressed files
+
+comment_type = '#'  # comment lines at the beginning of YUPRTEST files are skipped
+
+# Valid YUCHKDAT line contains 10 (from 0 to 9) elements, with column 3,6,9 containing
+# real numbers (min, max and mean of the field), see comp_yuchkdat.isValidLine
+ValidLineSize = 10
+RealPos = [3, 6, 9]
+LevelPos = 2  # level of the field
+
+setStartKeyword = 'Check'  # a YUCHKDAT set starts with a line containing this keyword
+setStepKeyword = 'step:'   # assumes that 'step:' is followed by a number
+
+
+compressed_suffixes = ['.gz', '.xz']  # suffixes of compressed YU files
+
+_magic = {'\x1f\x8b': 'gz', '\xfd7zXZ\x00': 'xz'}  # first bytes of compressed files
+
+
+def yufile_path(filename):
+    """return the path of the YU file filename, which is either filename
+    itself or, if it does not exist, filename with a compressed suffix"""
+    if not os.path.exists(filename):
+        for suffix in compressed_suffixes:
+            if os.path.exists(filename + suffix):
+                return filename + suffix
+    return filename
+
+
+def yufile_exists(filename):
+    """return True if the YU file filename exists, possibly compressed"""
+    return os.path.exists(yufile_path(filename))
+
+
+def open_yufile(filename):
+    """open a YU file for reading, gzip and xz compressed files (recognized by
+    their first bytes) are decompressed while they are read"""
+    path = yufile_path(filename)
+    f = open(path, 'rb')
+    head = f.read(6)
+    for magic, kind in _magic.iteritems():
+        if head.startswith(magic):
+            f.close()
+            return _open_compressed(path, kind, 'rb')
+    f.seek(0)
+    return f
+
+
+def copy_yufile(source, target, compress=None):
+    """copy the YU file source to target, compressed with gzip or xz if
+    compress is 'gz' or 'xz', and return the path of the new file. The other
+    versions of target are then removed so that target is read from the new
+    file."""
+    path = target
+    if compress is not None:
+        if '.' + compress not in compressed_suffixes:
+            raise ValueError('Unknown compression ' + compress)
+        path = target + '.' + compress
+    fin = open_yufile(source)
+    try:
+        if compress is None:
+            fout = open(path, 'wb')
+        else:
+            fout = _open_compressed(path, compress, 'wb')
+        try:
+            shutil.copyfileobj(fin, fout, 1 << 20)
+        finally:
+            fout.close()
+    finally:
+        fin.close()
+    for other in [target] + [target + suffix for suffix in compressed_suffixes]:
+        if other != path and os.path.exists(other):
+            os.remove(other)
+    return path
+
+
+def file_digest(filename):
+    """return the sha1 digest of the content of a file"""
+    h = hashlib.sha1()
+    f = open_yufile(filename)
+    try:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            h.update(block)
+    finally:
+        f.close()
+    return h.hexdigest()
+
+
+def count_lines(filename, limit=None):
+    """return the number of lines of a file, counting stops at limit"""
+    n = 0
+    f = open_yufile(filename)
+    try:
+        for line in f:
+            n += 1
+            if limit is not None and n >= limit:
+                break
+    finally:
+        f.close()
+    return n
+
+
+def lines(filename):
+    """yield (line number, line) for each line of a file"""
+    f = open_yufile(filename)
+    try:
+        for i, line in enumerate(f):
+            yield i+1, line
+    finally:
+        f.close()
+
+
+def line_blocks(filename, sizehint=1 << 22):
+    """yield (line number of the first line, list of lines) for consecutive
+    blocks of about sizehint bytes of a file"""
+    f = open_yufile(filename)
+    try:
+        first = 1
+        while True:
+            block = f.readlines(sizehint)
+            if not block:
+                break
+            yield first, block
+            first += len(block)
+    finally:
+        f.close()
+
+
+def read_lines(filename, linenos):
+    """return a dictionary with the text of the given line numbers (starting at 1)"""
+    wanted = set(linenos)
+    text = {}
+    if not wanted:
+        return text
+    last = max(wanted)
+    for i, line in lines(filename):
+        if i in wanted:
+            text[i] = line
+        if i >= last:
+            break
+    return text
+
+
+def paired_lines(file1, file2):
+    """yield (line1, line2) for the lines of two files in lockstep,
+    until the end of the shorter file is reached"""
+    for (i, line1), (j, line2) in itertools.izip(lines(file1), lines(file2)):
+        yield line1, line2
+
+
+def yuprtest_records(filename):
+    """yield (line number, line, tokens) for each record of a YUPRTEST file,
+    the header (all lines at the beginning starting with comment_type) is skipped"""
+    header = True
+    for i, line in lines(filename):
+        tokens = line.split()
+        if header:
+            if tokens[0] == comment_type:
+                continue
+            header = False
+        yield i, line, tokens
+
+
+def aligned_yuprtest_records(file1, file2):
+    """advance two YUPRTEST files to their first common time step and yield
+    pairs of records from there on, until the end of the shorter file is reached"""
+    records1 = yuprtest_records(file1)
+    records2 = yuprtest_records(file2)
+    rec1 = next(records1, None)
+    rec2 = next(records2, None)
+    while rec1 is not None and rec2 is not None:
+        nt1 = int(rec1[2][1])
+        nt2 = int(rec2[2][1])
+        if nt1 < nt2:
+            rec1 = next(records1, None)
+        elif nt1 > nt2:
+            rec2 = next(records2, None)
+        else:
+            break
+    if rec1 is None or rec2 is None:
+        return
+    yield rec1, rec2
+    for rec1, rec2 in itertools.izip(records1, records2):
+        yield rec1, rec2
+
+
+#----------------------------------------------------------------------------
+# Local functions
+def _open_compressed(path, kind, mode):
+    if kind == 'gz':
+        return gzip.open(path, mode)
+    if lzma is None:
+        raise IOError('Reading or writing the xz compressed file %s requires the lzma module' % path)
+    return lzma.LZMAFile(path, mode)
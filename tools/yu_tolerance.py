@@ -0,0 +1,57 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Thresholds used to compare YUPRTEST files, read from the tolerance file of a
+test or set to the default values. Shared by tolerance_check.py and the
+watcher of running tests (see yu_watch).
+"""
+
+# built-in modules
+import os
+
+# private modules
+from ts_fortran_nl import get_param
+
+# default thresholds
+tol_times = [1200,2400,3600]       # time limit for tolerance setting in seconds
+tol_temp = [1.0e-9,1.0e-5,1.0e-3]  # tolerance threshold for temperature field for
+                                   # tol_times[i] < t <= tol_times[i+1]
+tol_all  = [1.0e-7,1.0e-4,1.0e-0]  # tolerance threshold for all other prognostic fields
+                                   # for tol_times[i] < t <= tol_times[i+1]
+minval = 1.0e-9                    # values below min val are not considered
+
+# thresholds enforcing bit-reproducibility as (minval, nts, tol_temp, tol_all)
+identical = (-1, [10000], [0.0], [0.0])
+
+
+def tolerance_file(namelistdir, tolerance):
+    """return the tolerance file of a test, which is either in the namelist
+    directory or in the type directory above, '' if there is none"""
+    for path in [namelistdir + tolerance, namelistdir + '../' + tolerance]:
+        if os.path.exists(path):
+            return path
+    return ''
+
+
+def read_tolerances(filename):
+    """return tol_times, tol_temp, tol_all and minval read from a tolerance
+    file, raises an exception if one of them can not be read"""
+    times = [float(x) for x in get_param(filename, 'tol_times').split(',')]
+    temp = [float(x) for x in get_param(filename, 'tol_temp').split(',')]
+    all_ = [float(x) for x in get_param(filename, 'tol_all').split(',')]
+    return times, temp, all_, float(get_param(filename, 'minval'))
+
+
+def thresholds(namelistdir, tolerance, dt, forcematch=0):
+    """return (minval, nts, tol_temp, tol_all) as used by tolerance_check.py
+    to compare the YUPRTEST files of a test with time step dt"""
+    if forcematch == 1:
+        return identical
+    filename = tolerance_file(namelistdir, tolerance)
+    if filename:
+        times, temp, all_, mval = read_tolerances(filename)
+    else:
+        times, temp, all_, mval = tol_times, tol_temp, tol_all, minval
+    return mval, [int(x/dt) for x in times], temp, all_
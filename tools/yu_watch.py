@@ -0,0 +1,156 @@
+#!/usr/bin/env python2
+
+"""
+COSMO TECHNICAL TESTSUITE
+
+Incremental comparison of a YUPRTEST file while it is written by a running
+test. The new records are compared with the reference file whenever the
+watcher is polled, with the same thresholds and the same rules as
+comp_yuprtest.cmp_, so that a run can be aborted as soon as its YUPRTEST
+check is bound to fail.
+"""
+
+# built-in modules
+import os
+
+# private modules
+import yu_reader
+from yu_reader import comment_type
+from comp_yuprtest import is_num, is_not_int
+
+
+class YuWatcher:
+    """Compare the growing YUPRTEST file filename with the reference file using
+    the thresholds of cmp_ (see comp_yuprtest.cmp_). Records are compared as
+    soon as their line is complete, failure is set to a message describing
+    the first record for which cmp_ will return a non zero error count."""
+
+    def __init__(self, filename, reference, minval, nts, tol_ts, tol_as):
+        self.filename = filename    # YUPRTEST file written by the run
+        self.reference = reference  # reference YUPRTEST file
+        self.minval = minval
+        self.nts = nts
+        self.tol_ts = tol_ts
+        self.tol_as = tol_as
+        self.failure = None         # message of the first failure
+        self.failed_step = None     # time step of the first failure
+        self._reset()
+
+    def _reset(self):
+        self._offset = 0        # number of bytes of filename already read
+        self._partial = ''      # incomplete last line
+        self._lineno = 0        # line number of the last complete line
+        self._header = True
+        self._records = yu_reader.yuprtest_records(self.reference)
+        self._rec2 = next(self._records, None)
+        self._aligned = False
+        self._ntstep = None
+
+    def poll(self):
+        """compare the records written since the last call, returns True if
+        the comparison failed"""
+
+        if self.failure is not None:
+            return True
+        try:
+            size = os.path.getsize(self.filename)
+        except OSError:
+            return False
+        if size < self._offset:
+            # file rewritten from the beginning
+            self._reset()
+        if size == self._offset:
+            return False
+
+        f = yu_reader.open_yufile(self.filename)
+        try:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        finally:
+            f.close()
+        self._offset += len(data)
+        lines = (self._partial + data).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._lineno += 1
+            self._compare(line)
+            if self.failure is not None:
+                return True
+        return False
+
+    def _compare(self, line):
+        """compare a complete line of filename"""
+
+        tokens = line.split()
+        if self._header:
+            if not tokens or tokens[0] == comment_type:
+                return
+            self._header = False
+        if self._rec2 is None:
+            return  # end of the reference reached
+
+        # a line which is not a record (blank, truncated, ...) can not be
+        # compared, the comparison stops there and the line is reported by
+        # the checkers after the run
+        try:
+            nt1 = int(tokens[1])
+        except (IndexError, ValueError):
+            self._rec2 = None
+            return
+
+        # advance to the first common time step
+        if not self._aligned:
+            while self._rec2 is not None and int(self._rec2[2][1]) < nt1:
+                self._rec2 = next(self._records, None)
+            if self._rec2 is None or int(self._rec2[2][1]) > nt1:
+                return
+            self._aligned = True
+        i2, line2, l2 = self._rec2
+        self._rec2 = next(self._records, None)
+
+        # set thresholds when a new time step starts, as done by cmp_
+        if self._ntstep is None:
+            self._ntstep = nt1
+            self._tol_t = self.tol_ts[0]
+            self._tol_a = self.tol_as[0]
+        elif nt1 != self._ntstep:
+            self._ntstep = nt1
+            for i in range(len(self.nts)):
+                if nt1 >= self.nts[i] and i < len(self.tol_ts)-1:
+                    self._tol_t = self.tol_ts[i+1]
+                    self._tol_a = self.tol_as[i+1]
+
+        # records which can not be compared
+        if tokens[0] != l2[0]:
+            self._fail(nt1, 'variables differ, %s at line %i and %s at line %i of the reference'
+                       % (tokens[0], self._lineno, l2[0], i2))
+            return
+        if nt1 != int(l2[1]):
+            self._fail(nt1, 'time steps differ, nt=%i at line %i and nt=%s at line %i of the reference'
+                       % (nt1, self._lineno, l2[1], i2))
+            return
+
+        for j in range(len(tokens)):
+            if not is_num(tokens[j]):
+                continue
+            n1 = float(tokens[j])
+            try:
+                n2 = float(l2[j])
+            except (IndexError, ValueError):
+                self._fail(nt1, 'invalid value at line %i of the reference' % i2)
+                return
+            if self.minval == -1 and is_not_int(n1):
+                ldiff = abs(n1-n2)
+            elif abs(n1) > self.minval and is_not_int(n1):
+                ldiff = abs((n1-n2)/n1)
+            else:
+                ldiff = 0
+            tol = self._tol_t if tokens[0] in ['T'] else self._tol_a
+            if ldiff > tol:
+                self._fail(nt1, '%s: %1.1e above threshold %1.1e, at line %i'
+                           % (tokens[0], ldiff, tol, self._lineno))
+                return
+
+    def _fail(self, nt, message):
+        self.failed_step = nt
+        self.failure = 'nt=%i, %s' % (nt, message)